@@ -2,7 +2,8 @@
 Flask应用工厂
 """
 import os
-from flask import Flask, g
+import time
+from flask import Flask, g, request
 from app.config import Config
 
 
@@ -18,22 +19,57 @@ def create_app(config_class=Config):
     os.makedirs(app.config['CAPTIONS_DIR'], exist_ok=True)
     os.makedirs(app.config['PDF_DIR'], exist_ok=True)
     os.makedirs(app.config['NOTES_DIR'], exist_ok=True)
+    os.makedirs(app.config['JOBS_DIR'], exist_ok=True)
+    
+    # 配置进程内共享的Whisper模型缓存
+    from app.utils.whisper_models import configure_whisper_models
+    configure_whisper_models(
+        max_models=app.config['WHISPER_MAX_MODELS'],
+        # 调度器准入的任务共用同一个模型，num_workers 不少于同时运行的转写数
+        num_workers=max(app.config['WHISPER_NUM_WORKERS'], app.config['TRANSCRIBE_MAX_CONCURRENT'])
+    )
     
     # 注册蓝图
     from app.routes import main_bp, notes_bp, generation_bp, learning_bp
     from app.routes.shadowing import shadowing_bp
+    from app.routes.metrics import metrics_bp
+    from app.routes.jobs import jobs_bp
+    from app.routes.downloads import downloads_bp
+    from app.routes.storage import storage_bp
     app.register_blueprint(main_bp)
     app.register_blueprint(notes_bp, url_prefix='/api/notes')
     app.register_blueprint(generation_bp, url_prefix='/api')
     app.register_blueprint(learning_bp, url_prefix='/api')
     app.register_blueprint(shadowing_bp, url_prefix='/api/shadowing')
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    app.register_blueprint(downloads_bp, url_prefix='/api/downloads')
+    app.register_blueprint(storage_bp, url_prefix='/api/storage')
+    
+    # 按蓝图统计请求成功/失败次数与处理耗时
+    from app.utils.metrics import HTTP_REQUESTS_TOTAL, HTTP_REQUEST_SECONDS
+    
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+    
+    @app.after_request
+    def record_request_metrics(response):
+        blueprint = request.blueprint or 'app'
+        outcome = 'success' if response.status_code < 400 else 'failure'
+        HTTP_REQUESTS_TOTAL.inc(blueprint=blueprint, outcome=outcome)
+        started = g.get('request_started')
+        if started is not None:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, blueprint=blueprint)
+        return response
     
     # 注册请求后清理钩子
     @app.after_request
     def cleanup_files(response):
         """
         请求结束后，清理临时文件
-        注意：不清理videos和captions文件夹中的文件（用于影子跟读）
+        注意：不清理videos和captions文件夹中的文件（用于影子跟读），
+        这些目录的大小由存储管理按配额淘汰（见 app.utils.storage_manager）
         """
         # 只清理标记为临时的PDF文件
         # 音频、视频、字幕文件需要保留用于影子跟读
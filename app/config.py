@@ -18,6 +18,7 @@ class Config:
     
     # 索引文件
     NOTES_INDEX_FILE = os.path.join(BASE_DIR, 'notes_index.json')
+    MEDIA_MANIFEST_FILE = os.path.join(BASE_DIR, 'media_manifest.json')  # 链接→视频ID映射与媒体产物清单
     
     # Flask配置
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
@@ -25,6 +26,80 @@ class Config:
     # API配置
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL')
+    # OpenAI 客户端（进程内共享，连接池复用 keep-alive 连接）
+    OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 120))  # 单次请求读写超时（秒）
+    OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 10))  # 建立连接超时（秒）
+    OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 2))  # 连接错误、429、5xx 的自动重试次数
+    OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 20))  # 连接池同时打开的连接上限
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10))  # 保留的空闲连接数
+    OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', 60))  # 空闲连接保留时长（秒）
+    
+    # LLM标点恢复配置（长文本按重叠窗口并发请求）
+    LLM_PUNCT_WINDOW_TOKENS = int(os.environ.get('LLM_PUNCT_WINDOW_TOKENS', 300))  # 每个窗口的词数
+    LLM_PUNCT_OVERLAP_TOKENS = int(os.environ.get('LLM_PUNCT_OVERLAP_TOKENS', 40))  # 相邻窗口重叠的词数
+    LLM_PUNCT_MAX_CONCURRENCY = int(os.environ.get('LLM_PUNCT_MAX_CONCURRENCY', 4))  # 同时进行的请求数上限
+    
+    # 音频下载配置
+    ASR_AUDIO_MODE = os.environ.get('ASR_AUDIO_MODE', 'native')  # native: 原始音频编码直接送入Whisper；mp3: 先转码为192kbps MP3
+    
+    # Whisper模型配置
+    WHISPER_MODEL_SIZE = os.environ.get('WHISPER_MODEL_SIZE', 'small')
+    WHISPER_DEVICE = os.environ.get('WHISPER_DEVICE', 'cpu')
+    WHISPER_COMPUTE_TYPE = os.environ.get('WHISPER_COMPUTE_TYPE', 'int8')
+    WHISPER_NUM_WORKERS = int(os.environ.get('WHISPER_NUM_WORKERS', 2))  # 同一模型允许的并发transcribe数
+    WHISPER_MAX_MODELS = int(os.environ.get('WHISPER_MAX_MODELS', 2))  # 常驻内存的模型数量上限
+    
+    # 字幕生成配置
+    CAPTION_PARALLEL_WORKERS = int(os.environ.get('CAPTION_PARALLEL_WORKERS', 0))  # 分块并行转写进程数，<=1 为顺序转写
+    CAPTION_CHUNK_SECONDS = int(os.environ.get('CAPTION_CHUNK_SECONDS', 300))  # 并行模式下按静音点切块的目标长度（秒）
+    CAPTION_BATCH_SIZE = int(os.environ.get('CAPTION_BATCH_SIZE', 0))  # >0 时启用批量推理，一次前向解码多个VAD窗口
+    CAPTION_CHECKPOINT_SECONDS = int(os.environ.get('CAPTION_CHECKPOINT_SECONDS', 60))  # 每解码多少秒音频写一次断点，0 为关闭
+    CAPTION_BOUNDARY_ENGINE = os.environ.get('CAPTION_BOUNDARY_ENGINE', 'llm')  # 断句引擎：local（本地规则）/ llm / hybrid（本地 + LLM 细化）
+    
+    # 流水线笔记（转写过程中分批生成笔记，只用于 PDF 输出）
+    NOTES_PIPELINE_ENABLED = os.environ.get('NOTES_PIPELINE_ENABLED', '1') != '0'
+    NOTES_PIPELINE_BATCH_WORDS = int(os.environ.get('NOTES_PIPELINE_BATCH_WORDS', 250))  # 每批至少的词数，在其后第一个句末切分
+    NOTES_PIPELINE_MAX_CONCURRENCY = int(os.environ.get('NOTES_PIPELINE_MAX_CONCURRENCY', 2))  # 同时进行的笔记请求数
+    
+    # 转写调度（全部并发转写任务共享的 CPU 线程预算）
+    TRANSCRIBE_CORE_BUDGET = int(os.environ.get('TRANSCRIBE_CORE_BUDGET', 0))  # 线程预算，0 为 CPU 核心数
+    TRANSCRIBE_MAX_CONCURRENT = int(os.environ.get('TRANSCRIBE_MAX_CONCURRENT', WHISPER_NUM_WORKERS))  # 同时运行的转写任务数，超出时排队
+    TRANSCRIBE_THREADS_PER_JOB = int(os.environ.get('TRANSCRIBE_THREADS_PER_JOB', 0))  # 每个任务的线程数（固定，只对应一个模型实例），0 为 预算/并发数
+    
+    # 字幕结果缓存（按音频内容哈希 + 模型/断句参数寻址）
+    CAPTION_CACHE_ENABLED = os.environ.get('CAPTION_CACHE_ENABLED', '1') != '0'
+    CAPTION_CACHE_DIR = os.path.join(BASE_DIR, 'caption_cache')
+    CAPTION_CACHE_MAX_MB = int(os.environ.get('CAPTION_CACHE_MAX_MB', 512))
+    SEGMENT_CACHE_MAX_DOCS = int(os.environ.get('SEGMENT_CACHE_MAX_DOCS', 16))  # 进程内缓存的已解析字幕文档数
+    
+    # 相同任务合并（同一链接/视频ID同时只处理一次，跨线程与进程）
+    SINGLE_FLIGHT_DIR = os.path.join(BASE_DIR, 'jobs', 'flights')
+    
+    # 异步任务（状态以 JSON 文件保存，进程重启后未完成的任务重新执行）
+    JOBS_DIR = os.path.join(BASE_DIR, 'jobs')
+    JOB_MAX_WORKERS = int(os.environ.get('JOB_MAX_WORKERS', 2))  # 同时执行的任务数
+    JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 32))  # 本进程排队+执行中的任务上限，0 为不限
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 2))  # 进程中断后重新执行的次数上限
+    
+    # 批量导入（播放列表 / 多个链接）
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 200))  # 单个批量任务最多处理的条目数
+    BATCH_MAX_PARALLEL = int(os.environ.get('BATCH_MAX_PARALLEL', 2))  # 同时转写/生成笔记的条目数
+    BATCH_PREFETCH = int(os.environ.get('BATCH_PREFETCH', 2))  # 提前下载音频的条目数（下载与转写重叠）
+    
+    # 存储配额（按最近访问 LRU 淘汰：先派生产物，其次字幕，最后源媒体），0 为不限
+    STORAGE_ACCESS_FILE = os.path.join(BASE_DIR, 'storage_access.json')
+    STORAGE_PINS_DIR = os.path.join(BASE_DIR, 'jobs', 'pins')  # 处理中视频的固定锁文件（跨进程）
+    STORAGE_VIDEOS_MAX_MB = int(os.environ.get('STORAGE_VIDEOS_MAX_MB', 10240))
+    STORAGE_CAPTIONS_MAX_MB = int(os.environ.get('STORAGE_CAPTIONS_MAX_MB', 512))
+    STORAGE_PDFS_MAX_MB = int(os.environ.get('STORAGE_PDFS_MAX_MB', 1024))
+    STORAGE_MIN_AGE_SECONDS = int(os.environ.get('STORAGE_MIN_AGE_SECONDS', 600))  # 最近写入的文件不淘汰（其他进程可能正在使用）
+    STORAGE_COMPACT_INTERVAL = int(os.environ.get('STORAGE_COMPACT_INTERVAL', 600))  # 后台压缩间隔（秒），0 为关闭
+    
+    # 下载执行器（音频优先于后台视频，失败按指数退避 + 随机抖动重试）
+    DOWNLOAD_MAX_CONCURRENCY = int(os.environ.get('DOWNLOAD_MAX_CONCURRENCY', 3))  # 同时进行的下载数
+    DOWNLOAD_MAX_ATTEMPTS = int(os.environ.get('DOWNLOAD_MAX_ATTEMPTS', 3))  # 每个下载最多尝试次数
+    DOWNLOAD_BACKOFF_BASE = float(os.environ.get('DOWNLOAD_BACKOFF_BASE', 2.0))  # 第一次重试前的基准等待（秒），之后每次翻倍
+    DOWNLOAD_BACKOFF_MAX = float(os.environ.get('DOWNLOAD_BACKOFF_MAX', 60))  # 单次重试等待上限（秒）
 
 
 class DevelopmentConfig(Config):
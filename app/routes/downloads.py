@@ -0,0 +1,40 @@
+"""
+下载队列路由
+查看下载执行器中排队、执行中、等待重试与最近失败的下载及其进度，取消不再需要的下载
+"""
+from flask import Blueprint, jsonify
+from app.utils.download_executor import get_download_executor
+
+downloads_bp = Blueprint('downloads', __name__)
+
+
+@downloads_bp.route('', methods=['GET'])
+def list_downloads():
+    """
+    下载队列状态
+    返回 queued / retrying / active / failed / recent 五组任务（id、key、优先级、状态、尝试次数、错误、进度）
+    """
+    return jsonify(get_download_executor().stats())
+
+
+@downloads_bp.route('/<task_id>', methods=['GET'])
+def get_download(task_id):
+    """
+    获取单个下载的状态与进度
+    progress 包含 downloaded_bytes、total_bytes、fraction（0~1）、speed（字节/秒）、eta（秒）
+    """
+    task = get_download_executor().get_task(task_id)
+    if task is None:
+        return jsonify({"error": "下载任务不存在"}), 404
+    return jsonify(task.to_dict())
+
+
+@downloads_bp.route('/<task_id>', methods=['DELETE'])
+def cancel_download(task_id):
+    """
+    取消下载
+    排队或等待重试中的任务立即结束；执行中的任务在下一次进度回调时中止
+    """
+    if not get_download_executor().cancel(task_id):
+        return jsonify({"error": "下载任务不存在或已结束"}), 404
+    return jsonify({"status": "cancelling", "id": task_id})
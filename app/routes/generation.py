@@ -2,13 +2,34 @@
 笔记生成路由
 处理视频字幕、音乐歌词等内容的笔记生成
 """
-from flask import Blueprint, request, jsonify, g, send_file, current_app
+import os
+import json
+from flask import Blueprint, request, jsonify, g, send_file, current_app, Response, stream_with_context, url_for
 from app.services.video_service import VideoService
 from app.services.music_service import MusicService
+from app.services.job_service import JobService, JobQueueFullError
+from app.utils.whisper_models import get_whisper_model_stats
+from app.utils.caption_cache import get_transcription_cache, hash_audio_file
+from app.utils.sentence_boundary import BOUNDARY_ENGINES, get_boundary_stats
+from app.utils.transcribe_scheduler import get_transcription_scheduler
+from app.utils.ai import get_openai_client_stats
 
 generation_bp = Blueprint('generation', __name__)
 
 
+def _submit_job(job_type, params):
+    """提交异步任务，立即返回 202 与任务ID"""
+    try:
+        job = JobService.submit(job_type, params)
+    except JobQueueFullError as e:
+        return jsonify({"error": f"{e}，请稍后重试"}), 503
+    return jsonify({
+        "status": "accepted",
+        "job_id": job['id'],
+        "status_url": url_for('jobs.get_job', job_id=job['id']),
+    }), 202
+
+
 @generation_bp.route('/caption', methods=['POST'])
 def generate_video_caption():
     """
@@ -17,6 +38,8 @@ def generate_video_caption():
     - video_url: 视频链接
     - output_format: 'txt' 或 'pdf'，默认为 'pdf'
     - save_to_storage: 是否保存到笔记存储区
+    - boundary_engine: 断句引擎 'local' / 'llm' / 'hybrid'，默认使用配置 CAPTION_BOUNDARY_ENGINE
+    - async: 为 true 时立即返回 202 与任务ID，通过 GET /api/jobs/<id> 查询进度并获取结果
     """
     data = request.get_json()
     if not data or 'video_url' not in data:
@@ -25,17 +48,29 @@ def generate_video_caption():
     video_url = data['video_url']
     output_format = data.get('output_format', 'txt').lower()
     save_to_storage = data.get('save_to_storage', False)
+    boundary_engine = data.get('boundary_engine')
 
     if output_format not in ['txt', 'pdf']:
         return jsonify({"error": "无效的 'output_format' 参数，只接受 'txt' 或 'pdf'"}), 400
+    if boundary_engine and boundary_engine.lower() not in BOUNDARY_ENGINES:
+        return jsonify({"error": f"无效的 'boundary_engine' 参数，只接受 {', '.join(BOUNDARY_ENGINES)}"}), 400
 
     print(f"接收到视频链接: {video_url}, 输出格式: {output_format}")
 
+    if data.get('async'):
+        return _submit_job('video', {
+            'video_url': video_url,
+            'output_format': output_format,
+            'save_to_storage': save_to_storage,
+            'boundary_engine': boundary_engine,
+        })
+
     try:
         result = VideoService.process_video(
             video_url=video_url,
             output_format=output_format,
-            save_to_storage=save_to_storage
+            save_to_storage=save_to_storage,
+            boundary_engine=boundary_engine
         )
         
         if result['status'] == 'error':
@@ -68,6 +103,161 @@ def generate_video_caption():
         return jsonify({"error": f"处理视频时出错: {str(e)}"}), 500
 
 
+@generation_bp.route('/caption/batch', methods=['POST'])
+def generate_batch_captions():
+    """
+    批量导入播放列表或多个视频链接（异步任务）
+    接受参数：
+    - playlist_url: 播放列表链接（也可以是单个视频链接）
+    - video_urls: 视频链接列表，列表中的播放列表链接同样展开
+    - output_format: 每个条目的输出格式 'txt' 或 'pdf'，默认为 'txt'
+    - save_to_storage: 是否保存到笔记存储区
+    - boundary_engine: 断句引擎 'local' / 'llm' / 'hybrid'
+    - max_parallel: 同时转写/生成笔记的条目数，默认使用配置 BATCH_MAX_PARALLEL
+    - skip_processed: 是否跳过已生成过同格式输出的条目，默认 true
+    立即返回 202 与任务ID；GET /api/jobs/<id> 的 items 为各条目状态，完成后 GET /api/jobs/<id>/result 获取汇总报告
+    """
+    data = request.get_json()
+    playlist_url = (data or {}).get('playlist_url')
+    video_urls = (data or {}).get('video_urls') or []
+    if not playlist_url and not video_urls:
+        return jsonify({"error": "请求体中缺少 'playlist_url' 或 'video_urls'"}), 400
+    if not isinstance(video_urls, list) or not all(isinstance(u, str) and u.strip() for u in video_urls):
+        return jsonify({"error": "'video_urls' 必须是链接字符串列表"}), 400
+
+    output_format = data.get('output_format', 'txt').lower()
+    boundary_engine = data.get('boundary_engine')
+    max_parallel = data.get('max_parallel')
+    if output_format not in ['txt', 'pdf']:
+        return jsonify({"error": "无效的 'output_format' 参数，只接受 'txt' 或 'pdf'"}), 400
+    if boundary_engine and boundary_engine.lower() not in BOUNDARY_ENGINES:
+        return jsonify({"error": f"无效的 'boundary_engine' 参数，只接受 {', '.join(BOUNDARY_ENGINES)}"}), 400
+    if max_parallel is not None and (not isinstance(max_parallel, int) or max_parallel < 1):
+        return jsonify({"error": "'max_parallel' 必须是正整数"}), 400
+
+    print(f"接收到批量导入: 播放列表 {playlist_url}, 链接 {len(video_urls)} 个, 输出格式: {output_format}")
+    return _submit_job('batch', {
+        'playlist_url': playlist_url,
+        'video_urls': [u.strip() for u in video_urls],
+        'output_format': output_format,
+        'save_to_storage': data.get('save_to_storage', False),
+        'boundary_engine': boundary_engine,
+        'max_parallel': max_parallel,
+        'skip_processed': data.get('skip_processed', True),
+    })
+
+
+def _sse(event, data):
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@generation_bp.route('/caption/stream', methods=['GET'])
+def stream_video_caption():
+    """
+    以 Server-Sent Events 流式返回字幕
+    接受参数：
+    - video_url: 视频链接（query string）
+    - boundary_engine: 断句引擎 'local' / 'llm' / 'hybrid'（query string，可选）
+    
+    事件：status / media / info / segment（逐段，含词级时间戳）/ blocks（最终句子区块）/ done / error
+    """
+    video_url = request.args.get('video_url')
+    if not video_url:
+        return jsonify({"error": "缺少参数 'video_url'"}), 400
+    boundary_engine = request.args.get('boundary_engine')
+    if boundary_engine and boundary_engine.lower() not in BOUNDARY_ENGINES:
+        return jsonify({"error": f"无效的 'boundary_engine' 参数，只接受 {', '.join(BOUNDARY_ENGINES)}"}), 400
+
+    print(f"接收到流式字幕请求: {video_url}")
+
+    def generate():
+        try:
+            for event, data in VideoService.stream_caption(video_url, boundary_engine=boundary_engine):
+                yield _sse(event, data)
+        except Exception as e:
+            print(f"流式字幕出错: {e}")
+            yield _sse('error', {'message': f"处理视频时出错: {str(e)}"})
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 关闭反向代理缓冲，保证逐条推送
+    return response
+
+
+@generation_bp.route('/caption/models', methods=['GET'])
+def get_caption_model_stats():
+    """
+    获取Whisper模型缓存统计（命中/未命中/加载耗时/常驻模型）
+    """
+    return jsonify(get_whisper_model_stats())
+
+
+@generation_bp.route('/caption/scheduler', methods=['GET'])
+def get_caption_scheduler_stats():
+    """
+    获取转写调度器状态（线程预算、空闲线程、排队深度、各运行任务的线程分配）
+    """
+    return jsonify(get_transcription_scheduler().stats())
+
+
+@generation_bp.route('/caption/boundaries', methods=['GET'])
+def get_caption_boundary_stats():
+    """
+    获取本地断句与LLM断句的累计一致性（precision / recall / F1）及平均耗时
+    """
+    return jsonify(dict(get_boundary_stats(), default_engine=current_app.config['CAPTION_BOUNDARY_ENGINE']))
+
+
+@generation_bp.route('/caption/cache', methods=['GET'])
+def get_caption_cache_stats():
+    """
+    获取字幕缓存统计（命中率、条目数、占用空间）
+    """
+    cache = get_transcription_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
+
+@generation_bp.route('/caption/cache', methods=['DELETE'])
+def invalidate_caption_cache():
+    """
+    使字幕缓存失效
+    接受参数（query string，均不传时清空全部缓存）：
+    - key: 缓存 key
+    - filename: videos 目录中的媒体文件名，删除该音频所有参数组合的缓存
+    """
+    cache = get_transcription_cache()
+    if cache is None:
+        return jsonify({"error": "字幕缓存未启用"}), 400
+
+    key = request.args.get('key')
+    filename = request.args.get('filename')
+    try:
+        if filename:
+            media_path = os.path.join(current_app.config['VIDEOS_DIR'], os.path.basename(filename))
+            if not os.path.exists(media_path):
+                return jsonify({"error": "文件不存在"}), 404
+            removed = cache.invalidate(audio_hash=hash_audio_file(media_path))
+        elif key:
+            removed = cache.invalidate(key=key)
+        else:
+            removed = cache.clear()
+        return jsonify({"status": "success", "removed": removed})
+    except Exception as e:
+        print(f"清理字幕缓存失败: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@generation_bp.route('/llm/connections', methods=['GET'])
+def get_llm_connection_stats():
+    """
+    获取共享 OpenAI 客户端的连接复用统计（请求数、新建连接数、复用率、连接池配置）
+    """
+    return jsonify(get_openai_client_stats())
+
+
 @generation_bp.route('/qq-music-lyrics', methods=['POST'])
 def generate_music_lyrics():
     """
@@ -76,6 +266,7 @@ def generate_music_lyrics():
     - music_url: QQ音乐链接
     - output_format: 'txt' 或 'pdf'，默认为 'pdf'
     - save_to_storage: 是否保存到笔记存储区
+    - async: 为 true 时立即返回 202 与任务ID，通过 GET /api/jobs/<id> 查询进度并获取结果
     """
     data = request.get_json()
     if not data or 'music_url' not in data:
@@ -90,6 +281,13 @@ def generate_music_lyrics():
 
     print(f"接收到QQ音乐链接: {music_url}, 输出格式: {output_format}")
 
+    if data.get('async'):
+        return _submit_job('music', {
+            'music_url': music_url,
+            'output_format': output_format,
+            'save_to_storage': save_to_storage,
+        })
+
     try:
         result = MusicService.process_qq_music(
             music_url=music_url,
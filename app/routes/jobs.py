@@ -0,0 +1,94 @@
+"""
+异步任务路由
+查询后台任务的阶段与进度，任务完成后获取结果（字幕文本 / 歌词文本 / PDF）
+任务通过 POST /api/caption、POST /api/qq-music-lyrics 携带 "async": true 提交，批量导入通过 POST /api/caption/batch 提交
+"""
+import os
+from flask import Blueprint, request, jsonify, send_file, current_app
+from app.services.job_service import JobService
+from app.utils.storage_manager import get_storage_manager
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.before_app_request
+def resume_orphaned_jobs():
+    """进程处理第一个请求时接管上次退出时未完成的任务"""
+    JobService.recover()
+
+
+@jobs_bp.route('', methods=['GET'])
+def list_jobs():
+    """
+    列出最近的任务
+    接受参数（query string）：
+    - status: 只返回该状态的任务 queued / running / succeeded / failed
+    - limit: 返回数量，默认 50
+    """
+    limit = request.args.get('limit', 50, type=int)
+    status = request.args.get('status')
+    return jsonify({"jobs": JobService.list_jobs(limit=max(1, limit), status=status)})
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    获取任务状态
+    返回 status（queued / running / succeeded / failed）、stage、progress（0~1）、message、
+    result（成功后的产物文件名）与 error；批量任务另有 items（各条目的状态）
+    """
+    job = JobService.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(job)
+
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    获取任务结果
+    txt 格式返回与同步接口相同的 JSON，pdf 格式直接下载 PDF 文件，批量任务返回汇总报告
+    """
+    job = JobService.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    if job['status'] == 'failed':
+        return jsonify({"error": job['error'], "status": job['status']}), 409
+    if job['status'] != 'succeeded':
+        return jsonify({"error": "任务尚未完成", "status": job['status'], "progress": job['progress']}), 409
+
+    result = job['result']
+    try:
+        if job['type'] == 'batch':
+            return jsonify({"status": "success", "summary": result['summary'], "items": result['items']})
+
+        if result['output_format'] == 'pdf':
+            pdf_path = os.path.join(current_app.config['PDF_DIR'], result['pdf_filename'])
+            if not os.path.exists(pdf_path):
+                return jsonify({"error": "PDF 文件已被删除"}), 410
+            get_storage_manager().touch(pdf_path)
+            return send_file(pdf_path, as_attachment=True, download_name=result['filename'])
+
+        if job['type'] == 'music':
+            return jsonify({
+                "status": "success",
+                "song_name": result['song_name'],
+                "artist_name": result['artist_name'],
+                "lyrics": result['lyrics_text'],
+                "filename": result['filename']
+            })
+
+        caption_path = os.path.join(current_app.config['CAPTIONS_DIR'], result['caption_filename'])
+        if not os.path.exists(caption_path):
+            return jsonify({"error": "字幕文件已被删除"}), 410
+        get_storage_manager().touch(caption_path)
+        with open(caption_path, 'r', encoding='utf-8') as f:
+            caption_text = f.read()
+        return jsonify({
+            "status": "success",
+            "caption": caption_text,
+            "filename": result['filename']
+        })
+    except Exception as e:
+        print(f"获取任务结果失败: {e}")
+        return jsonify({"error": str(e)}), 500
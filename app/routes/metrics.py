@@ -0,0 +1,16 @@
+"""
+指标路由
+以 Prometheus 文本格式导出进程内指标
+"""
+from flask import Blueprint, Response
+from app.utils.metrics import REGISTRY
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def export_metrics():
+    """
+    导出全部指标（text exposition format 0.0.4）
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
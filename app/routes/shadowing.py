@@ -3,8 +3,10 @@
 处理视频列表和字幕segments数据
 """
 import os
-import json
-from flask import Blueprint, jsonify, current_app, send_file
+from flask import Blueprint, jsonify, current_app, send_file, request
+from app.utils.segment_index import get_segment_cache
+from app.utils.media_manifest import get_media_manifest
+from app.utils.storage_manager import get_storage_manager
 
 shadowing_bp = Blueprint('shadowing', __name__)
 
@@ -23,9 +25,17 @@ def get_videos():
             return jsonify([])
         
         videos = []
-        for filename in os.listdir(videos_dir):
+        filenames = os.listdir(videos_dir)
+        # 原始音频（如 opus/webm）已有浏览器可播放的同名副本时，只列出副本
+        playable_bases = {
+            os.path.splitext(f)[0] for f in filenames
+            if f.endswith(('.mp4', '.mp3', '.m4a', '.wav'))
+        }
+        for filename in filenames:
             if filename.endswith(('.mp4', '.mp3', '.webm', '.mkv', '.m4a', '.wav')):
                 base_name = os.path.splitext(filename)[0]
+                if filename.endswith(('.webm', '.mkv')) and base_name in playable_bases:
+                    continue
                 segments_path = os.path.join(captions_dir, f"{base_name}_segments.json")
                 
                 # 判断媒体类型
@@ -64,16 +74,78 @@ def get_video_segments(filename):
         if not os.path.exists(segments_path):
             return jsonify({"error": "字幕文件不存在"}), 404
         
-        with open(segments_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # 解析结果按文件 mtime 缓存在进程内，重复加载不再读盘解析
+        index = get_segment_cache().get(segments_path)
+        get_storage_manager().touch(segments_path)
         
-        return jsonify(data)
+        return jsonify(index.doc)
     
     except Exception as e:
         print(f"获取字幕segments失败: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@shadowing_bp.route('/videos/<filename>/segments/query', methods=['GET'])
+def query_video_segments(filename):
+    """
+    按时间窗口查询字幕segments（只返回需要的区块）
+    接受参数（query string，二选一）：
+    - from, to: 返回与 [from, to) 重叠的区块（秒）
+    - t, n: 返回时间 t 所在区块及其前后共 n 个区块（n 默认 10）
+    
+    返回格式：{first_index, total, duration, segments[, current_index]}
+    """
+    try:
+        captions_dir = current_app.config['CAPTIONS_DIR']
+        base_name = os.path.splitext(filename)[0]
+        segments_path = os.path.join(captions_dir, f"{base_name}_segments.json")
+        
+        try:
+            if 't' in request.args:
+                t = float(request.args['t'])
+                n = int(request.args.get('n', 10))
+                window = None
+            elif 'from' in request.args or 'to' in request.args:
+                window = (float(request.args.get('from', 0)), float(request.args.get('to', 'inf')))
+            else:
+                return jsonify({"error": "需要参数 'from'/'to' 或 't'/'n'"}), 400
+        except ValueError:
+            return jsonify({"error": "时间参数必须是数字"}), 400
+        
+        if not os.path.exists(segments_path):
+            return jsonify({"error": "字幕文件不存在"}), 404
+        
+        index = get_segment_cache().get(segments_path)
+        get_storage_manager().touch(segments_path)
+        result = {'total': len(index), 'duration': index.duration}
+        if window is not None:
+            result['first_index'], result['segments'] = index.range(*window)
+        else:
+            result['first_index'], result['segments'], result['current_index'] = index.around(t, n)
+        
+        return jsonify(result)
+    
+    except Exception as e:
+        print(f"查询字幕segments失败: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@shadowing_bp.route('/segments/cache', methods=['GET'])
+def get_segment_cache_stats():
+    """
+    获取字幕文档缓存统计（命中率、常驻文档数）
+    """
+    return jsonify(get_segment_cache().stats())
+
+
+@shadowing_bp.route('/media/manifest', methods=['GET'])
+def get_media_manifest_stats():
+    """
+    获取媒体清单统计（已记录的链接数、视频数、产物数与总大小）
+    """
+    return jsonify(get_media_manifest().stats())
+
+
 @shadowing_bp.route('/videos/<filename>/stream', methods=['GET'])
 def stream_video(filename):
     """
@@ -98,6 +170,7 @@ def stream_video(filename):
         }
         mimetype = mimetype_map.get(ext, 'application/octet-stream')
         
+        get_storage_manager().touch(file_path)
         return send_file(file_path, mimetype=mimetype)
     
     except Exception as e:
@@ -0,0 +1,36 @@
+"""
+存储管理路由
+查看数据目录的占用与配额，手动触发一次压缩（按 LRU 淘汰超出配额的产物）
+"""
+from flask import Blueprint, jsonify, current_app
+from app.utils.storage_manager import get_storage_manager
+
+storage_bp = Blueprint('storage', __name__)
+
+
+@storage_bp.before_app_request
+def start_storage_compactor():
+    """进程处理第一个请求时启动后台压缩线程（间隔取配置 STORAGE_COMPACT_INTERVAL）"""
+    get_storage_manager().start(current_app._get_current_object(), current_app.config['STORAGE_COMPACT_INTERVAL'])
+
+
+@storage_bp.route('', methods=['GET'])
+def get_storage_stats():
+    """
+    存储状态
+    返回各目录（videos / captions / pdfs）的占用字节数、配额与文件数，固定中的视频ID，以及上次压缩的结果
+    """
+    return jsonify(get_storage_manager().stats())
+
+
+@storage_bp.route('/compact', methods=['POST'])
+def compact_storage():
+    """
+    立即压缩一次
+    返回各目录淘汰的文件数与字节数
+    """
+    try:
+        return jsonify(get_storage_manager().compact())
+    except Exception as e:
+        print(f"存储压缩失败: {e}")
+        return jsonify({"error": str(e)}), 500
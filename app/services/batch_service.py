@@ -0,0 +1,200 @@
+"""
+批量导入服务
+把播放列表或多个链接展开为条目，逐条走视频字幕/笔记流程，汇总为一份报告。
+下载与转写跨条目重叠：预取线程提前下载后面几条的音频（经下载执行器排队），
+处理线程对已就绪的条目转写与生成笔记；已生成过同格式输出的条目直接跳过。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+
+from app.services.video_service import VideoService
+from app.utils.audio import acquire_media
+from app.utils.media_manifest import get_media_manifest
+from app.utils.single_flight import normalize_url
+from app.utils.storage_manager import get_storage_manager
+
+# 条目状态：pending → downloading → processing → succeeded / failed；已处理过的为 skipped
+FINISHED_STATUSES = ('succeeded', 'failed', 'skipped')
+
+
+class BatchService:
+    """批量导入服务类"""
+
+    @staticmethod
+    def expand(playlist_url=None, video_urls=None, limit=None):
+        """
+        把播放列表 / 链接列表展开为视频条目（yt-dlp 平铺解析，不逐条解析视频详情）
+
+        列表中的链接本身是播放列表时同样展开；同一视频只保留一条。
+        无法解析的链接（私有、已删除、不支持的站点等）不影响其他链接，作为带 error 的条目返回
+
+        Args:
+            playlist_url: 播放列表（或单个视频）链接
+            video_urls: 链接列表
+            limit: 最多返回的条目数
+
+        Returns:
+            list: [{url, video_id, title, error}]，video_id 未知时为 None，error 为解析失败的原因
+        """
+        import yt_dlp  # 延迟导入，避免应用启动时加载全部提取器
+
+        sources = ([playlist_url] if playlist_url else []) + list(video_urls or [])
+        entries, seen = [], set()
+        ydl_opts = {'extract_flat': 'in_playlist', 'quiet': True, 'skip_download': True}
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            for source in sources:
+                try:
+                    info = ydl.extract_info(source, download=False)
+                except Exception as e:
+                    print(f"[Batch] Failed to expand {source}: {e}")
+                    if normalize_url(source) not in seen:
+                        seen.add(normalize_url(source))
+                        entries.append({'url': source, 'video_id': None, 'title': None, 'error': str(e)})
+                    if limit and len(entries) >= limit:
+                        return entries
+                    continue
+                if info.get('_type') in ('playlist', 'multi_video'):
+                    items = [e for e in info.get('entries') or [] if e]
+                    print(f"[Batch] Expanded {source} into {len(items)} entries")
+                else:
+                    items = [dict(info, url=source)]
+                for item in items:
+                    url = item.get('webpage_url') or item.get('url')
+                    if not url:
+                        continue
+                    dedup_key = item.get('id') or normalize_url(url)
+                    if dedup_key in seen:
+                        continue
+                    seen.add(dedup_key)
+                    entries.append({'url': url, 'video_id': item.get('id'), 'title': item.get('title'), 'error': None})
+                    if limit and len(entries) >= limit:
+                        return entries
+        return entries
+
+    @staticmethod
+    def _processed_output(entry, output_format):
+        """条目已生成的同格式输出（文件仍在磁盘上时），没有时返回 None"""
+        manifest = get_media_manifest()
+        video_id = entry['video_id'] or manifest.lookup_url(entry['url'])[0]
+        output = manifest.get_output(video_id, output_format) if video_id else None
+        if not output:
+            return None
+        config = current_app.config
+        paths = [os.path.join(config['CAPTIONS_DIR'], output['caption_filename'])]
+        if output.get('pdf_filename'):
+            paths.append(os.path.join(config['PDF_DIR'], output['pdf_filename']))
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        return dict(output, video_id=video_id)
+
+    @staticmethod
+    def process_batch(playlist_url=None, video_urls=None, output_format='txt', save_to_storage=False,
+                      boundary_engine=None, max_parallel=None, skip_processed=True, progress=None):
+        """
+        批量处理播放列表 / 链接列表
+
+        Args:
+            playlist_url: 播放列表链接
+            video_urls: 链接列表
+            output_format: 每个条目的输出格式 ('txt' 或 'pdf')
+            save_to_storage: 是否保存到笔记存储区
+            boundary_engine: 断句引擎，None 时使用配置
+            max_parallel: 同时转写/生成笔记的条目数，None 时使用配置 BATCH_MAX_PARALLEL
+            skip_processed: 是否跳过已生成过同格式输出的条目
+            progress: 可选回调 progress(stage, fraction, message, **fields)，fields 中的 items 为各条目状态
+
+        Returns:
+            dict: {status, items, summary}
+        """
+        config = current_app.config
+        app = current_app._get_current_object()
+        report = progress or (lambda stage, fraction, message, **fields: None)
+        max_parallel = max(1, int(max_parallel or config['BATCH_MAX_PARALLEL']))
+        prefetch = max(1, config['BATCH_PREFETCH'])
+
+        report('expand', 0.0, 'Expanding playlist...')
+        entries = BatchService.expand(playlist_url, video_urls, limit=config['BATCH_MAX_ITEMS'])
+        if not entries:
+            return {'status': 'error', 'message': '没有可处理的视频条目'}
+
+        items = [dict(entry, index=i, status='pending', caption_filename=None, pdf_filename=None,
+                      finished_at=None) for i, entry in enumerate(entries)]
+        lock = threading.Lock()
+
+        def update(item, **fields):
+            with lock:
+                item.update(fields)
+                if fields.get('status') in FINISHED_STATUSES:
+                    item['finished_at'] = datetime.now().isoformat()
+                finished = sum(1 for i in items if i['status'] in FINISHED_STATUSES)
+                failed = sum(1 for i in items if i['status'] == 'failed')
+                snapshot = [dict(i) for i in items]
+            report('batch', finished / len(items), f"{finished}/{len(items)} entries finished, {failed} failed",
+                   items=snapshot)
+
+        todo = []
+        for item in items:
+            if item['error']:
+                update(item, status='failed')
+                continue
+            output = BatchService._processed_output(item, output_format) if skip_processed else None
+            if output:
+                update(item, status='skipped', video_id=output['video_id'],
+                       caption_filename=output['caption_filename'], pdf_filename=output.get('pdf_filename'))
+            else:
+                todo.append(item)
+        print(f"[Batch] {len(items)} entries, {len(items) - len(todo)} already processed, "
+              f"parallel={max_parallel}, prefetch={prefetch}")
+
+        # 已下载但尚未处理完的条目数上限：处理线程各占一个，另外最多提前下载 prefetch 个
+        slots = threading.BoundedSemaphore(max_parallel + prefetch)
+
+        def fetch(item):
+            slots.acquire()
+            with app.app_context():
+                update(item, status='downloading')
+                media = acquire_media(item['url'])
+                if media:
+                    # 已下载、等待处理的条目不会被存储配额淘汰
+                    get_storage_manager().pin(media['video_id'])
+                return media
+
+        def process(item, fetched):
+            with app.app_context():
+                media = None
+                try:
+                    media = fetched.result()
+                    if not media:
+                        update(item, status='failed', error='无法下载或处理该视频链接')
+                        return
+                    update(item, status='processing', video_id=media['video_id'])
+                    result = VideoService.process_video(
+                        item['url'], output_format=output_format, save_to_storage=save_to_storage,
+                        boundary_engine=boundary_engine
+                    )
+                    if result['status'] == 'error':
+                        update(item, status='failed', error=result['message'])
+                        return
+                    update(item, status='succeeded', caption_filename=os.path.basename(result['caption_path']),
+                           pdf_filename=os.path.basename(result['pdf_path']) if 'pdf_path' in result else None)
+                except Exception as e:
+                    print(f"[Batch] Entry {item['url']} failed: {e}")
+                    update(item, status='failed', error=str(e))
+                finally:
+                    if media:
+                        get_storage_manager().unpin(media['video_id'])
+                    slots.release()
+
+        with ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix='BatchFetch') as fetch_pool, \
+                ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='BatchProcess') as process_pool:
+            for item in todo:
+                process_pool.submit(process, item, fetch_pool.submit(fetch, item))
+
+        summary = {status: sum(1 for i in items if i['status'] == status) for status in FINISHED_STATUSES}
+        summary['total'] = len(items)
+        print(f"[Batch] Done: {summary}")
+        return {'status': 'success', 'items': items, 'summary': summary}
@@ -0,0 +1,287 @@
+"""
+异步任务服务
+提交后立即返回任务ID，由有界线程池在后台执行视频字幕/笔记、QQ音乐歌词与批量导入任务。
+任务状态以 JSON 文件保存在 JOBS_DIR（每个任务一个文件，原子替换写入），Web 进程重启后仍可查询；
+执行中的任务持有 <id>.lock 文件锁（锁文件与任务文件一同保留），进程退出后锁自动释放，未完成的任务由重启后的进程重新执行。
+"""
+import json
+import os
+import re
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+
+from app.services.video_service import VideoService
+from app.services.music_service import MusicService
+from app.services.batch_service import BatchService
+from app.utils.file_lock import FileLock
+
+JOB_TYPES = ('video', 'music', 'batch')
+ACTIVE_STATUSES = ('queued', 'running')
+
+_JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+# 进度写盘节流：阶段未变且进度变化不足 1% 时不写文件
+_PROGRESS_STEP = 0.01
+
+
+class JobQueueFullError(RuntimeError):
+    """排队任务数达到 JOB_MAX_PENDING"""
+
+
+class JobService:
+    """异步任务服务类"""
+
+    _executor = None
+    _pending = 0
+    _recovered = False
+    _lock = threading.Lock()
+    _file_lock = threading.Lock()
+
+    @staticmethod
+    def _job_path(job_id):
+        return os.path.join(current_app.config['JOBS_DIR'], f"{job_id}.json")
+
+    @staticmethod
+    def _lock_path(job_id):
+        return os.path.join(current_app.config['JOBS_DIR'], f"{job_id}.lock")
+
+    @staticmethod
+    def _save(job):
+        """原子写入任务文件（先写临时文件再替换，读方不会读到半个 JSON）"""
+        job['updated_at'] = datetime.now().isoformat()
+        path = JobService._job_path(job['id'])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _update(job_id, **fields):
+        with JobService._file_lock:
+            job = JobService.get_job(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            JobService._save(job)
+            return job
+
+    @staticmethod
+    def _get_executor():
+        with JobService._lock:
+            if JobService._executor is None:
+                JobService._executor = ThreadPoolExecutor(
+                    max_workers=max(1, current_app.config['JOB_MAX_WORKERS']),
+                    thread_name_prefix='Job'
+                )
+            return JobService._executor
+
+    @staticmethod
+    def _reserve_slot(enforce_limit=True):
+        """占用一个排队名额（接管孤儿任务时不受上限约束）"""
+        max_pending = current_app.config['JOB_MAX_PENDING']
+        with JobService._lock:
+            if enforce_limit and max_pending > 0 and JobService._pending >= max_pending:
+                raise JobQueueFullError(f"排队任务已达上限 {max_pending}")
+            JobService._pending += 1
+
+    @staticmethod
+    def _enqueue(job_id, lock):
+        """把已持有文件锁、已占用排队名额的任务放入线程池"""
+        JobService._get_executor().submit(
+            JobService._run, current_app._get_current_object(), job_id, lock
+        )
+
+    @staticmethod
+    def get_job(job_id):
+        """
+        读取任务状态
+
+        Returns:
+            dict: 任务记录，不存在（或ID非法）时返回 None
+        """
+        if not job_id or not _JOB_ID_RE.match(job_id):
+            return None
+        try:
+            with open(JobService._job_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def list_jobs(limit=50, status=None):
+        """按创建时间倒序列出任务"""
+        jobs_dir = current_app.config['JOBS_DIR']
+        jobs = []
+        for name in os.listdir(jobs_dir):
+            if not name.endswith('.json'):
+                continue
+            job = JobService.get_job(name[:-5])
+            if job and (status is None or job['status'] == status):
+                jobs.append(job)
+        jobs.sort(key=lambda j: j['created_at'], reverse=True)
+        return jobs[:limit]
+
+    @staticmethod
+    def submit(job_type, params):
+        """
+        创建任务并放入线程池
+
+        Args:
+            job_type: 'video'（VideoService.process_video）、'music'（MusicService.process_qq_music）
+                或 'batch'（BatchService.process_batch）
+            params: 传给处理函数的关键字参数
+
+        Returns:
+            dict: 任务记录
+
+        Raises:
+            ValueError: 未知的任务类型
+            JobQueueFullError: 排队任务数达到上限
+        """
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"未知的任务类型: {job_type}")
+        JobService.recover()
+        JobService._reserve_slot()
+
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'type': job_type,
+            'params': params,
+            'status': 'queued',
+            'stage': 'queued',
+            'progress': 0.0,
+            'message': None,
+            'result': None,
+            'error': None,
+            'attempts': 0,
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+        }
+        lock = FileLock(JobService._lock_path(job_id))
+        try:
+            lock.acquire()
+            JobService._save(job)
+            JobService._enqueue(job_id, lock)
+        except Exception:
+            lock.release()
+            with JobService._lock:
+                JobService._pending -= 1
+            raise
+        print(f"[Job {job_id}] Queued {job_type} job")
+        return job
+
+    @staticmethod
+    def recover():
+        """
+        接管孤儿任务（每个进程只扫描一次）
+
+        状态为 queued / running 但文件锁空闲的任务，其所属进程已退出：
+        尝试次数未超过 JOB_MAX_ATTEMPTS 时重新排队，否则标记为失败
+        """
+        with JobService._lock:
+            if JobService._recovered:
+                return
+            JobService._recovered = True
+
+        max_attempts = current_app.config['JOB_MAX_ATTEMPTS']
+        for job in JobService.list_jobs(limit=None):
+            if job['status'] not in ACTIVE_STATUSES:
+                continue
+            lock = FileLock(JobService._lock_path(job['id']))
+            if not lock.acquire(blocking=False):
+                continue  # 另一个存活的进程正在执行
+            # 拿到锁后重新读取，排除扫描之后刚刚完成的任务
+            job = JobService.get_job(job['id'])
+            if job is None or job['status'] not in ACTIVE_STATUSES:
+                lock.release()
+                continue
+            if job['attempts'] >= max_attempts:
+                JobService._update(job['id'], status='failed', error='任务执行中断次数过多',
+                                   finished_at=datetime.now().isoformat())
+                lock.release()
+                print(f"[Job {job['id']}] Interrupted {job['attempts']} times, marked as failed")
+                continue
+            JobService._reserve_slot(enforce_limit=False)
+            try:
+                JobService._update(job['id'], status='queued', stage='queued', message='Requeued after restart')
+                JobService._enqueue(job['id'], lock)
+            except Exception as e:
+                # 释放锁与名额，任务留待之后的接管
+                lock.release()
+                with JobService._lock:
+                    JobService._pending -= 1
+                print(f"[Job {job['id']}] Failed to requeue orphaned job: {e}")
+                continue
+            print(f"[Job {job['id']}] Requeued orphaned {job['type']} job")
+
+    @staticmethod
+    def _progress_reporter(job_id):
+        """生成处理函数用的进度回调（节流写盘；附带其他字段（如批量任务的 items）时总是写入）"""
+        last = {'stage': None, 'progress': -1.0}
+
+        def report(stage, fraction, message=None, **fields):
+            fraction = round(min(max(fraction, 0.0), 1.0), 3)
+            if not fields and stage == last['stage'] and fraction - last['progress'] < _PROGRESS_STEP:
+                return
+            last['stage'], last['progress'] = stage, fraction
+            JobService._update(job_id, stage=stage, progress=fraction, message=message, **fields)
+
+        return report
+
+    @staticmethod
+    def _collect_result(job_type, result):
+        """从处理结果中提取可下载的产物（只记录文件名，文件本身保留在各数据目录）"""
+        if job_type == 'batch':
+            return {'output_format': 'report', 'items': result['items'], 'summary': result['summary']}
+        artifacts = {'output_format': 'pdf' if 'pdf_path' in result else 'txt', 'filename': result.get('filename')}
+        if 'pdf_path' in result:
+            artifacts['pdf_filename'] = os.path.basename(result['pdf_path'])
+        if job_type == 'video':
+            artifacts['caption_filename'] = os.path.basename(result['caption_path'])
+            artifacts['media_filename'] = os.path.basename(result['audio_path'])
+        else:
+            artifacts['song_name'] = result.get('song_name')
+            artifacts['artist_name'] = result.get('artist_name')
+            if 'lyrics_text' in result:
+                artifacts['lyrics_text'] = result['lyrics_text']
+        return artifacts
+
+    @staticmethod
+    def _run(app, job_id, lock):
+        with app.app_context():
+            try:
+                job = JobService.get_job(job_id)
+                job = JobService._update(
+                    job_id, status='running', stage='starting', attempts=job['attempts'] + 1,
+                    started_at=datetime.now().isoformat()
+                )
+                print(f"[Job {job_id}] Running {job['type']} job (attempt {job['attempts']})")
+                handler = {
+                    'video': VideoService.process_video,
+                    'music': MusicService.process_qq_music,
+                    'batch': BatchService.process_batch,
+                }[job['type']]
+                result = handler(progress=JobService._progress_reporter(job_id), **job['params'])
+                if result['status'] == 'error':
+                    JobService._update(job_id, status='failed', error=result['message'],
+                                       finished_at=datetime.now().isoformat())
+                    print(f"[Job {job_id}] Failed: {result['message']}")
+                else:
+                    JobService._update(job_id, status='succeeded', stage='done', progress=1.0, message=None,
+                                       result=JobService._collect_result(job['type'], result),
+                                       finished_at=datetime.now().isoformat())
+                    print(f"[Job {job_id}] Succeeded")
+            except Exception as e:
+                print(f"[Job {job_id}] Error: {e}")
+                traceback.print_exc()
+                JobService._update(job_id, status='failed', error=str(e), finished_at=datetime.now().isoformat())
+            finally:
+                lock.release()
+                with JobService._lock:
+                    JobService._pending -= 1
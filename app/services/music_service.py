@@ -8,13 +8,15 @@ from app.utils.music import extract_qq_music_song_id, get_qq_music_lyrics
 from app.utils.ai import generate_lyrics_notes_from_text
 from app.utils.pdf import create_pdf_from_notes
 from app.services.note_service import NoteService
+from app.utils.metrics import track_in_flight
 
 
 class MusicService:
     """音乐处理服务类"""
     
     @staticmethod
-    def process_qq_music(music_url, output_format='pdf', save_to_storage=False):
+    @track_in_flight('qq_music')
+    def process_qq_music(music_url, output_format='pdf', save_to_storage=False, progress=None):
         """
         处理QQ音乐链接，提取歌词并生成笔记
         
@@ -22,11 +24,13 @@ class MusicService:
             music_url: QQ音乐URL
             output_format: 输出格式 ('txt' 或 'pdf')
             save_to_storage: 是否保存到笔记存储区
+            progress: 可选回调 progress(stage, fraction, message)，上报当前阶段与整体进度（0~1）
         
         Returns:
             dict: 处理结果
         """
         result = {'status': 'success'}
+        report = progress or (lambda stage, fraction, message: None)
         
         # 1. 提取歌曲ID
         song_id = extract_qq_music_song_id(music_url)
@@ -34,6 +38,7 @@ class MusicService:
             return {'status': 'error', 'message': '无法从链接中提取歌曲ID，请检查链接格式'}
         
         # 2. 获取歌词
+        report('lyrics', 0.1, 'Fetching lyrics...')
         song_name, artist_name, lyrics_text = get_qq_music_lyrics(song_id)
         if not lyrics_text:
             return {'status': 'error', 'message': '无法获取该歌曲的歌词'}
@@ -49,6 +54,7 @@ class MusicService:
             return result
         
         # 4. 生成PDF笔记
+        report('notes', 0.3, 'Generating notes with AI...')
         notes_text = generate_lyrics_notes_from_text(lyrics_text, song_name, artist_name)
         if not notes_text:
             return {'status': 'error', 'message': '调用大模型生成歌词笔记失败'}
@@ -60,6 +66,7 @@ class MusicService:
             NoteService.save_note(md_filename, notes_text, music_title, 'music')
         
         # 6. 创建PDF文件
+        report('pdf', 0.9, 'Creating PDF...')
         pdf_filename = f"{song_id}_lyrics_notes.pdf"
         pdf_dir = current_app.config['PDF_DIR']
         pdf_path = os.path.join(pdf_dir, pdf_filename)
@@ -2,124 +2,294 @@
 视频处理服务
 处理视频下载、字幕提取、笔记生成
 """
+import json
 import os
+import queue
 import threading
 from flask import current_app
-from app.utils.audio import download_audio, download_video
-from app.utils.caption import generate_caption
+from app.utils.audio import acquire_media
+from app.utils.download_executor import describe_progress
+from app.utils.caption import NO_CAPTION_TEXT, generate_caption
 from app.utils.ai import generate_notes_from_text
 from app.utils.pdf import create_pdf_from_notes
+from app.utils.notes_pipeline import NotesPipeline
 from app.services.note_service import NoteService
+from app.utils.media_manifest import get_media_manifest
+from app.utils.metrics import track_in_flight
+from app.utils.storage_manager import get_storage_manager
+from app.utils.single_flight import flight_key, get_single_flight, normalize_url
 
 
 class VideoService:
     """视频处理服务类"""
     
     @staticmethod
-    def _download_video_background(app, video_url, video_id):
+    @track_in_flight('stream_caption')
+    def stream_caption(video_url, boundary_engine=None):
         """
-        后台下载视频（用于影子跟读）
-        在独立线程中运行，不阻塞主流程
+        流式生成字幕：下载音频后边解码边产出字幕段
         
-        注意：视频下载失败不影响字幕生成，音频文件仍可用于影子跟读
+        产出 (event, data) 事件：
+        - ('status', {stage, message})：阶段进度（与其他请求共用转写时附带 progress，转写完成比例）
+        - ('media', {filename, video_id, video_status})：音频已就绪，可立即在影子跟读中播放；
+          video_status 为影子跟读 MP4 的状态（ready / downloading，由本地混流生成）
+        - ('info' / 'segment' / 'blocks')：见 iter_caption_events
+        - ('done', {caption_filename, media_filename, boundary})：字幕文件已写入
+        - ('error', {message})：处理失败
+        
+        Args:
+            video_url: 视频URL
+            boundary_engine: 断句引擎（local / llm / hybrid），None 时使用配置
         """
-        import time
-        with app.app_context():
-            try:
-                print(f"\n[Background-{video_id}] ==========================================")
-                print(f"[Background-{video_id}] Starting background video download")
-                print(f"[Background-{video_id}] URL: {video_url}")
-                print(f"[Background-{video_id}] ==========================================")
-                
-                start_time = time.time()
-                video_path = download_video(video_url, download_type='video')
-                elapsed = time.time() - start_time
-                
-                if video_path:
-                    print(f"\n[Background-{video_id}] ✓ SUCCESS")
-                    print(f"[Background-{video_id}] Video downloaded in {elapsed:.1f}s")
-                    print(f"[Background-{video_id}] Path: {video_path}")
-                    print(f"[Background-{video_id}] You can now use this video for shadowing practice")
-                else:
-                    print(f"\n[Background-{video_id}] ✗ FAILED")
-                    print(f"[Background-{video_id}] Video download did not complete successfully")
-                    print(f"[Background-{video_id}] Don't worry - audio file is still available for shadowing")
-                    print(f"[Background-{video_id}] You can practice with audio-only mode")
-                    
-            except Exception as e:
-                print(f"\n[Background-{video_id}] ✗ ERROR in background download")
-                print(f"[Background-{video_id}] Error: {e}")
-                print(f"[Background-{video_id}] This doesn't affect your subtitle generation")
-                print(f"[Background-{video_id}] Audio file is still available for shadowing practice")
-                import traceback
-                traceback.print_exc()
-            finally:
-                print(f"[Background-{video_id}] Background thread completed\n")
+        yield 'status', {'stage': 'download', 'message': 'Downloading audio...'}
+        media = acquire_media(video_url)
+        if not media:
+            yield 'error', {'message': '无法下载或处理该视频链接'}
+            return
+        
+        audio_path = media['audio_path']
+        media_filename = os.path.basename(audio_path)
+        yield 'media', {
+            'filename': media_filename,
+            'video_id': media['video_id'],
+            'video_status': media['video_status'],
+        }
+        
+        yield 'status', {'stage': 'transcribe', 'message': 'Generating subtitles with Whisper...'}
+        # 转写在后台线程中进行（与同一视频的其他请求合并），事件经队列交给本生成器；
+        # 客户端断开后转写继续完成，字幕文件照常写出
+        events = queue.Queue()
+        streamed = threading.Event()
+        app = current_app._get_current_object()
+        
+        def on_event(event, data):
+            streamed.set()
+            events.put((event, data))
+        
+        def on_progress(stage, fraction, message):
+            # 合并到其他请求的转写时收不到逐段事件，改为推送进度
+            if not streamed.is_set():
+                events.put(('status', {'stage': stage, 'progress': round(fraction, 3), 'message': message}))
+        
+        def run():
+            with app.app_context(), get_storage_manager().pinned(media['video_id']):
+                try:
+                    events.put(('result', VideoService._transcribe(
+                        media, boundary_engine=boundary_engine, on_event=on_event, progress=on_progress
+                    )))
+                except Exception as e:
+                    print(f"流式生成字幕失败: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    events.put(('error', {'message': f'生成字幕失败: {str(e)}'}))
+        
+        threading.Thread(target=run, daemon=True, name=f"StreamCaption-{media['video_id']}").start()
+        blocks_sent = False
+        while True:
+            event, data = events.get()
+            if event == 'error':
+                yield event, data
+                return
+            if event == 'result':
+                break
+            if event == 'done':
+                continue
+            blocks_sent = blocks_sent or event == 'blocks'
+            yield event, data
+        
+        if not data['caption_path']:
+            yield 'error', {'message': '生成字幕失败'}
+            return
+        if not blocks_sent:
+            with open(data['json_path'], 'r', encoding='utf-8') as f:
+                yield 'blocks', json.load(f)
+        yield 'done', {
+            'caption_filename': os.path.basename(data['caption_path']),
+            'media_filename': media_filename,
+            'boundary': data['boundary'],
+        }
     
     @staticmethod
-    def process_video(video_url, output_format='pdf', save_to_storage=False, download_type='audio'):
+    @track_in_flight('process_video')
+    def process_video(video_url, output_format='pdf', save_to_storage=False, download_type='audio',
+                      boundary_engine=None, progress=None):
         """
         处理视频，生成字幕和笔记
         
         策略：
-        1. 总是先下载音频（快速）
-        2. 如果用户选择了视频或未指定，后台异步下载视频（用于影子跟读）
+        1. 总是先下载音频（快速），已在磁盘上的产物直接复用
+        2. 后台只下载画面流，与音频本地混流为影子跟读用的 MP4（音频不会下载两次）
+        
+        相同任务合并：同一规范化链接 + 相同参数同时提交时只处理一次（跨线程与 worker 进程），
+        下载完成拿到视频ID后再按 视频ID + 参数 合并，同一视频的不同链接写法共享后续的笔记结果；
+        转写只按视频ID合并（输出格式等参数不同的请求也共用一次转写）。合并的请求都会收到进度
         
         Args:
             video_url: 视频URL
             output_format: 输出格式 ('txt' 或 'pdf')
             save_to_storage: 是否保存到笔记存储区
             download_type: 下载类型 ('audio' 或 'video')，默认'audio'会后台下载视频
+            boundary_engine: 断句引擎（local / llm / hybrid），None 时使用配置 CAPTION_BOUNDARY_ENGINE
+            progress: 可选回调 progress(stage, fraction, message)，上报当前阶段与整体进度（0~1）
         
         Returns:
             dict: 处理结果
         """
-        result = {'status': 'success'}
-        
-        # 1. 总是先下载音频（用于快速生成字幕）
+        params = {
+            'output_format': output_format,
+            'save_to_storage': bool(save_to_storage),
+            'boundary_engine': boundary_engine,
+        }
+        report = progress or (lambda stage, fraction, message, **fields: None)
+        key = flight_key('video', normalize_url(video_url), **params)
+        return get_single_flight().do(
+            key, lambda fan_out: VideoService._process_video(video_url, params, fan_out), progress=report
+        )
+    
+    @staticmethod
+    def _process_video(video_url, params, report):
+        """下载音频后按视频ID合并后续处理"""
+        # 1. 总是先下载音频（用于快速生成字幕），影子跟读用的 MP4 在后台由本地混流生成
         print("=" * 60)
-        print("STEP 1/5: Downloading audio...")
+        print("STEP 1/4: Acquiring media (audio first, video remuxed in background)...")
         print("=" * 60)
-        audio_path = download_audio(video_url)
+        report('download', 0.0, 'Downloading audio...')
+        
+        def on_download_progress(p):
+            # 按已下载字节数把下载阶段映射到 0 ~ 0.2
+            report('download', 0.2 * (p.get('fraction') or 0.0), f"Downloading audio: {describe_progress(p)}")
         
-        if not audio_path:
+        media = acquire_media(video_url, on_progress=on_download_progress)
+        
+        if not media:
             return {'status': 'error', 'message': '无法下载或处理该视频链接'}
+        print(f"[OK] Audio ready: {os.path.basename(media['audio_path'])} (video: {media['video_status']})")
+        
+        # 2. 按视频ID合并后续处理（处理期间该视频的产物不会被存储配额淘汰）
+        key = flight_key('video-id', media['video_id'], **params)
+        with get_storage_manager().pinned(media['video_id']):
+            result = get_single_flight().do(
+                key, lambda fan_out: VideoService._process_audio(media, fan_out, **params), progress=report
+            )
+        if result['status'] == 'success':
+            outputs = {'caption_filename': os.path.basename(result['caption_path'])}
+            if 'pdf_path' in result:
+                outputs['pdf_filename'] = os.path.basename(result['pdf_path'])
+            get_media_manifest().record_output(media['video_id'], params['output_format'], **outputs)
+        return result
+    
+    @staticmethod
+    def _transcribe(media, boundary_engine=None, on_event=None, progress=None):
+        """
+        转写并写出字幕文件，按视频ID合并：同一视频同时只有一个转写在写 captions/<id>* 文件
         
-        result['audio_path'] = audio_path
-        print(f"[OK] Audio saved: {os.path.basename(audio_path)}")
+        合并到进行中的转写时（follower）收不到逐段事件，只收到进度，结束后共用同一份结果；
+        进行中的转写断句引擎不同时，等它结束后再按自己的引擎转写一次
         
-        # 2. 提取video_id用于后台下载视频
-        video_id = os.path.splitext(os.path.basename(audio_path))[0]
+        Args:
+            media: acquire_media 的返回值
+            boundary_engine: 断句引擎，None 时使用配置
+            on_event: 可选回调 on_event(event, data)，接收 iter_caption_events 的事件（只有执行转写的一方收到）
+            progress: 可选回调 progress(stage, fraction, message)，fraction 为转写完成比例（0~1）
         
-        # 3. 启动后台下载任务（总是下载视频用于影子跟读）
-        print("\n" + "=" * 60)
-        print("STEP 2/5: Starting background video download...")
-        print("=" * 60)
-        try:
-            thread = threading.Thread(
-                target=VideoService._download_video_background,
-                args=(current_app._get_current_object(), video_url, video_id),
-                daemon=True,
-                name=f"VideoDownload-{video_id}"
+        Returns:
+            dict: {caption_path, caption_text, json_path, boundary, boundary_engine}，失败时 caption_path 为 None
+        """
+        engine = (boundary_engine or current_app.config['CAPTION_BOUNDARY_ENGINE']).lower()
+        
+        def transcribe(report):
+            duration, done = {}, {}
+            
+            def handle(event, data):
+                if event == 'info':
+                    duration['total'] = data.get('duration')
+                elif event == 'segment' and duration.get('total'):
+                    report('transcribe', min(1.0, data['end'] / duration['total']),
+                           f"Transcribed {data['end']:.0f}s / {duration['total']:.0f}s")
+                elif event == 'done':
+                    done.update(data)
+                if on_event is not None:
+                    on_event(event, data)
+            
+            generate_caption(media['audio_path'], boundary_engine=engine, on_event=handle)
+            return {
+                'caption_path': done.get('caption_path'),
+                'caption_text': done.get('caption_text'),
+                'json_path': done.get('json_path'),
+                'boundary': done.get('boundary'),
+                'boundary_engine': engine,
+            }
+        
+        key = flight_key('caption', media['video_id'])
+        while True:
+            result = get_single_flight().do(
+                key, transcribe, progress=progress or (lambda stage, fraction, message: None)
             )
-            thread.start()
-            result['video_downloading'] = True
-            print(f"[OK] Background thread started")
-            print(f"  → Video download running in background (won't block subtitle generation)")
-            print(f"  → Check console logs for progress")
-            print(f"  → If video download fails, audio is still available for shadowing")
-        except Exception as e:
-            print(f"[WARNING] Failed to start background download: {e}")
-            print(f"  → Continuing with audio-only mode")
-            result['video_downloading'] = False
+            if result['boundary_engine'] == engine:
+                return result
+            print(f"In-flight transcription used boundary engine {result['boundary_engine']}, re-running with {engine}")
+    
+    @staticmethod
+    def _feed_blocks(pipeline, blocks):
+        """把最终句子区块依次交给笔记流水线（跳过“无字幕”静音区块）"""
+        for block in blocks or []:
+            if block.get('text') != NO_CAPTION_TEXT:
+                pipeline.add_text(block.get('text'))
+    
+    @staticmethod
+    def _process_audio(media, report, output_format, save_to_storage, boundary_engine):
+        """生成字幕、笔记与PDF"""
+        audio_path = media['audio_path']
+        result = {
+            'status': 'success',
+            'audio_path': audio_path,
+            'video_downloading': media['video_status'] == 'downloading',
+        }
         
         # 4. 生成字幕文本（Whisper可以处理视频和音频）
         print("\n" + "=" * 60)
-        print("STEP 3/5: Generating subtitles with Whisper...")
+        print("STEP 2/4: Generating subtitles with Whisper...")
         print("=" * 60)
-        caption_path, caption_text = generate_caption(audio_path)
+        report('transcribe', 0.2, 'Generating subtitles with Whisper...')
+        
+        # PDF 输出时边解码边把完整句子分批送去生成笔记
+        pipeline = None
+        if output_format != 'txt' and current_app.config['NOTES_PIPELINE_ENABLED']:
+            pipeline = NotesPipeline(
+                batch_words=current_app.config['NOTES_PIPELINE_BATCH_WORDS'],
+                max_concurrency=current_app.config['NOTES_PIPELINE_MAX_CONCURRENCY'],
+                generate=generate_notes_from_text
+            )
+        received = {'events': False, 'segments': False}
+        
+        def on_caption_event(event, data):
+            if pipeline is None:
+                return
+            if event == 'segment':
+                received['segments'] = True
+                pipeline.add_text(data['text'])
+            elif event == 'blocks' and not received['segments']:
+                # 命中字幕缓存时没有逐段事件，按最终句子区块分批
+                VideoService._feed_blocks(pipeline, data.get('segments'))
+            if event in ('segment', 'blocks'):
+                received['events'] = True
+        
+        def on_transcribe_progress(stage, fraction, message):
+            # 按已解码的音频时长把转写阶段映射到 0.2 ~ 0.7
+            report(stage, 0.2 + 0.5 * fraction, message)
+        
+        transcript = VideoService._transcribe(
+            media, boundary_engine=boundary_engine, on_event=on_caption_event, progress=on_transcribe_progress
+        )
+        caption_path, caption_text = transcript['caption_path'], transcript['caption_text']
         if not caption_path:
+            if pipeline is not None:
+                pipeline.cancel()
             return {'status': 'error', 'message': '生成字幕失败'}
+        if pipeline is not None and not received['events']:
+            # 共用了其他请求的转写（没有收到事件），按写出的句子区块分批
+            with open(transcript['json_path'], 'r', encoding='utf-8') as f:
+                VideoService._feed_blocks(pipeline, json.load(f).get('segments'))
         result['caption_path'] = caption_path
         result['caption_text'] = caption_text
         print(f"[OK] Subtitles saved: {os.path.basename(caption_path)}")
@@ -131,9 +301,14 @@ class VideoService:
         
         # 4. 生成PDF笔记
         print("\n" + "=" * 60)
-        print("STEP 4/5: Generating notes with AI...")
+        print("STEP 3/4: Generating notes with AI...")
         print("=" * 60)
-        notes_text = generate_notes_from_text(caption_text)
+        if pipeline is not None:
+            report('notes', 0.7, f'Waiting for {pipeline.batches} pipelined note batches...')
+            notes_text = pipeline.finish()
+        else:
+            report('notes', 0.7, 'Generating notes with AI...')
+            notes_text = generate_notes_from_text(caption_text)
         if not notes_text:
             return {'status': 'error', 'message': '调用大模型生成笔记失败'}
         print(f"[OK] Notes generated ({len(notes_text)} characters)")
@@ -147,8 +322,9 @@ class VideoService:
         
         # 6. 创建PDF文件
         print("\n" + "=" * 60)
-        print("STEP 5/5: Creating PDF...")
+        print("STEP 4/4: Creating PDF...")
         print("=" * 60)
+        report('pdf', 0.9, 'Creating PDF...')
         base_filename = os.path.splitext(os.path.basename(caption_path))[0]
         pdf_filename = f"{base_filename}_notes.pdf"
         pdf_dir = current_app.config['PDF_DIR']
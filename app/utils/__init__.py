@@ -1,29 +1,35 @@
 """
 工具函数模块
+
+子模块按需导入（PEP 562 模块级 __getattr__），
+`from app.utils import generate_caption` 只会加载对应的子模块，
+不会在应用启动时连带导入 faster_whisper、yt_dlp、openai、reportlab 等重量级依赖。
 """
-from app.utils.audio import download_audio
-from app.utils.caption import generate_caption
-from app.utils.ai import (
-    generate_notes_from_text,
-    generate_lyrics_notes_from_text,
-    transform_chinese_to_english
-)
-from app.utils.pdf import create_pdf_from_notes
-from app.utils.music import (
-    extract_qq_music_song_id,
-    get_qq_music_lyrics,
-    parse_lrc_lyrics
-)
+import importlib
+
+_EXPORTS = {
+    'download_audio': 'app.utils.audio',
+    'generate_caption': 'app.utils.caption',
+    'generate_notes_from_text': 'app.utils.ai',
+    'generate_lyrics_notes_from_text': 'app.utils.ai',
+    'transform_chinese_to_english': 'app.utils.ai',
+    'create_pdf_from_notes': 'app.utils.pdf',
+    'extract_qq_music_song_id': 'app.utils.music',
+    'get_qq_music_lyrics': 'app.utils.music',
+    'parse_lrc_lyrics': 'app.utils.music',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
 
-__all__ = [
-    'download_audio',
-    'generate_caption',
-    'generate_notes_from_text',
-    'generate_lyrics_notes_from_text',
-    'transform_chinese_to_english',
-    'create_pdf_from_notes',
-    'extract_qq_music_song_id',
-    'get_qq_music_lyrics',
-    'parse_lrc_lyrics'
-]
 
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -2,10 +2,112 @@
 AI工具
 使用OpenAI API进行文本生成、转换和语音合成
 """
-import os
-from openai import OpenAI
+import threading
+from flask import current_app, has_app_context
+from app.config import Config
+from app.utils.metrics import REGISTRY, timed_stage
+
+LLM_HTTP_REQUESTS_TOTAL = REGISTRY.counter(
+    'sayit_llm_http_requests_total',
+    'HTTP requests sent to the OpenAI API, including SDK retries.'
+)
+LLM_CONNECTIONS_OPENED_TOTAL = REGISTRY.counter(
+    'sayit_llm_connections_opened_total',
+    'New connections opened to the OpenAI API; the remaining requests reused a pooled keep-alive connection.'
+)
+LLM_TLS_HANDSHAKES_TOTAL = REGISTRY.counter(
+    'sayit_llm_tls_handshakes_total',
+    'TLS handshakes performed with the OpenAI API.'
+)
+
+_client = None
+_client_key = None
+_clients_created = 0
+_client_lock = threading.Lock()
+
+
+def _setting(name):
+    """读取配置：有应用上下文时取 current_app.config，否则取默认 Config"""
+    if has_app_context():
+        return current_app.config[name]
+    return getattr(Config, name)
+
+
+def _trace_connection(event_name, info):
+    """httpx trace 扩展回调：统计新建连接与 TLS 握手"""
+    if event_name == 'connection.connect_tcp.complete':
+        LLM_CONNECTIONS_OPENED_TOTAL.inc()
+    elif event_name == 'connection.start_tls.complete':
+        LLM_TLS_HANDSHAKES_TOTAL.inc()
+
+
+def _trace_request(request):
+    LLM_HTTP_REQUESTS_TOTAL.inc()
+    request.extensions['trace'] = _trace_connection
+
+
+def get_openai_client():
+    """
+    获取进程内共享的 OpenAI 客户端（首次调用时创建）
 
+    所有大模型调用共用一个 HTTP 连接池，keep-alive 连接在调用之间复用，省去每次的 TCP 与 TLS 握手；
+    连接池大小、超时与重试次数取配置 OPENAI_*。客户端可被多个线程同时使用。
+    OPENAI_API_KEY / OPENAI_BASE_URL 变化时重新创建。
 
+    Returns:
+        OpenAI: 客户端；未配置 OPENAI_API_KEY 时返回 None
+    """
+    global _client, _client_key, _clients_created
+    api_key = _setting('OPENAI_API_KEY')
+    if not api_key:
+        return None
+    base_url = _setting('OPENAI_BASE_URL')
+    with _client_lock:
+        if _client is None or _client_key != (api_key, base_url):
+            import httpx
+            from openai import OpenAI, DefaultHttpxClient  # 延迟导入，只在首次调用大模型时加载
+
+            timeout = httpx.Timeout(_setting('OPENAI_TIMEOUT'), connect=_setting('OPENAI_CONNECT_TIMEOUT'))
+            http_client = DefaultHttpxClient(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=_setting('OPENAI_MAX_CONNECTIONS'),
+                    max_keepalive_connections=_setting('OPENAI_MAX_KEEPALIVE_CONNECTIONS'),
+                    keepalive_expiry=_setting('OPENAI_KEEPALIVE_EXPIRY'),
+                ),
+                event_hooks={'request': [_trace_request]},
+            )
+            _client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=timeout,
+                max_retries=_setting('OPENAI_MAX_RETRIES'),
+                http_client=http_client,
+            )
+            _client_key = (api_key, base_url)
+            _clients_created += 1
+            print(f"OpenAI 客户端已创建（连接池上限 {_setting('OPENAI_MAX_CONNECTIONS')}）")
+        return _client
+
+
+def get_openai_client_stats():
+    """共享客户端的连接复用统计"""
+    requests = LLM_HTTP_REQUESTS_TOTAL.value()
+    opened = LLM_CONNECTIONS_OPENED_TOTAL.value()
+    return {
+        'clients_created': _clients_created,
+        'requests': requests,
+        'connections_opened': opened,
+        'connections_reused': max(0, requests - opened),
+        'reuse_ratio': round(max(0, requests - opened) / requests, 4) if requests else 0.0,
+        'tls_handshakes': LLM_TLS_HANDSHAKES_TOTAL.value(),
+        'max_connections': _setting('OPENAI_MAX_CONNECTIONS'),
+        'max_keepalive_connections': _setting('OPENAI_MAX_KEEPALIVE_CONNECTIONS'),
+        'keepalive_expiry': _setting('OPENAI_KEEPALIVE_EXPIRY'),
+    }
+
+
+@timed_stage('notes_llm')
 def generate_notes_from_text(caption_text):
     """
     使用 OpenAI API 将字幕文本转换为结构化笔记
@@ -18,14 +120,10 @@ def generate_notes_from_text(caption_text):
     """
     try:
         print("正在调用大语言模型生成笔记...")
-        api_key = os.getenv("OPENAI_API_KEY")
-        base_url = os.getenv("OPENAI_BASE_URL")
-
-        if not api_key:
+        client = get_openai_client()
+        if client is None:
             print("错误: 未设置 OPENAI_API_KEY 环境变量。")
             return None
-        
-        client = OpenAI(api_key=api_key, base_url=base_url)
 
         prompt = f"""
 你是一个专业的英语学习笔记整理助手。
@@ -80,6 +178,7 @@ def generate_notes_from_text(caption_text):
         return None
 
 
+@timed_stage('notes_llm')
 def generate_lyrics_notes_from_text(lyrics_text, song_name="", artist_name=""):
     """
     使用 OpenAI API 将歌词文本转换为学习笔记
@@ -94,14 +193,10 @@ def generate_lyrics_notes_from_text(lyrics_text, song_name="", artist_name=""):
     """
     try:
         print("正在调用大语言模型生成歌词笔记...")
-        api_key = os.getenv("OPENAI_API_KEY")
-        base_url = os.getenv("OPENAI_BASE_URL")
-
-        if not api_key:
+        client = get_openai_client()
+        if client is None:
             print("错误: 未设置 OPENAI_API_KEY 环境变量。")
             return None
-        
-        client = OpenAI(api_key=api_key, base_url=base_url)
 
         title_section = f"歌曲：{song_name}\n歌手：{artist_name}\n\n" if song_name else ""
 
@@ -172,15 +267,11 @@ def transform_chinese_to_english(chinese_text, note_content=None, has_note=False
     """
     try:
         print("正在调用大语言模型进行文本转换...")
-        api_key = os.getenv("OPENAI_API_KEY")
-        base_url = os.getenv("OPENAI_BASE_URL")
-
-        if not api_key:
+        client = get_openai_client()
+        if client is None:
             error_msg = "未设置 OPENAI_API_KEY 环境变量。请创建 .env 文件并添加API密钥。"
             print(f"错误: {error_msg}")
             raise ValueError(error_msg)
-        
-        client = OpenAI(api_key=api_key, base_url=base_url)
 
         if has_note and note_content:
             # 使用笔记作为模板
@@ -283,10 +374,8 @@ def text_to_speech(text):
     """
     try:
         print("正在生成语音...")
-        api_key = os.getenv("OPENAI_API_KEY")
-        base_url = os.getenv("OPENAI_BASE_URL")
-
-        if not api_key:
+        client = get_openai_client()
+        if client is None:
             error_msg = "未设置 OPENAI_API_KEY 环境变量"
             print(f"错误: {error_msg}")
             raise ValueError(error_msg)
@@ -296,8 +385,6 @@ def text_to_speech(text):
             print(f"错误: {error_msg}")
             raise ValueError(error_msg)
         
-        client = OpenAI(api_key=api_key, base_url=base_url)
-
         # 使用 OpenAI TTS API
         # voice options: alloy, echo, fable, onyx, nova, shimmer
         # nova 是女声，比较自然
@@ -340,15 +427,11 @@ def get_sentence_break_indices_by_llm(words):
     - 边界尽量落在自然句子末尾；若需要补标点，请仍仅返回边界索引，我们将在下游统一补 '.'。
     """
     try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        base_url = os.getenv("OPENAI_BASE_URL")
-
-        if not api_key:
+        client = get_openai_client()
+        if client is None:
             print("错误: 未设置 OPENAI_API_KEY 环境变量。")
             return None
 
-        client = OpenAI(api_key=api_key, base_url=base_url)
-
         # 为避免超长，限制最大词数（保守 8000 tokens 以内）。
         # 实际视频通常较短，直接发送全部 words 即可。
         words_payload = words
@@ -389,6 +472,97 @@ def get_sentence_break_indices_by_llm(words):
         return None
 
 
+_PUNCT_SYSTEM_MSG = (
+    "You are a punctuation restoration expert for English spoken transcripts. "
+    "Task: Add ONLY sentence-final punctuation (. ! ?) where truly needed.\n\n"
+    "STRICT RULES:\n"
+    "1. Output MUST be a JSON array of strings with EXACTLY the same length as input\n"
+    "2. NEVER insert, remove, or reorder tokens\n"
+    "3. ONLY append punctuation to tokens that end a complete sentence\n"
+    "4. Most tokens should remain UNCHANGED - only 10-20% of tokens should get punctuation\n"
+    "5. Prefer '.' for statements; use '?' ONLY for clear questions; use '!' ONLY for strong exclamations\n\n"
+    "WHERE TO ADD PUNCTUATION:\n"
+    "- Natural sentence endings (complete thoughts)\n"
+    "- BEFORE discourse markers that start new sentences: 'So', 'But', 'Because', 'However', "
+    "'Therefore', 'Thus', 'Meanwhile', 'Afterwards', 'Finally', 'Anyway', 'Besides', 'Instead', "
+    "'Although', 'Though', 'Whereas', 'While' (when they start contrasting clauses)\n"
+    "- Only when the preceding tokens form a COMPLETE independent thought\n\n"
+    "WHERE NOT TO ADD:\n"
+    "- Mid-sentence words\n"
+    "- Conjunctions in the middle of compound sentences\n"
+    "- Articles, prepositions, or auxiliary words\n\n"
+    "EXAMPLE:\n"
+    "Input: [' I', ' just', ' made', ' some', ' coffee', ' so', ' I', ' was', ' able', ' to', ' relax']\n"
+    "Output: [' I', ' just', ' made', ' some', ' coffee.', ' so', ' I', ' was', ' able', ' to', ' relax']\n"
+    "(Only 'coffee' gets '.', NOT every word)\n\n"
+    "Return ONLY the JSON array, no explanation."
+)
+
+
+def _restore_punct_window(client, words):
+    """
+    对单个窗口的词序列调用大模型恢复句末标点
+
+    Returns:
+        list: 等长字符串列表；模型输出不合法或调用失败时返回 None
+    """
+    user_msg = (
+        "Restore sentence-final punctuation for these tokens. "
+        "Remember: only 10-20% of tokens should get punctuation!\n\n"
+        "Tokens:\n" + str(words)
+    )
+    resp = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": _PUNCT_SYSTEM_MSG},
+            {"role": "user", "content": user_msg},
+        ],
+        temperature=0.0,
+        # 输出是与输入等长的 JSON 数组，按窗口长度预留足够的输出 token，避免被截断
+        max_tokens=min(16384, 256 + 6 * len(words)),
+    )
+    content = resp.choices[0].message.content.strip()
+    import json as _json
+    out = _json.loads(content)
+    if not isinstance(out, list) or len(out) != len(words):
+        print("LLM 标点恢复返回格式不符合预期（需等长字符串数组）")
+        return None
+    if not all(isinstance(s, str) for s in out):
+        print("LLM 标点恢复数组元素需为字符串")
+        return None
+    return out
+
+
+def plan_punct_windows(total, window_size, overlap):
+    """
+    把长度为 total 的词序列切分为相互重叠的窗口
+
+    相邻窗口重叠 overlap 个词；重叠区以中点为界，前一半归前一个窗口、后一半归后一个窗口，
+    这样每个词的标点都来自“两侧都有上下文”的那个窗口，且合并结果与调用完成顺序无关。
+
+    Returns:
+        list: [(start, end, own_start, own_end), ...]，窗口为 [start, end)，采纳结果的区间为 [own_start, own_end)
+    """
+    if total <= window_size:
+        return [(0, total, 0, total)]
+    overlap = max(0, min(overlap, window_size // 2))
+    step = window_size - overlap
+    windows = []
+    start = 0
+    while True:
+        end = min(start + window_size, total)
+        windows.append([start, end])
+        if end >= total:
+            break
+        start += step
+    planned = []
+    for k, (start, end) in enumerate(windows):
+        own_start = 0 if k == 0 else (start + windows[k - 1][1]) // 2
+        own_end = total if k == len(windows) - 1 else (windows[k + 1][0] + end) // 2
+        planned.append((start, end, own_start, own_end))
+    return planned
+
+
 def restore_sentence_final_punct_by_llm(words):
     """
     使用大模型在不改动词序与词数的前提下，只在需要的词尾添加句末标点（. ! ?）。
@@ -397,63 +571,50 @@ def restore_sentence_final_punct_by_llm(words):
     要求：
     - 模型仅返回 JSON 数组（与输入等长），每个元素为字符串。
     - 不允许删除/新增词，不允许在中间词添加标点；仅允许在自然句末为该词追加 . ! ?。
+
+    长文本按重叠窗口切分（LLM_PUNCT_WINDOW_TOKENS / LLM_PUNCT_OVERLAP_TOKENS），
+    以有限并发（LLM_PUNCT_MAX_CONCURRENCY）同时请求，再按窗口归属区间合并回等长数组；
+    单个窗口失败时该窗口保留原词，不影响其余窗口。全部失败时返回 None。
     """
     try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        base_url = os.getenv("OPENAI_BASE_URL")
-        if not api_key:
+        client = get_openai_client()
+        if client is None:
             print("错误: 未设置 OPENAI_API_KEY 环境变量。")
             return None
 
-        client = OpenAI(api_key=api_key, base_url=base_url)
-        system_msg = (
-            "You are a punctuation restoration expert for English spoken transcripts. "
-            "Task: Add ONLY sentence-final punctuation (. ! ?) where truly needed.\n\n"
-            "STRICT RULES:\n"
-            "1. Output MUST be a JSON array of strings with EXACTLY the same length as input\n"
-            "2. NEVER insert, remove, or reorder tokens\n"
-            "3. ONLY append punctuation to tokens that end a complete sentence\n"
-            "4. Most tokens should remain UNCHANGED - only 10-20% of tokens should get punctuation\n"
-            "5. Prefer '.' for statements; use '?' ONLY for clear questions; use '!' ONLY for strong exclamations\n\n"
-            "WHERE TO ADD PUNCTUATION:\n"
-            "- Natural sentence endings (complete thoughts)\n"
-            "- BEFORE discourse markers that start new sentences: 'So', 'But', 'Because', 'However', "
-            "'Therefore', 'Thus', 'Meanwhile', 'Afterwards', 'Finally', 'Anyway', 'Besides', 'Instead', "
-            "'Although', 'Though', 'Whereas', 'While' (when they start contrasting clauses)\n"
-            "- Only when the preceding tokens form a COMPLETE independent thought\n\n"
-            "WHERE NOT TO ADD:\n"
-            "- Mid-sentence words\n"
-            "- Conjunctions in the middle of compound sentences\n"
-            "- Articles, prepositions, or auxiliary words\n\n"
-            "EXAMPLE:\n"
-            "Input: [' I', ' just', ' made', ' some', ' coffee', ' so', ' I', ' was', ' able', ' to', ' relax']\n"
-            "Output: [' I', ' just', ' made', ' some', ' coffee.', ' so', ' I', ' was', ' able', ' to', ' relax']\n"
-            "(Only 'coffee' gets '.', NOT every word)\n\n"
-            "Return ONLY the JSON array, no explanation."
-        )
-        user_msg = (
-            "Restore sentence-final punctuation for these tokens. "
-            "Remember: only 10-20% of tokens should get punctuation!\n\n"
-            "Tokens:\n" + str(words)
+        windows = plan_punct_windows(
+            len(words),
+            _setting('LLM_PUNCT_WINDOW_TOKENS'),
+            _setting('LLM_PUNCT_OVERLAP_TOKENS')
         )
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_msg},
-            ],
-            temperature=0.0,
-            max_tokens=2048,
-        )
-        content = resp.choices[0].message.content.strip()
-        import json as _json
-        out = _json.loads(content)
-        if not isinstance(out, list) or len(out) != len(words):
-            print("LLM 标点恢复返回格式不符合预期（需等长字符串数组）")
-            return None
-        if not all(isinstance(s, str) for s in out):
-            print("LLM 标点恢复数组元素需为字符串")
+        if len(windows) == 1:
+            return _restore_punct_window(client, words)
+
+        def run_window(window):
+            start, end = window[0], window[1]
+            try:
+                return _restore_punct_window(client, words[start:end])
+            except Exception as e:
+                print(f"LLM 标点恢复窗口 [{start}, {end}) 失败: {e}")
+                return None
+
+        from concurrent.futures import ThreadPoolExecutor
+        max_workers = max(1, min(_setting('LLM_PUNCT_MAX_CONCURRENCY'), len(windows)))
+        print(f"LLM 标点恢复：{len(words)} 个词分为 {len(windows)} 个窗口，并发 {max_workers}")
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='PunctLLM') as executor:
+            results = list(executor.map(run_window, windows))
+
+        failed = sum(1 for r in results if r is None)
+        if failed == len(windows):
             return None
+        if failed:
+            print(f"⚠️ {failed}/{len(windows)} 个窗口标点恢复失败，这些区间保留 Whisper 原始标点")
+
+        out = list(words)
+        for (start, end, own_start, own_end), result in zip(windows, results):
+            if result is None:
+                continue
+            out[own_start:own_end] = result[own_start - start:own_end - start]
         return out
     except Exception as e:
         print(f"调用 LLM 恢复句末标点失败: {e}")
@@ -2,99 +2,435 @@
 音频/视频下载工具
 使用yt-dlp下载视频或提取音频
 """
+import copy
+import heapq
 import os
-import yt_dlp
+import threading
 from flask import current_app
+from app.utils.metrics import PIPELINE_STAGE_SECONDS, record_download, record_resume
+from app.utils.download_executor import get_download_executor, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from app.utils.media_manifest import get_media_manifest
+from app.utils.single_flight import get_single_flight
 
 
-def download_audio(video_url):
+# 浏览器可直接播放的音频容器；其余格式（如 opus/webm）在后台另存一份 MP3 供影子跟读使用
+BROWSER_AUDIO_EXTS = ('.m4a', '.mp3', '.mp4', '.wav')
+# 可直接作为转写输入的本地音频文件（按优先级）
+LOCAL_AUDIO_EXTS = ('.m4a', '.mp3', '.webm', '.opus', '.ogg', '.aac', '.wav')
+# 只含画面的视频流下载到该子目录，混流完成后删除（不会出现在影子跟读列表中）
+STREAMS_SUBDIR = '.streams'
+# 保留中断下载的 .part 文件，重试或进程重启后从断点续传（本地转码 / 混流的临时文件使用 .tmp）
+RESUME_OPTS = {'continuedl': True, 'nopart': False}
+
+AUDIO_FORMAT = 'bestaudio[ext=m4a]/bestaudio/best'
+VIDEO_ONLY_FORMAT = 'bestvideo[ext=mp4][vcodec^=avc1]/bestvideo[ext=mp4]/bestvideo'
+
+# 各视频ID的产物状态：audio_path / video_path / video_status（ready / downloading / failed / unavailable）
+_artifacts = {}
+_artifacts_lock = threading.Lock()
+
+
+def _downloaded_path(ydl, info_dict):
+    """yt-dlp 实际写出的文件路径（未经后处理时扩展名取决于站点提供的音频格式）"""
+    for item in info_dict.get('requested_downloads') or []:
+        if item.get('filepath'):
+            return item['filepath']
+    return ydl.prepare_filename(info_dict)
+
+
+def transcode_to_mp3(src_path, dst_path, bitrate=192000):
     """
-    使用 yt-dlp 下载视频并提取为音频
-    
-    Args:
-        video_url (str): 视频的 URL
-    
+    使用 PyAV（Faster-Whisper 的依赖，内置 libmp3lame）把音频转码为 MP3
+
+    先写入临时文件再改名，转码过程中影子跟读列表不会出现不完整的文件
+    """
+    import av
+
+    tmp_path = dst_path + '.tmp'
+    with av.open(src_path) as inp, av.open(tmp_path, 'w', format='mp3') as out:
+        in_stream = inp.streams.audio[0]
+        rate = in_stream.rate or 44100
+        out_stream = out.add_stream('libmp3lame', rate=rate)
+        out_stream.bit_rate = bitrate
+        resampler = av.AudioResampler(format='s16p', layout='stereo', rate=rate)
+        for frame in inp.decode(in_stream):
+            for resampled in resampler.resample(frame):
+                out.mux(out_stream.encode(resampled))
+        out.mux(out_stream.encode(None))
+    os.replace(tmp_path, dst_path)
+
+
+def _browser_copy_background(src_path, dst_path):
+    import time
+    try:
+        start_time = time.time()
+        transcode_to_mp3(src_path, dst_path)
+        print(f"浏览器播放用 MP3 已生成: {os.path.basename(dst_path)} ({time.time() - start_time:.1f}s)")
+    except Exception as e:
+        print(f"生成浏览器播放用 MP3 失败（不影响字幕生成）: {e}")
+        try:
+            os.remove(dst_path + '.tmp')
+        except OSError:
+            pass
+
+
+def start_browser_copy(audio_path):
+    """
+    原始音频格式浏览器无法直接播放时，在后台线程转码一份 MP3（不阻塞字幕生成）
+
     Returns:
-        str: 下载的音频文件路径，如果失败则返回 None
+        str: MP3 副本路径；无需转码时返回 None
     """
+    import threading
+
+    base, ext = os.path.splitext(audio_path)
+    if ext.lower() in BROWSER_AUDIO_EXTS:
+        return None
+    mp3_path = base + '.mp3'
+    if os.path.exists(mp3_path):
+        return mp3_path
+    threading.Thread(
+        target=_browser_copy_background,
+        args=(audio_path, mp3_path),
+        daemon=True,
+        name=f"BrowserCopy-{os.path.basename(base)}"
+    ).start()
+    return mp3_path
+
+
+def _progress_hook(task):
+    """yt-dlp 进度回调：记录已下载字节数、速度与剩余时间；任务被取消时中止下载（.part 文件保留）"""
+    def hook(status):
+        task.check_cancelled()
+        task.update_progress(status)
+    return hook
+
+
+def _resume_partials(directory, video_id, kind):
+    """统计上次中断留下的 .part 文件，yt-dlp 会从其末尾续传"""
     try:
-        videos_dir = current_app.config['VIDEOS_DIR']
-        
-        # 设置 yt-dlp 的选项
+        names = [n for n in os.listdir(directory) if n.startswith(video_id) and n.endswith('.part')]
+    except OSError:
+        return 0
+    resumed = sum(os.path.getsize(os.path.join(directory, n)) for n in names)
+    if resumed:
+        print(f"续传 {video_id} 的未完成下载（已有 {resumed / 1024 / 1024:.1f} MB）")
+        record_resume(resumed, kind)
+    return resumed
+
+
+def _is_retryable(exc):
+    """站点明确没有该格式 / 不支持的链接等错误重试也不会成功"""
+    message = str(exc)
+    return not any(s in message for s in ('format is not available', 'Unsupported URL', 'Private video'))
+
+
+def _set_artifacts(video_id, **fields):
+    with _artifacts_lock:
+        _artifacts.setdefault(video_id, {}).update(fields)
+
+
+def find_local_media(videos_dir, video_id):
+    """
+    已在磁盘上的产物
+
+    Returns:
+        tuple: (音频路径, MP4 路径)，不存在的为 None
+    """
+    audio_path = next(
+        (os.path.join(videos_dir, video_id + ext) for ext in LOCAL_AUDIO_EXTS
+         if os.path.exists(os.path.join(videos_dir, video_id + ext))),
+        None
+    )
+    video_path = os.path.join(videos_dir, f"{video_id}.mp4")
+    return audio_path, video_path if os.path.exists(video_path) else None
+
+
+def get_media_artifacts(video_id):
+    """
+    视频ID对应产物的当前状态（磁盘上的文件 + 后台视频任务的进度）
+
+    Returns:
+        dict: {video_id, audio_path, video_path, video_status, video_task_id}
+        （video_task_id 为后台视频下载任务，可通过 GET /api/downloads/<id> 查询进度）
+    """
+    audio_path, video_path = find_local_media(current_app.config['VIDEOS_DIR'], video_id)
+    with _artifacts_lock:
+        state = dict(_artifacts.get(video_id, {}))
+    status = 'ready' if video_path else state.get('video_status')
+    return {
+        'video_id': video_id,
+        'audio_path': audio_path or state.get('audio_path'),
+        'video_path': video_path,
+        'video_status': status,
+        'video_task_id': state.get('video_task_id'),
+    }
+
+
+def _packets(container, stream):
+    """按时间顺序产出 (时间秒, 包)，用于多路输入交错写出"""
+    for packet in container.demux(stream):
+        if packet.dts is None:
+            continue
+        yield float(packet.dts * packet.time_base), packet
+
+
+def remux_to_mp4(video_src, audio_src, dst_path):
+    """
+    把只含画面的视频流与音频流本地混流为 MP4（只复制压缩包，不重新编码）
+
+    按时间交错写出，moov 放在文件头部便于浏览器边下边播；先写临时文件再改名
+    """
+    import av
+
+    tmp_path = dst_path + '.tmp'
+    with av.open(video_src) as vin, av.open(audio_src) as ain, \
+            av.open(tmp_path, 'w', format='mp4', options={'movflags': '+faststart'}) as out:
+        v_in, a_in = vin.streams.video[0], ain.streams.audio[0]
+        v_out = out.add_stream_from_template(v_in)
+        a_out = out.add_stream_from_template(a_in)
+        merged = heapq.merge(
+            ((t, 0, p) for t, p in _packets(vin, v_in)),
+            ((t, 1, p) for t, p in _packets(ain, a_in)),
+            key=lambda item: (item[0], item[1])
+        )
+        for _, index, packet in merged:
+            packet.stream = v_out if index == 0 else a_out
+            out.mux(packet)
+    os.replace(tmp_path, dst_path)
+
+
+def _has_video_stream(path):
+    """文件是否同时包含画面（站点只提供音画合一格式，或复用了已有的 MP4）"""
+    import av
+
+    with av.open(path) as container:
+        return bool(container.streams.video)
+
+
+def _extract_info(video_url):
+    """只解析元数据（不下载），选出转写用的音频格式"""
+    import yt_dlp  # 延迟导入，避免应用启动时加载全部提取器
+
+    with yt_dlp.YoutubeDL({'format': AUDIO_FORMAT, 'quiet': True}) as ydl:
+        return ydl.extract_info(video_url, download=False)
+
+
+def _local_artifacts(manifest, videos_dir, video_id):
+    """
+    视频ID在本地已有的音频与 MP4：优先取清单中校验通过的记录，
+    清单之外的已有文件（如旧版本下载的）补记入清单
+
+    Returns:
+        tuple: (音频路径, MP4 路径)，不存在的为 None
+    """
+    audio_path = manifest.artifact_path(video_id, 'audio') or manifest.artifact_path(video_id, 'mp3')
+    video_path = manifest.artifact_path(video_id, 'video')
+    disk_audio, disk_video = find_local_media(videos_dir, video_id)
+    if audio_path is None and disk_audio:
+        audio_path = disk_audio
+        manifest.record(video_id, 'mp3' if disk_audio.endswith('.mp3') else 'audio', disk_audio)
+    if video_path is None and disk_video:
+        video_path = disk_video
+        manifest.record(video_id, 'video', disk_video)
+    return audio_path, video_path
+
+
+def _fetch_video(task, video_url, info_dict, video_id, source_path):
+    """
+    下载执行器中运行：准备影子跟读用的 <id>.mp4
+
+    source_path 本身音画合一时只做本地转封装；否则只下载画面流，与已下载的音频本地混流
+    （info_dict 为 None 时先解析一次元数据）。失败时抛出异常，由执行器决定是否重试
+    """
+    import yt_dlp
+
+    videos_dir = current_app.config['VIDEOS_DIR']
+    streams_dir = os.path.join(videos_dir, STREAMS_SUBDIR)
+    video_path = os.path.join(videos_dir, f"{video_id}.mp4")
+
+    def fetch_and_remux():
+        if os.path.exists(video_path):
+            return video_path
+        if _has_video_stream(source_path):
+            with PIPELINE_STAGE_SECONDS.time(stage='remux'):
+                remux_to_mp4(source_path, source_path, video_path)
+            return video_path
+        print(f"[Background-{video_id}] Downloading video-only stream for local remux")
+        os.makedirs(streams_dir, exist_ok=True)
         ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'outtmpl': os.path.join(videos_dir, '%(id)s.%(ext)s'),
+            'format': VIDEO_ONLY_FORMAT,
+            'outtmpl': os.path.join(streams_dir, '%(id)s.video.%(ext)s'),
             'quiet': True,
+            'progress_hooks': [_progress_hook(task)],
+            **RESUME_OPTS,
         }
+        _resume_partials(streams_dir, video_id, 'video')
+        with PIPELINE_STAGE_SECONDS.time(stage='video_download'), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = copy.deepcopy(info_dict) if info_dict else ydl.extract_info(video_url, download=False)
+            downloaded = ydl.process_ie_result(info, download=True)
+            stream_path = _downloaded_path(ydl, downloaded)
+        record_download(stream_path, 'video')
+        try:
+            with PIPELINE_STAGE_SECONDS.time(stage='remux'):
+                remux_to_mp4(stream_path, source_path, video_path)
+        finally:
+            os.remove(stream_path)
+        return video_path
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(video_url, download=True)
-            video_id = info_dict.get('id', None)
-            audio_path = os.path.join(videos_dir, f"{video_id}.mp3")
-            
-            if os.path.exists(audio_path):
-                print(f"音频下载成功: {audio_path}")
-                return audio_path
-            else:
-                print("错误: 下载后未找到音频文件")
-                return None
+    get_single_flight().do(f"video:{video_id}", fetch_and_remux)
+    get_media_manifest().record(video_id, 'video', video_path)
+    return video_path
 
-    except Exception as e:
-        print(f"下载或转换音频时出错: {e}")
-        return None
 
+def _video_finished(video_id):
+    """后台视频任务结束（成功 / 失败 / 取消）后更新产物状态"""
+    def on_finish(task):
+        if task.status in ('succeeded', 'skipped'):
+            # skipped：开始执行前 MP4 已由其他途径生成
+            _set_artifacts(video_id, video_status='ready')
+            print(f"[Background-{video_id}] ✓ Video ready")
+            return
+        if task.status == 'cancelled':
+            _set_artifacts(video_id, video_status='cancelled')
+            print(f"[Background-{video_id}] Video download cancelled")
+            return
+        status = 'failed' if _is_retryable(task.exception) else 'unavailable'
+        _set_artifacts(video_id, video_status=status)
+        if status == 'unavailable':
+            get_media_manifest().note(video_id, video_unavailable=True)
+        print(f"[Background-{video_id}] ✗ Video {status} after {task.attempts} attempt(s): {task.error}")
+        print(f"[Background-{video_id}] Audio file is still available for shadowing practice")
+    return on_finish
 
-def download_video(video_url, download_type='video'):
+
+def acquire_media(video_url, with_video=True, mode=None, on_progress=None):
     """
-    使用 yt-dlp 下载视频（含音频和画面）
-    
+    统一的媒体获取：一次解析元数据，音频与画面各只从远端下载一次
+
+    1. 见过的链接经媒体清单直接定位到本地产物，不访问远端；
+       新链接只解析一次元数据拿到视频ID，该ID已有本地产物时同样不再下载
+    2. 音频流下载完成立即返回，交给转写
+    3. 站点只提供音画合一的格式时，该文件同时作为转写输入与影子跟读视频
+    4. 否则在后台只下载画面流，与音频本地混流为 <id>.mp4（不再重复下载音频）
+
+    音频与画面都交给共享的下载执行器：音频以高优先级排队并等待结果，画面以后台优先级排队，
+    并发数受 DOWNLOAD_MAX_CONCURRENCY 限制，失败按指数退避重试并从 .part 文件续传。
+
+    ASR_AUDIO_MODE=mp3 时音频在本地用 PyAV 转码为 MP3，不依赖 ffmpeg 后处理。
+
     Args:
         video_url (str): 视频的 URL
-        download_type (str): 下载类型，'video' 表示下载视频
-    
+        with_video (bool): 是否准备影子跟读用的 MP4
+        mode (str): 'native' 或 'mp3'，None 时使用配置 ASR_AUDIO_MODE
+        on_progress: 可选回调 on_progress(progress)，音频下载期间上报已下载字节数、速度与剩余时间
+
     Returns:
-        str: 下载的视频文件路径，如果失败则返回 None
+        dict: {video_id, audio_path, video_path, video_status, video_task_id}，失败时返回 None
     """
-    import time
-    max_retries = 3
-    
-    for attempt in range(max_retries):
-        try:
-            videos_dir = current_app.config['VIDEOS_DIR']
-            
-            # 设置 yt-dlp 的选项 - 下载最佳视频+音频
-            ydl_opts = {
-                'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
-                'outtmpl': os.path.join(videos_dir, '%(id)s.%(ext)s'),
-                'quiet': False,
-                'no_warnings': False,
-                'merge_output_format': 'mp4',
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info_dict = ydl.extract_info(video_url, download=True)
-                video_id = info_dict.get('id', None)
-                video_path = os.path.join(videos_dir, f"{video_id}.mp4")
-                
-                if os.path.exists(video_path):
-                    print(f"视频下载成功: {video_path}")
-                    return video_path
-                else:
-                    print("错误: 下载后未找到视频文件")
-                    return None
+    import yt_dlp  # 延迟导入，避免应用启动时加载全部提取器
 
-        except Exception as e:
-            print(f"下载视频时出错 (尝试 {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                print("等待 3 秒后重试...")
-                time.sleep(3)
+    try:
+        videos_dir = current_app.config['VIDEOS_DIR']
+        mode = mode or current_app.config['ASR_AUDIO_MODE']
+        manifest = get_media_manifest()
+        info_dict = None
+
+        video_id, _ = manifest.lookup_url(video_url)
+        audio_path = video_path = None
+        if video_id:
+            audio_path, video_path = _local_artifacts(manifest, videos_dir, video_id)
+        if audio_path:
+            print(f"链接已在媒体清单中，直接使用本地音频: {os.path.basename(audio_path)}")
+        else:
+            info_dict = _extract_info(video_url)
+            video_id = info_dict['id']
+            extractor = info_dict.get('extractor_key')
+            manifest.remember_url(video_url, video_id, extractor)
+            audio_path, video_path = _local_artifacts(manifest, videos_dir, video_id)
+            if audio_path is None and video_path:
+                audio_path = video_path  # 已有的 MP4 自带音轨，直接用于转写
+
+            if audio_path:
+                print(f"复用已下载的音频: {os.path.basename(audio_path)}")
             else:
-                print("视频下载失败，已达最大重试次数")
-                return None
-    
-    return None
+                def download(task):
+                    ydl_opts = {
+                        'format': AUDIO_FORMAT,
+                        'outtmpl': os.path.join(videos_dir, '%(id)s.%(ext)s'),
+                        'quiet': True,
+                        'progress_hooks': [_progress_hook(task)],
+                        **RESUME_OPTS,
+                    }
+                    _resume_partials(videos_dir, video_id, 'audio')
+                    # 只统计真正访问远端的下载（清单 / 本地文件命中不计入 download 阶段）
+                    with PIPELINE_STAGE_SECONDS.time(stage='download'), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                        downloaded = ydl.process_ie_result(copy.deepcopy(info_dict), download=True)
+                        path = _downloaded_path(ydl, downloaded)
+                    if not os.path.exists(path):
+                        print("错误: 下载后未找到音频文件")
+                        return None
+                    print(f"音频下载成功: {path}")
+                    record_download(path, 'audio')
+                    manifest.record(video_id, 'audio', path)
+                    return path
+
+                key = f"audio:{extractor}:{video_id}:native"
+                audio_path = get_download_executor().submit(
+                    key, lambda task: get_single_flight().do(key, lambda: download(task)),
+                    priority=PRIORITY_INTERACTIVE, label=f"audio {video_id}", retryable=_is_retryable
+                ).wait(on_progress=on_progress)
+                if not audio_path:
+                    return None
+
+        source_path = audio_path
+        muxed = _has_video_stream(source_path)
+        if mode == 'mp3' and not audio_path.endswith('.mp3'):
+            mp3_path = manifest.artifact_path(video_id, 'mp3')
+            if mp3_path is None:
+                mp3_path = os.path.join(videos_dir, f"{video_id}.mp3")
+                transcode_to_mp3(audio_path, mp3_path)
+                manifest.record(video_id, 'mp3', mp3_path)
+            audio_path = mp3_path
+        elif not muxed:
+            start_browser_copy(audio_path)
+
+        if muxed and source_path.endswith('.mp4'):
+            video_path = source_path
+        _set_artifacts(video_id, audio_path=audio_path)
+
+        if video_path:
+            _set_artifacts(video_id, video_path=video_path, video_status='ready')
+        elif with_video and manifest.get_note(video_id, 'video_unavailable'):
+            _set_artifacts(video_id, video_status='unavailable')
+        elif with_video:
+            _set_artifacts(video_id, video_status='downloading')
+            mp4_path = os.path.join(videos_dir, f"{video_id}.mp4")
+            info_copy = copy.deepcopy(info_dict) if info_dict else None
+            task = get_download_executor().submit(
+                f"video:{video_id}",
+                lambda task: _fetch_video(task, video_url, info_copy, video_id, source_path),
+                priority=PRIORITY_BACKGROUND,
+                label=f"video {video_id}",
+                retryable=_is_retryable,
+                still_needed=lambda: not os.path.exists(mp4_path),
+                on_finish=_video_finished(video_id)
+            )
+            _set_artifacts(video_id, video_task_id=task.id)
+
+        return get_media_artifacts(video_id)
+
+    except Exception as e:
+        print(f"获取媒体时出错: {e}")
+        return None
+
+
+def download_audio(video_url, mode=None, on_progress=None):
+    """
+    只获取转写用的音频（不准备影子跟读视频），见 acquire_media
+
+    Returns:
+        str: 音频文件路径，如果失败则返回 None
+    """
+    media = acquire_media(video_url, with_video=False, mode=mode, on_progress=on_progress)
+    return media['audio_path'] if media else None
@@ -5,8 +5,18 @@
 import os
 import json
 import re
-from faster_whisper import WhisperModel
-from app.utils.ai import get_sentence_break_indices_by_llm, restore_sentence_final_punct_by_llm
+import time
+from contextlib import contextmanager
+import numpy as np
+from app.utils.whisper_models import get_whisper_model
+from app.utils.transcribe import transcribe_sequential, transcribe_parallel, TRANSCRIBE_OPTIONS
+from app.utils.transcribe_scheduler import get_transcription_scheduler
+from app.utils.caption_cache import get_transcription_cache, hash_audio_file, make_cache_key
+from app.utils.caption_checkpoint import TranscriptionCheckpoint
+from app.utils.media_manifest import get_media_manifest
+from app.utils.word_store import WordStoreBuilder
+from app.utils.metrics import PIPELINE_STAGE_SECONDS
+from app.utils.sentence_boundary import get_boundary_engine
 from flask import current_app
 
 
@@ -222,237 +232,374 @@ def split_long_segment(segment_text, start_time, end_time, max_duration=8.0):
     return result
 
 
-def generate_caption(audio_path):
+# 基于词级时间戳：断句引擎先在句末词尾补句末标点，再严格以句末标点断句
+MICRO_GAP_THRESHOLD = 0.9  # 小于该值的间隙视为人声停顿，直接并入
+NO_CAPTION_TEXT = '[无字幕]'
+CAPTION_CACHE_VERSION = 2  # 断句/输出格式变化时递增，使旧缓存自动失效
+
+
+def build_sentence_segments(store):
     """
-    使用 Faster-Whisper 为给定的音频文件生成英文字幕（词级时间戳）
-    
+    严格以句末标点（. ! ?）为边界，把词序列组装为句子级字幕
+
     Args:
-        audio_path (str): 音频文件路径
-    
-    Returns:
-        tuple: (caption_path, caption_text) 字幕文件路径和文本内容
+        store: WordStore 列式词存储；断句索引由向量化的句末标点掩码得到，
+               句子文本直接切片文本缓冲区
     """
-    try:
-        # 1. 检查音频文件是否存在
-        if not audio_path or not os.path.exists(audio_path):
-            print(f"ERROR: Audio file not found: {audio_path}")
-            return None, None
-        
-        file_size = os.path.getsize(audio_path)
-        print(f"Audio file: {audio_path} ({file_size / 1024 / 1024:.2f} MB)")
-        
-        # 2. 加载 Faster-Whisper 模型
-        print("Loading Faster-Whisper model (small, CPU int8)...")
-        model = WhisperModel("small", device="cpu", compute_type="int8")
-        print("Model loaded successfully")
-
-        print("Generating English subtitles with Faster-Whisper (word timestamps)...")
-        segments_iter, info = model.transcribe(
-                audio_path, 
-            language="en",
-            task="transcribe",
-            word_timestamps=True,
-            vad_filter=True,
-            vad_parameters=dict(min_silence_duration_ms=300),
-        )
+    n = len(store)
+    if n == 0:
+        return []
 
-        # 收集段与文本
-        collected_segments = []
-        text_parts = []
-        for seg in segments_iter:
-            seg_text = (seg.text or "").strip()
-            if seg_text:
-                text_parts.append(seg_text)
-            words = []
-            if getattr(seg, "words", None):
-                for w in seg.words:
-                    words.append({
-                        'word': w.word,
-                        'start': round((w.start or 0.0), 2),
-                        'end': round((w.end or 0.0), 2),
-                    })
-            collected_segments.append({
-                'id': seg.id,
-                'start': round((seg.start or 0.0), 2),
-                'end': round((seg.end or 0.0), 2),
-                'text': seg_text,
-                'words': words,
-            })
+    # 收集断句索引
+    break_indices = np.flatnonzero(store.sentence_end_mask())
 
-        caption_text = " ".join(text_parts).strip()
-        print(f"Transcription successful: {len(caption_text)} characters")
+    sentence_segments = []
 
-        # 从音频路径生成字幕文件的路径
-        captions_dir = current_app.config['CAPTIONS_DIR']
-        base_filename = os.path.basename(audio_path)
-        filename_without_ext = os.path.splitext(base_filename)[0]
-        caption_path = os.path.join(captions_dir, f"{filename_without_ext}.txt")
+    def append_sentence(first, last, ensure_period):
+        text = store.span_text(first, last).strip()
+        if not text:
+            return
+        # 若边界来自 LLM 索引且末尾无标点，谨慎补 '.'（标点恢复模式下通常已具备标点）
+        if ensure_period and not text.endswith(('.', '!', '?')):
+            text = text + '.'
+        sentence_segments.append({
+            'id': len(sentence_segments),
+            'start': round(float(store.starts[first]), 2),
+            'end': round(float(store.ends[last]), 2),
+            'text': text
+        })
 
-        # 将识别出的文本写入文件
-        with open(caption_path, 'w', encoding='utf-8') as f:
-            f.write(caption_text)
-        
-        # 保存带时间戳的字幕数据（用于影子跟读）
-            json_path = os.path.join(captions_dir, f"{filename_without_ext}_segments.json")
-            
-        # 基于词级时间戳：先按静音边界补充句号，再严格以句号断句
-        SILENCE_SENTENCE_GAP = 0.6  # 视为句子边界的静音阈值（秒）
-
-        # 汇总所有词（按时间顺序）
-        all_words = []
-        for seg in collected_segments:
-            for w in seg['words']:
-                # 复制一份，避免修改原始结构
-                all_words.append({
-                    'word': w['word'],
-                    'start': w['start'],
-                    'end': w['end'],
-                })
+    if len(break_indices):
+        start_idx = 0
+        for bi in break_indices.tolist():
+            append_sentence(start_idx, bi, True)
+            start_idx = bi + 1
+        # 余下尾部作为最后一句（如果有）
+        if start_idx < n:
+            append_sentence(start_idx, n - 1, True)
+    else:
+        # 没有任何句末标点时，退化为整段一句（不做静音补句号）
+        append_sentence(0, n - 1, False)
+    return sentence_segments
 
-        # 使用 LLM 智能恢复句末标点（带验证逻辑）
-        tokens_only = [w['word'] for w in all_words]
-        break_indices = []
-        
-        # 尝试调用 LLM 恢复标点
-        punct_tokens = restore_sentence_final_punct_by_llm(tokens_only)
-        
-        # 验证 LLM 输出：拒绝过度断句（超过30%的词有标点视为异常）
-        if punct_tokens is not None and len(punct_tokens) == len(tokens_only):
-            punct_count = sum(1 for t in punct_tokens if t.rstrip().endswith(('.', '!', '?')))
-            punct_ratio = punct_count / len(punct_tokens) if len(punct_tokens) > 0 else 0
-            
-            if punct_ratio > 0.3:
-                print(f"⚠️ LLM 标点恢复异常：{punct_ratio:.1%} 的词被加标点（超过30%），拒绝使用")
-                print("   回退到 Whisper 原始标点")
-                punct_tokens = None
+
+def insert_silence_blocks(sentence_segments, total_duration=None):
+    """插入“无字幕”静音区块，保证连贯播放；返回重新编号后的区块列表"""
+    sentence_segments.sort(key=lambda s: s['start'])
+    blocks = []
+    prev_end = 0.0
+
+    for seg in sentence_segments:
+        gap = seg['start'] - prev_end
+        if gap > 0:
+            if gap < MICRO_GAP_THRESHOLD and blocks and blocks[-1].get('text') != NO_CAPTION_TEXT:
+                # 将微小间隙并入前一字幕块：延长前一块的结束时间到当前块开始
+                # 同时将当前块的开始时间对齐到前一块的结束，消除微小“无字幕”
+                blocks[-1]['end'] = round(seg['start'], 2)
+                seg['start'] = blocks[-1]['end']
             else:
-                print(f"✓ LLM 标点恢复成功：{punct_count}/{len(tokens_only)} 个词有句末标点 ({punct_ratio:.1%})")
-                # 更新词文本为带标点的版本
-                for i, t in enumerate(punct_tokens):
-                    all_words[i]['word'] = t
-        
-        # 收集断句索引
-        for i, w in enumerate(all_words):
-            token = (w['word'] or '').rstrip()
-            if token.endswith('.') or token.endswith('!') or token.endswith('?'):
-                break_indices.append(i)
-
-        sentence_segments = []
-        if break_indices:
-            start_idx = 0
-            for bi in break_indices:
-                if bi < start_idx or bi >= len(all_words):
-                    continue
-                sent_words = all_words[start_idx: bi + 1]
-                start_time = sent_words[0]['start']
-                end_time = sent_words[-1]['end']
-                text = "".join(w['word'] for w in sent_words).strip()
-                if text:
-                    # 若边界来自 LLM 索引且末尾无标点，谨慎补 '.'（标点恢复模式下通常已具备标点）
-                    if not text.endswith('.') and not text.endswith('!') and not text.endswith('?'):
-                        text = text + '.'
-                    sentence_segments.append({
-                        'id': len(sentence_segments),
-                        'start': round(start_time, 2),
-                        'end': round(end_time, 2),
-                        'text': text
-                    })
-                start_idx = bi + 1
-            # 余下尾部作为最后一句（如果有）
-            if start_idx < len(all_words):
-                sent_words = all_words[start_idx:]
-                start_time = sent_words[0]['start']
-                end_time = sent_words[-1]['end']
-                text = "".join(w['word'] for w in sent_words).strip()
-                if text:
-                    if not text.endswith('.') and not text.endswith('!') and not text.endswith('?'):
-                        text = text + '.'
-                    sentence_segments.append({
-                        'id': len(sentence_segments),
-                        'start': round(start_time, 2),
-                        'end': round(end_time, 2),
-                        'text': text
-                    })
-        else:
-            # LLM 不可用时，退化为基于原始标点的断句（不做静音补句号）
-            current_words = []
-            def flush_sentence():
-                if not current_words:
-                    return
-                start_time = current_words[0]['start']
-                end_time = current_words[-1]['end']
-                text = "".join(w['word'] for w in current_words).strip()
-                if text:
-                    sentence_segments.append({
-                        'id': len(sentence_segments),
-                        'start': round(start_time, 2),
-                        'end': round(end_time, 2),
-                        'text': text
-                    })
-                current_words.clear()
-            for w in all_words:
-                current_words.append(w)
-                token = (w['word'] or '')
-                if token.rstrip().endswith('.'):
-                    flush_sentence()
-            flush_sentence()
-
-        # 插入“无字幕”静音区块，保证连贯播放
-        sentence_segments.sort(key=lambda s: s['start'])
-        blocks = []
-        prev_end = 0.0
-        MICRO_GAP_THRESHOLD = 0.9  # 小于该值的间隙视为人声停顿，直接并入
-
-        # 可能拿到总时长
-        total_duration = None
-        try:
-            total_duration = float(getattr(info, 'duration', None))
-        except Exception:
-            total_duration = None
-
-        for seg in sentence_segments:
-            gap = seg['start'] - prev_end
-            if gap > 0:
-                if gap < MICRO_GAP_THRESHOLD and blocks and blocks[-1].get('text') != '[无字幕]':
-                    # 将微小间隙并入前一字幕块：延长前一块的结束时间到当前块开始
-                    # 同时将当前块的开始时间对齐到前一块的结束，消除微小“无字幕”
-                    blocks[-1]['end'] = round(seg['start'], 2)
-                    seg['start'] = blocks[-1]['end']
-                else:
-                    blocks.append({
-                        'start': round(prev_end, 2),
-                        'end': round(seg['start'], 2),
-                        'text': '[无字幕]'
-                    })
-            blocks.append(seg)
-            prev_end = seg['end']
-
-        if total_duration is not None and prev_end < total_duration:
-            tail_gap = total_duration - prev_end
-            if tail_gap > 0:
                 blocks.append({
                     'start': round(prev_end, 2),
-                    'end': round(total_duration, 2),
-                    'text': '[无字幕]'
+                    'end': round(seg['start'], 2),
+                    'text': NO_CAPTION_TEXT
                 })
+        blocks.append(seg)
+        prev_end = seg['end']
+
+    if total_duration is not None and prev_end < total_duration:
+        tail_gap = total_duration - prev_end
+        if tail_gap > 0:
+            blocks.append({
+                'start': round(prev_end, 2),
+                'end': round(total_duration, 2),
+                'text': NO_CAPTION_TEXT
+            })
+
+    for i, b in enumerate(blocks):
+        b['id'] = i
+    return blocks
+
+
+def transcription_params(config, batch_size=0):
+    """影响 Whisper 转写结果的参数（断点文件按它寻址，切换断句引擎不影响续传）"""
+    return {
+        'version': CAPTION_CACHE_VERSION,
+        'model_size': config['WHISPER_MODEL_SIZE'],
+        'compute_type': config['WHISPER_COMPUTE_TYPE'],
+        'transcribe': TRANSCRIBE_OPTIONS,
+        'batched': bool(batch_size and batch_size > 0),
+    }
+
+
+@contextmanager
+def _timed(timings, stage):
+    """把代码块耗时累加到 timings[stage]"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def caption_cache_params(config, batch_size=0, engine=None):
+    """影响字幕输出的全部参数，作为缓存 key 的一部分"""
+    engine = engine or get_boundary_engine(config['CAPTION_BOUNDARY_ENGINE'])
+    return dict(transcription_params(config, batch_size), segmentation=dict(
+        engine.cache_params(),
+        punctuation=engine.name,
+        micro_gap_threshold=MICRO_GAP_THRESHOLD,
+    ))
+
+
+def iter_caption_events(audio_path, parallel_workers=None, chunk_seconds=None, batch_size=None,
+                        boundary_engine=None, timings=None):
+    """
+    字幕生成的流式版本：边解码边产出事件，最后写出字幕文件
+
+    产出的事件（event, data）依次为：
+    - ('info', {duration, cached})：开始解码（或命中缓存），音频总时长
+    - ('segment', {id, start, end, text, words})：每解码出一个 Whisper 段立即产出
+    - ('blocks', {text, language, segments})：标点恢复、断句、补齐静音后的最终句子区块
+    - ('done', {caption_path, caption_text, json_path, words_path, boundary})：字幕文件已写入，
+      boundary 为断句引擎信息（命中缓存时为 None）
 
-        for i, b in enumerate(blocks):
-            b['id'] = i
+    Args:
+        audio_path (str): 音频文件路径
+        parallel_workers (int): 分块并行转写的进程数，None 时使用配置 CAPTION_PARALLEL_WORKERS（<=1 为顺序转写）
+        chunk_seconds (int): 并行模式下的目标块长（秒），None 时使用配置 CAPTION_CHUNK_SECONDS
+        batch_size (int): 批量推理的批大小，None 时使用配置 CAPTION_BATCH_SIZE（0 为逐窗口顺序解码）
+        boundary_engine (str): 断句引擎 local / llm / hybrid，None 时使用配置 CAPTION_BOUNDARY_ENGINE
+        timings (dict): 可选，按阶段累加耗时（秒）：hash / model_load / decode / word_collection /
+            punctuation / sentence_building / gap_filling / json_write / words_write；
+            decode 只统计等待解码器产出的时间，不含调用方处理事件的时间
+    """
+    # 各阶段耗时总会统计（记入 sayit_pipeline_stage_seconds），调用方传入 timings 时一并返回
+    timings = {} if timings is None else timings
+    file_size = os.path.getsize(audio_path)
+    print(f"Audio file: {audio_path} ({file_size / 1024 / 1024:.2f} MB)")
 
-            segments_data = {
-                'text': caption_text,
-                'language': 'en',
-            'segments': blocks
+    config = current_app.config
+    batch_size = config['CAPTION_BATCH_SIZE'] if batch_size is None else batch_size
+    engine = get_boundary_engine(boundary_engine or config['CAPTION_BOUNDARY_ENGINE'])
+    captions_dir = config['CAPTIONS_DIR']
+    filename_without_ext = os.path.splitext(os.path.basename(audio_path))[0]
+    caption_path = os.path.join(captions_dir, f"{filename_without_ext}.txt")
+    json_path = os.path.join(captions_dir, f"{filename_without_ext}_segments.json")
+    words_path = os.path.join(captions_dir, f"{filename_without_ext}_words.npz")
+
+    # 0. 内容寻址缓存：同一音频 + 同一组参数直接恢复结果
+    cache = get_transcription_cache()
+    checkpoint_seconds = config['CAPTION_CHECKPOINT_SECONDS']
+    cache_key = audio_hash = None
+    if cache is not None or checkpoint_seconds > 0:
+        with _timed(timings, 'hash'):
+            # 媒体清单中已有该文件的 SHA-256（下载时计算）时直接复用
+            audio_hash = get_media_manifest().checksum(audio_path) or hash_audio_file(audio_path)
+        cache_key = make_cache_key(audio_hash, caption_cache_params(config, batch_size, engine))
+    if cache is not None:
+        # 当时 LLM 标点失败的结果，在 LLM 可用时不复用
+        entry = cache.get(
+            cache_key,
+            accept=lambda e: not engine.uses_llm or e.get('llm_punctuation') or not config['OPENAI_API_KEY']
+        )
+        if entry is not None:
+            print(f"Caption cache hit: {cache_key[:12]} (ratio {cache.stats()['hit_ratio']:.0%})")
+            cache.restore(entry, caption_path, json_path, words_path)
+            with open(json_path, 'r', encoding='utf-8') as f:
+                segments_data = json.load(f)
+            yield 'info', {'duration': entry.get('duration'), 'cached': True}
+            yield 'blocks', segments_data
+            yield 'done', {
+                'caption_path': caption_path,
+                'caption_text': segments_data.get('text', ''),
+                'json_path': json_path,
+                'words_path': words_path if os.path.exists(words_path) else None,
+                'boundary': None,
             }
-            
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(segments_data, f, ensure_ascii=False, indent=2)
-            print(f"English subtitles with timestamps saved: {json_path}")
-        print(f"  Total {len(sentence_segments)} sentences (word timestamp-based)")
-        print(f"  Faster-Whisper segments: {len(collected_segments)}")
-        
-        print(f"字幕生成成功: {caption_path}")
-        return caption_path, caption_text
+            return
+
+    # 1. 断点续传：同一音频、同一组参数的上次转写若中途退出，从最后一个断点继续
+    checkpoint = None
+    resumed_segments = []
+    if checkpoint_seconds > 0:
+        checkpoint_key = make_cache_key(audio_hash, transcription_params(config, batch_size))
+        checkpoint = TranscriptionCheckpoint.for_audio(captions_dir, audio_path, checkpoint_key, checkpoint_seconds)
+        resumed_segments = checkpoint.load()
+    offset = checkpoint.resume_offset if checkpoint is not None else 0.0
+    if resumed_segments:
+        print(f"Resuming transcription from checkpoint at {offset:.1f}s ({len(resumed_segments)} segments)")
+
+    # 2. 转写：先向调度器申请 CPU 线程（超出核心预算时排队），解码结束后立即归还
+    scheduler = get_transcription_scheduler()
+    allocation = scheduler.acquire(label=filename_without_ext)
+    try:
+        # 长音频可按静音点分块，在进程池中并行转写（分得的线程平分给各 worker）
+        workers = config['CAPTION_PARALLEL_WORKERS'] if parallel_workers is None else parallel_workers
+        chunk_seconds = chunk_seconds or config['CAPTION_CHUNK_SECONDS']
+        if workers and workers > 1:
+            print("Generating English subtitles with Faster-Whisper (parallel chunks, word timestamps)...")
+            # 并行模式的模型在 worker 进程中加载，计入 decode
+            with _timed(timings, 'decode'):
+                segments_iter, total_duration = transcribe_parallel(
+                    audio_path,
+                    workers=workers,
+                    chunk_seconds=chunk_seconds,
+                    size=config['WHISPER_MODEL_SIZE'],
+                    device=config['WHISPER_DEVICE'],
+                    compute_type=config['WHISPER_COMPUTE_TYPE'],
+                    batch_size=batch_size,
+                    offset=offset,
+                    cpu_threads=allocation['threads']
+                )
+        else:
+            # 获取 Faster-Whisper 模型（进程内缓存，只在首次使用时加载）
+            with _timed(timings, 'model_load'):
+                model = get_whisper_model(
+                    config['WHISPER_MODEL_SIZE'],
+                    device=config['WHISPER_DEVICE'],
+                    compute_type=config['WHISPER_COMPUTE_TYPE'],
+                    cpu_threads=allocation['threads']
+                )
+            mode = f"batched x{batch_size}" if batch_size and batch_size > 0 else "sequential"
+            print(f"Generating English subtitles with Faster-Whisper ({mode}, word timestamps)...")
+            with _timed(timings, 'decode'):
+                segments_iter, total_duration = transcribe_sequential(model, audio_path, batch_size, offset)
+
+        yield 'info', {'duration': total_duration, 'cached': False}
+
+        # 3. 收集段与文本（segments_iter 惰性解码，每得到一段就向外产出）
+        # 词级时间戳只写入列式词存储一次，不再以逐词字典的形式常驻内存
+        words_builder = WordStoreBuilder()
+        text_parts = []
+        segment_count = 0
+        for seg in resumed_segments:
+            if seg['text']:
+                text_parts.append(seg['text'])
+            words_builder.add_segment(seg)
+            segment_count += 1
+            yield 'segment', seg
+        resumed_segments = None
+        id_base = segment_count  # 续传时，新解码段的 id 接着已完成的段继续编号
+        while True:
+            with _timed(timings, 'decode'):
+                seg = next(segments_iter, None)
+            if seg is None:
+                break
+            with _timed(timings, 'word_collection'):
+                if id_base:
+                    seg['id'] += id_base
+                if seg['text']:
+                    text_parts.append(seg['text'])
+                words_builder.add_segment(seg)
+                segment_count += 1
+                if checkpoint is not None:
+                    checkpoint.record(seg)
+            yield 'segment', seg
+    finally:
+        scheduler.release(allocation)
+
+    caption_text = " ".join(text_parts).strip()
+    print(f"Transcription successful: {len(caption_text)} characters")
+
+    # 4. 标点恢复与断句
+    with _timed(timings, 'word_collection'):
+        word_store = words_builder.build()
+    words_builder = None
+    with _timed(timings, 'punctuation'):
+        word_store, boundary = engine.apply(word_store)
+    with _timed(timings, 'sentence_building'):
+        sentence_segments = build_sentence_segments(word_store)
+    with _timed(timings, 'gap_filling'):
+        blocks = insert_silence_blocks(sentence_segments, total_duration)
+
+    segments_data = {
+        'text': caption_text,
+        'language': 'en',
+        'segments': blocks
+    }
+    yield 'blocks', segments_data
+
+    # 5. 写出字幕文件（纯文本 + 带时间戳的字幕数据，用于影子跟读）
+    with _timed(timings, 'json_write'):
+        with open(caption_path, 'w', encoding='utf-8') as f:
+            f.write(caption_text)
+
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(segments_data, f, ensure_ascii=False, indent=2)
+    print(f"English subtitles with timestamps saved: {json_path}")
+    print(f"  Total {len(sentence_segments)} sentences (word timestamp-based)")
+    print(f"  Faster-Whisper segments: {segment_count}")
+
+    # 词级时间戳以紧凑的列式二进制文件保存，后续功能无需重新转写即可使用
+    with _timed(timings, 'words_write'):
+        word_store.save(words_path)
+    print(f"  Word timestamps: {len(word_store)} words, {word_store.nbytes() / 1024:.1f} KB ({os.path.basename(words_path)})")
+
+    if checkpoint is not None:
+        checkpoint.remove()
+
+    # 整个字幕生成记为 transcription，各子阶段分别记录
+    PIPELINE_STAGE_SECONDS.observe(sum(timings.values()), stage='transcription')
+    for stage, seconds in timings.items():
+        PIPELINE_STAGE_SECONDS.observe(seconds, stage=stage)
+
+    if cache is not None:
+        cache.put(cache_key, caption_path, json_path, words_path, meta={
+            'audio_hash': audio_hash,
+            'audio_file': os.path.basename(audio_path),
+            'duration': total_duration,
+            'llm_punctuation': boundary['source'] == 'llm',
+            'boundary_engine': engine.name,
+        })
+
+    print(f"字幕生成成功: {caption_path}")
+    yield 'done', {
+        'caption_path': caption_path,
+        'caption_text': caption_text,
+        'json_path': json_path,
+        'words_path': words_path,
+        'boundary': boundary,
+    }
+
+
+def generate_caption(audio_path, parallel_workers=None, chunk_seconds=None, batch_size=None,
+                     boundary_engine=None, timings=None, on_event=None):
+    """
+    使用 Faster-Whisper 为给定的音频文件生成英文字幕（词级时间戳）
+    
+    Args:
+        audio_path (str): 音频文件路径
+        parallel_workers (int): 分块并行转写的进程数，None 时使用配置 CAPTION_PARALLEL_WORKERS（<=1 为顺序转写）
+        chunk_seconds (int): 并行模式下的目标块长（秒），None 时使用配置 CAPTION_CHUNK_SECONDS
+        batch_size (int): 批量推理的批大小，None 时使用配置 CAPTION_BATCH_SIZE（0 为逐窗口顺序解码）
+        boundary_engine (str): 断句引擎 local / llm / hybrid，None 时使用配置 CAPTION_BOUNDARY_ENGINE
+        timings (dict): 可选，按阶段累加耗时（秒），见 iter_caption_events
+        on_event (callable): 可选，on_event(event, data) 逐个接收 iter_caption_events 的事件（用于上报进度）
+    
+    Returns:
+        tuple: (caption_path, caption_text) 字幕文件路径和文本内容
+    """
+    try:
+        # 检查音频文件是否存在
+        if not audio_path or not os.path.exists(audio_path):
+            print(f"ERROR: Audio file not found: {audio_path}")
+            return None, None
+
+        result = None
+        for event, data in iter_caption_events(
+            audio_path,
+            parallel_workers=parallel_workers,
+            chunk_seconds=chunk_seconds,
+            batch_size=batch_size,
+            boundary_engine=boundary_engine,
+            timings=timings
+        ):
+            if on_event is not None:
+                on_event(event, data)
+            if event == 'done':
+                result = data
+
+        return result['caption_path'], result['caption_text']
 
     except Exception as e:
         print(f"ERROR: Caption generation failed")
@@ -461,6 +608,3 @@ def generate_caption(audio_path):
         import traceback
         traceback.print_exc()
         return None, None
-
-
-
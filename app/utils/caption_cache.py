@@ -0,0 +1,230 @@
+"""
+字幕结果缓存
+按音频内容哈希 + 模型/断句参数寻址，命中时直接恢复 .txt、_segments.json 与 _words.npz
+
+索引 index.json 由多个 worker 进程共享：每次读-改-写都在 index.json.lock 文件锁内进行，原子替换写回；
+条目文件先写入临时目录，完整后再改名为条目目录并登记到索引
+"""
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from flask import current_app
+
+from app.utils.file_lock import FileLock
+
+HASH_CHUNK_SIZE = 16 * 1024 * 1024  # 每次向哈希喂入 16MB，避免整文件读入内存
+
+TEXT_FILE = 'caption.txt'
+SEGMENTS_FILE = 'segments.json'
+WORDS_FILE = 'words.npz'
+INDEX_FILE = 'index.json'
+
+
+def hash_audio_file(audio_path):
+    """
+    计算音频文件内容的 SHA-256（内存映射分段读取，大文件不会整体载入内存）
+    """
+    sha = hashlib.sha256()
+    with open(audio_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return sha.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(mm), HASH_CHUNK_SIZE):
+                    sha.update(view[offset:offset + HASH_CHUNK_SIZE])
+            finally:
+                view.release()
+    return sha.hexdigest()
+
+
+def make_cache_key(audio_hash, params):
+    """由音频哈希与参数（模型大小、compute_type、断句设置等）生成缓存 key"""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{audio_hash}:{payload}".encode('utf-8')).hexdigest()
+
+
+class TranscriptionCache:
+    """基于磁盘的字幕缓存（LRU 淘汰，总大小受限）"""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(os.path.join(cache_dir, INDEX_FILE + '.lock'))
+        self._hits = 0
+        self._misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ---- 索引读写 ----
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """索引的读-改-写：线程锁 + 跨进程文件锁"""
+        with self._lock:
+            self._file_lock.acquire()
+            try:
+                yield
+            finally:
+                self._file_lock.release()
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        tmp_path = f"{self._index_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._index_path())
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    # ---- 查询与写入 ----
+
+    def get(self, key, accept=None):
+        """
+        查询缓存条目
+
+        Args:
+            key: 缓存 key
+            accept: 可选的判定函数，返回 False 时该条目视为未命中（例如结果已过时）
+
+        Returns:
+            dict: 条目元数据（含文件路径），未命中返回 None
+        """
+        with self._locked():
+            index = self._load_index()
+            entry = index.get(key)
+            entry_dir = self._entry_dir(key)
+            text_path = os.path.join(entry_dir, TEXT_FILE)
+            segments_path = os.path.join(entry_dir, SEGMENTS_FILE)
+            if entry is None or not (os.path.exists(text_path) and os.path.exists(segments_path)):
+                if entry is not None:
+                    index.pop(key, None)
+                    self._save_index(index)
+                self._misses += 1
+                return None
+            if accept is not None and not accept(entry):
+                self._misses += 1
+                return None
+            entry['last_access'] = time.time()
+            self._save_index(index)
+            self._hits += 1
+            return dict(entry, text_path=text_path, segments_path=segments_path)
+
+    def restore(self, entry, caption_path, json_path, words_path=None):
+        """把缓存条目恢复为字幕输出文件（词级时间戳文件存在时一并恢复）"""
+        shutil.copyfile(entry['text_path'], caption_path)
+        shutil.copyfile(entry['segments_path'], json_path)
+        cached_words = os.path.join(os.path.dirname(entry['text_path']), WORDS_FILE)
+        if words_path and os.path.exists(cached_words):
+            shutil.copyfile(cached_words, words_path)
+
+    def put(self, key, caption_path, json_path, words_path=None, meta=None):
+        """写入缓存条目，并在超出容量时按 LRU 淘汰"""
+        # 先复制到临时目录，完整后再换入条目目录，读方不会看到写了一半的条目
+        staging_dir = tempfile.mkdtemp(prefix=f".{key[:12]}.", suffix='.tmp', dir=self.cache_dir)
+        try:
+            shutil.copyfile(caption_path, os.path.join(staging_dir, TEXT_FILE))
+            shutil.copyfile(json_path, os.path.join(staging_dir, SEGMENTS_FILE))
+            size = os.path.getsize(caption_path) + os.path.getsize(json_path)
+            if words_path and os.path.exists(words_path):
+                shutil.copyfile(words_path, os.path.join(staging_dir, WORDS_FILE))
+                size += os.path.getsize(words_path)
+            now = time.time()
+            with self._locked():
+                entry_dir = self._entry_dir(key)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(staging_dir, entry_dir)
+                index = self._load_index()
+                index[key] = dict(meta or {}, size=size, created=now, last_access=now)
+                self._evict_locked(index)
+                self._save_index(index)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _evict_locked(self, index):
+        total = sum(e.get('size', 0) for e in index.values())
+        for key in sorted(index, key=lambda k: index[k].get('last_access', 0)):
+            if total <= self.max_bytes:
+                break
+            total -= index[key].get('size', 0)
+            index.pop(key)
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            print(f"Caption cache evicted: {key[:12]}")
+
+    def invalidate(self, key=None, audio_hash=None):
+        """
+        使缓存失效：按 key，或按音频哈希删除该音频的所有参数组合
+
+        Returns:
+            int: 删除的条目数
+        """
+        with self._locked():
+            index = self._load_index()
+            keys = [
+                k for k, e in index.items()
+                if k == key or (audio_hash is not None and e.get('audio_hash') == audio_hash)
+            ]
+            for k in keys:
+                index.pop(k)
+                shutil.rmtree(self._entry_dir(k), ignore_errors=True)
+            self._save_index(index)
+        return len(keys)
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._locked():
+            index = self._load_index()
+            for k in index:
+                shutil.rmtree(self._entry_dir(k), ignore_errors=True)
+            self._save_index({})
+        return len(index)
+
+    def stats(self):
+        """命中率、条目数与占用空间"""
+        with self._lock:
+            index = self._load_index()
+            hits, misses = self._hits, self._misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': len(index),
+            'size_bytes': sum(e.get('size', 0) for e in index.values()),
+            'max_bytes': self.max_bytes,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_transcription_cache():
+    """获取当前应用配置对应的字幕缓存（未启用时返回 None）"""
+    config = current_app.config
+    if not config['CAPTION_CACHE_ENABLED']:
+        return None
+    cache_dir = config['CAPTION_CACHE_DIR']
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = TranscriptionCache(cache_dir, config['CAPTION_CACHE_MAX_MB'] * 1024 * 1024)
+            _caches[cache_dir] = cache
+        return cache
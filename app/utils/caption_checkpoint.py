@@ -0,0 +1,99 @@
+"""
+转写断点续传
+每解码一定时长的音频，就把新完成的段（含词级时间戳）追加写入 CAPTIONS_DIR 下的 sidecar 文件（JSON Lines）；
+进程中断后再次处理同一音频时，从最后一个断点继续解码。
+内存中只保留尚未落盘的段，不随转写长度增长。
+"""
+import json
+import os
+
+
+class TranscriptionCheckpoint:
+    """单个音频转写任务的断点文件"""
+
+    def __init__(self, path, key, interval_seconds=60):
+        """
+        Args:
+            path: 断点文件路径
+            key: 音频内容哈希 + 转写参数生成的 key，参数变化后旧断点不会被复用
+            interval_seconds: 每解码多少秒音频写一次断点
+        """
+        self.path = path
+        self.key = key
+        self.interval_seconds = interval_seconds
+        self.resume_offset = 0.0  # 续传起点（秒）：最后一个已落盘段的结束时间
+        self._pending = []
+        self._has_header = False
+
+    @classmethod
+    def for_audio(cls, captions_dir, audio_path, key, interval_seconds=60):
+        """按音频文件名和 key 生成断点文件路径"""
+        filename_without_ext = os.path.splitext(os.path.basename(audio_path))[0]
+        path = os.path.join(captions_dir, f"{filename_without_ext}.{key[:16]}.ckpt.jsonl")
+        return cls(path, key, interval_seconds)
+
+    def load(self):
+        """
+        读取已有断点
+
+        Returns:
+            list: 已完成的段（key 不匹配或文件损坏时返回空列表；写到一半的末行被忽略）
+        """
+        segments = []
+        try:
+            with open(self.path, 'r+', encoding='utf-8') as f:
+                header = json.loads(f.readline() or '{}')
+                if header.get('key') != self.key:
+                    return []
+                good = f.tell()
+                while True:
+                    line = f.readline()
+                    if not line:
+                        break
+                    try:
+                        if not line.endswith('\n'):
+                            raise ValueError("truncated line")
+                        segments.append(json.loads(line))
+                    except ValueError:
+                        # 截掉写到一半的末行，后续追加才不会接在坏行后面
+                        f.seek(good)
+                        f.truncate()
+                        break
+                    good = f.tell()
+        except (OSError, ValueError):
+            return []
+        self._has_header = True
+        if segments:
+            self.resume_offset = segments[-1]['end']
+        return segments
+
+    def record(self, segment):
+        """记录一个已完成的段，累计解码时长超过间隔时落盘"""
+        self._pending.append(segment)
+        if segment['end'] - self.resume_offset >= self.interval_seconds:
+            self.flush()
+
+    def flush(self):
+        """把待写入的段追加到断点文件（每行一个段）"""
+        if not self._pending:
+            return
+        mode = 'a' if self._has_header else 'w'
+        with open(self.path, mode, encoding='utf-8') as f:
+            if not self._has_header:
+                f.write(json.dumps({'key': self.key}) + '\n')
+            for seg in self._pending:
+                f.write(json.dumps(seg, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._has_header = True
+        self.resume_offset = self._pending[-1]['end']
+        print(f"Checkpoint saved at {self.resume_offset:.1f}s (+{len(self._pending)} segments)")
+        self._pending = []
+
+    def remove(self):
+        """最终字幕写出后删除断点文件"""
+        self._pending = []
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
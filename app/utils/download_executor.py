@@ -0,0 +1,404 @@
+"""
+下载执行器
+进程内共享的有界下载队列：固定数量的工作线程按优先级取任务（转写急需的音频优先于影子跟读视频），
+同一 key 的任务排队期间只保留一个；失败按指数退避 + 随机抖动重试，等待重试期间不占用并发名额；
+排队中的任务可取消，执行中的任务在 yt-dlp 下一次进度回调时中止。
+每个任务记录最近一次进度回调的已下载字节数、速度与剩余时间，供下载队列接口与异步任务轮询。
+"""
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import current_app
+
+from app.utils.metrics import REGISTRY
+
+PRIORITY_INTERACTIVE = 0   # 有请求在等待结果（转写用音频）
+PRIORITY_BACKGROUND = 10   # 后台准备（影子跟读视频）
+
+DOWNLOADS_QUEUED = REGISTRY.gauge(
+    'sayit_downloads_queued',
+    'Downloads waiting in the executor queue (including those waiting to retry).'
+)
+DOWNLOADS_ACTIVE = REGISTRY.gauge(
+    'sayit_downloads_active',
+    'Downloads currently running in the executor.'
+)
+DOWNLOAD_RETRIES_TOTAL = REGISTRY.counter(
+    'sayit_download_retries_total',
+    'Download attempts that failed and were scheduled for a retry.'
+)
+
+
+class DownloadCancelled(Exception):
+    """下载任务已被取消"""
+
+
+class DownloadTask:
+    """一个下载任务（fn 接收任务本身，用于检查取消与上报进度）"""
+
+    def __init__(self, task_id, key, fn, priority, label, retryable, still_needed, on_finish, app):
+        self.id = task_id
+        self.key = key
+        self.fn = fn
+        self.priority = priority
+        self.label = label or key
+        self.retryable = retryable
+        self.still_needed = still_needed
+        self.on_finish = on_finish
+        self.app = app
+        self.status = 'queued'
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.exception = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.next_attempt_at = None
+        self.progress = {}
+        self.cancel_event = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def check_cancelled(self):
+        """任务被取消时抛出 DownloadCancelled（在 yt-dlp 进度回调中调用即可中止下载）"""
+        if self.cancel_event.is_set():
+            raise DownloadCancelled(f"下载已取消: {self.label}")
+
+    def update_progress(self, status):
+        """记录 yt-dlp 进度回调（status 为 yt-dlp 传给 progress_hooks 的字典）"""
+        done = status.get('downloaded_bytes')
+        total = status.get('total_bytes') or status.get('total_bytes_estimate')
+        self.progress = {
+            'status': status.get('status'),
+            'filename': os.path.basename(status.get('filename') or ''),
+            'downloaded_bytes': done,
+            'total_bytes': total,
+            'fraction': round(min(1.0, done / total), 4) if done is not None and total else None,
+            'speed': status.get('speed'),
+            'eta': status.get('eta'),
+            'updated_at': datetime.now().isoformat(),
+        }
+
+    def wait(self, timeout=None, on_progress=None, interval=1.0):
+        """
+        等待任务结束
+
+        Args:
+            timeout: 超时（秒），None 为一直等待
+            on_progress: 可选回调 on_progress(progress)，等待期间进度变化时每 interval 秒调用一次
+
+        Returns:
+            fn 的返回值
+
+        Raises:
+            TimeoutError: 超时
+            DownloadCancelled: 任务被取消
+            Exception: 最后一次尝试抛出的异常
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        last = None
+        while on_progress is not None and not self._done.is_set():
+            remaining = deadline - time.time() if deadline is not None else interval
+            if remaining <= 0 or self._done.wait(min(interval, remaining)):
+                break
+            if self.progress and self.progress is not last:
+                last = self.progress
+                on_progress(last)
+        remaining = max(0, deadline - time.time()) if deadline is not None else None
+        if not self._done.wait(remaining):
+            raise TimeoutError(f"等待下载超时: {self.label}")
+        if self.status == 'succeeded':
+            return self.result
+        if self.status in ('cancelled', 'skipped'):
+            raise DownloadCancelled(f"下载已{'取消' if self.status == 'cancelled' else '跳过'}: {self.label}")
+        raise self.exception
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'key': self.key,
+            'label': self.label,
+            'priority': self.priority,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'next_attempt_at': self.next_attempt_at,
+            'progress': self.progress,
+        }
+
+
+class DownloadExecutor:
+    """有界优先级下载执行器"""
+
+    def __init__(self, max_concurrency=3, max_attempts=3, backoff_base=2.0, backoff_max=60.0, history=50):
+        """
+        Args:
+            max_concurrency: 同时执行的下载数
+            max_attempts: 每个任务最多尝试次数
+            backoff_base: 第一次重试前的基准等待（秒），之后每次翻倍
+            backoff_max: 单次等待上限（秒）
+            history: 保留的最近失败 / 完成任务数
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._ready = []     # (priority, seq, task)
+        self._delayed = []   # (ready_at, seq, task)
+        self._by_key = {}    # 未结束任务 key -> task
+        self._tasks = {}     # 未结束任务 id -> task
+        self._active = {}
+        self._failed = deque(maxlen=history)
+        self._finished = deque(maxlen=history)
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._workers = []
+
+    def backoff(self, attempt):
+        """第 attempt 次失败后的等待时间：指数退避，取 [d/2, d] 内的随机值避免同时重试"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def submit(self, key, fn, priority=PRIORITY_BACKGROUND, label=None, retryable=None, still_needed=None,
+               on_finish=None):
+        """
+        提交下载任务；同一 key 的任务尚未结束时直接返回该任务（优先级取较高者）
+
+        Args:
+            key: 去重 key
+            fn: fn(task) -> 结果
+            priority: 数值越小越优先
+            label: 展示名称
+            retryable: retryable(exc) -> bool，None 时除取消外的异常都重试
+            still_needed: still_needed() -> bool，开始执行前返回 False 则跳过（如文件已由其他途径生成）
+            on_finish: on_finish(task) 任务结束（任何状态）后调用
+
+        Returns:
+            DownloadTask
+        """
+        with self._cond:
+            task = self._by_key.get(key)
+            if task is not None:
+                if priority < task.priority and task.status == 'queued':
+                    task.priority = priority
+                    heapq.heappush(self._ready, (priority, next(self._seq), task))
+                    self._cond.notify()
+                return task
+            task = DownloadTask(
+                f"dl-{next(self._ids)}", key, fn, priority, label, retryable, still_needed, on_finish,
+                current_app._get_current_object()
+            )
+            self._by_key[key] = task
+            self._tasks[task.id] = task
+            heapq.heappush(self._ready, (priority, next(self._seq), task))
+            self._ensure_workers_locked()
+            self._update_gauges_locked()
+            self._cond.notify()
+        print(f"[Downloads] Queued {task.label} (priority {priority})")
+        return task
+
+    def cancel(self, task_id):
+        """
+        取消任务：排队或等待重试中的任务立即结束，执行中的任务在下一次进度回调时中止
+
+        Returns:
+            bool: 任务存在且尚未结束
+        """
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return False
+            task.cancel_event.set()
+            if task.status in ('queued', 'retrying'):
+                self._finish_locked(task, 'cancelled')
+        print(f"[Downloads] Cancel requested: {task.label}")
+        if task.done:
+            self._call_on_finish(task)
+        return True
+
+    def cancel_key(self, key):
+        """按 key 取消（不再需要该下载时调用）"""
+        with self._cond:
+            task = self._by_key.get(key)
+        return self.cancel(task.id) if task is not None else False
+
+    def get(self, key):
+        """key 对应的未结束任务"""
+        with self._cond:
+            return self._by_key.get(key)
+
+    def get_task(self, task_id):
+        """按 id 查找任务（包括最近结束的）"""
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is None:
+                task = next((t for t in itertools.chain(self._failed, self._finished) if t.id == task_id), None)
+            return task
+
+    def _ensure_workers_locked(self):
+        while len(self._workers) < self.max_concurrency:
+            worker = threading.Thread(
+                target=self._worker_loop, daemon=True, name=f"Download-{len(self._workers) + 1}"
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _update_gauges_locked(self):
+        queued = sum(1 for t in self._tasks.values() if t.status in ('queued', 'retrying'))
+        DOWNLOADS_QUEUED.set(queued)
+        DOWNLOADS_ACTIVE.set(len(self._active))
+
+    def _finish_locked(self, task, status, error=None):
+        task.status = status
+        task.finished_at = datetime.now().isoformat()
+        task.next_attempt_at = None
+        if error is not None:
+            task.exception = error
+            task.error = str(error)
+        self._by_key.pop(task.key, None)
+        self._tasks.pop(task.id, None)
+        self._active.pop(task.id, None)
+        (self._failed if status == 'failed' else self._finished).append(task)
+        self._update_gauges_locked()
+        task._done.set()
+
+    def _next_task_locked(self):
+        """取下一个可执行任务（到期的重试任务并入就绪队列），没有时阻塞等待"""
+        while True:
+            now = time.time()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, seq, task = heapq.heappop(self._delayed)
+                if task.status == 'retrying':
+                    task.status = 'queued'
+                    heapq.heappush(self._ready, (task.priority, seq, task))
+            while self._ready:
+                priority, _, task = heapq.heappop(self._ready)
+                # 已取消或已提升优先级（重复条目）的任务跳过
+                if task.status == 'queued' and priority == task.priority:
+                    return task
+            timeout = self._delayed[0][0] - now if self._delayed else None
+            self._cond.wait(timeout)
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                task = self._next_task_locked()
+                task.status = 'active'
+                task.attempts += 1
+                task.started_at = task.started_at or datetime.now().isoformat()
+                self._active[task.id] = task
+                self._update_gauges_locked()
+            self._run(task)
+            if task.done:
+                self._call_on_finish(task)
+
+    @staticmethod
+    def _call_on_finish(task):
+        if task.on_finish is None:
+            return
+        try:
+            with task.app.app_context():
+                task.on_finish(task)
+        except Exception as e:
+            print(f"[Downloads] on_finish failed for {task.label}: {e}")
+
+    def _run(self, task):
+        try:
+            with task.app.app_context():
+                if task.still_needed is not None and not task.still_needed():
+                    with self._cond:
+                        self._finish_locked(task, 'skipped')
+                    print(f"[Downloads] Skipped {task.label} (no longer needed)")
+                    return
+                task.check_cancelled()
+                result = task.fn(task)
+        except Exception as e:
+            with self._cond:
+                if task.cancel_event.is_set():
+                    self._finish_locked(task, 'cancelled')
+                    print(f"[Downloads] Cancelled {task.label}")
+                    return
+                retryable = task.retryable(e) if task.retryable is not None else True
+                if retryable and task.attempts < self.max_attempts:
+                    delay = self.backoff(task.attempts)
+                    task.status = 'retrying'
+                    task.error = str(e)
+                    task.next_attempt_at = datetime.fromtimestamp(time.time() + delay).isoformat()
+                    self._active.pop(task.id, None)
+                    heapq.heappush(self._delayed, (time.time() + delay, next(self._seq), task))
+                    self._update_gauges_locked()
+                    self._cond.notify()
+                    DOWNLOAD_RETRIES_TOTAL.inc()
+                    print(f"[Downloads] {task.label} failed (attempt {task.attempts}/{self.max_attempts}): {e}; "
+                          f"retrying in {delay:.1f}s")
+                    return
+                self._finish_locked(task, 'failed', e)
+            print(f"[Downloads] {task.label} failed after {task.attempts} attempt(s): {e}")
+            return
+        with self._cond:
+            task.result = result
+            self._finish_locked(task, 'succeeded')
+
+    def stats(self):
+        """排队、执行中、等待重试与最近失败的任务"""
+        with self._cond:
+            pending = sorted(
+                (t for t in self._tasks.values() if t.status in ('queued', 'retrying')),
+                key=lambda t: (t.priority, t.created_at)
+            )
+            return {
+                'max_concurrency': self.max_concurrency,
+                'max_attempts': self.max_attempts,
+                'queued': [t.to_dict() for t in pending if t.status == 'queued'],
+                'retrying': [t.to_dict() for t in pending if t.status == 'retrying'],
+                'active': [t.to_dict() for t in self._active.values()],
+                'failed': [t.to_dict() for t in reversed(self._failed)],
+                'recent': [t.to_dict() for t in reversed(self._finished)],
+            }
+
+
+def describe_progress(progress):
+    """进度的简短文字描述，如：12.3 / 45.6 MB, 1.2 MB/s, ETA 27s"""
+    mb = 1024 * 1024
+    done, total = progress.get('downloaded_bytes'), progress.get('total_bytes')
+    parts = []
+    if done is not None:
+        parts.append(f"{done / mb:.1f} / {total / mb:.1f} MB" if total else f"{done / mb:.1f} MB")
+    if progress.get('speed'):
+        parts.append(f"{progress['speed'] / mb:.1f} MB/s")
+    if progress.get('eta') is not None:
+        parts.append(f"ETA {progress['eta']:.0f}s")
+    return ', '.join(parts)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_download_executor():
+    """获取进程级下载执行器（按配置 DOWNLOAD_MAX_CONCURRENCY 等创建）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            config = current_app.config
+            _executor = DownloadExecutor(
+                max_concurrency=config['DOWNLOAD_MAX_CONCURRENCY'],
+                max_attempts=config['DOWNLOAD_MAX_ATTEMPTS'],
+                backoff_base=config['DOWNLOAD_BACKOFF_BASE'],
+                backoff_max=config['DOWNLOAD_BACKOFF_MAX'],
+            )
+        return _executor
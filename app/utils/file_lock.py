@@ -0,0 +1,87 @@
+"""
+跨进程文件锁
+POSIX 使用 fcntl.flock，Windows 使用 msvcrt.locking。锁随文件描述符存在，
+持有锁的进程退出（包括崩溃）时由操作系统自动释放，不会留下需要人工清理的陈旧锁。
+同一进程内各 FileLock 对象分别打开文件，线程之间同样互斥。
+"""
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 是否支持共享锁（msvcrt 只有互斥锁）
+SHARED_LOCKS = fcntl is not None
+
+
+class FileLock:
+    """基于锁文件的互斥锁"""
+
+    def __init__(self, path, shared=False):
+        """
+        Args:
+            path: 锁文件路径
+            shared: 共享锁（多个持有方可同时持有，与互斥锁冲突）；Windows 不支持共享锁，按互斥锁处理
+        """
+        self.path = path
+        self.shared = shared
+        self._fd = None
+
+    @property
+    def locked(self):
+        return self._fd is not None
+
+    def acquire(self, blocking=True):
+        """
+        获取锁
+
+        Args:
+            blocking: False 时锁被占用立即返回 False
+
+        Returns:
+            bool: 是否获得锁
+        """
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                mode = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+                fcntl.flock(fd, mode | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                # LK_LOCK 最多重试 10 秒，阻塞模式下循环直到获得锁
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_NBLCK if not blocking else msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        """释放锁（锁文件保留，删除锁文件会让并发方锁住不同的 inode）"""
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
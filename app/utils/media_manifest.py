@@ -0,0 +1,249 @@
+"""
+媒体清单
+持久化两张表（JSON 文件，跨进程读写加文件锁、原子替换）：
+- urls：规范化链接 → 提取器与视频ID，见过的链接再次提交时无需任何网络请求即可定位本地文件
+- media：视频ID → 各产物（audio / mp3 / video）的文件名、大小、mtime 与 SHA-256，
+  以及已生成的字幕 / PDF 笔记（outputs，批量导入据此跳过已处理的条目）
+
+产物以 (大小, mtime) 校验：都未变时直接信任记录的校验和；mtime 变化但大小相同时重新计算校验和比对。
+记录的 SHA-256 与字幕缓存使用的音频哈希相同，转写时可直接复用，省去一次整文件哈希。
+"""
+import copy
+import json
+import os
+import threading
+from datetime import datetime
+
+from flask import current_app
+
+from app.utils.caption_cache import hash_audio_file
+from app.utils.file_lock import FileLock
+from app.utils.single_flight import normalize_url
+
+ARTIFACT_KINDS = ('audio', 'mp3', 'video')
+
+
+class MediaManifest:
+    """URL → 视频ID 映射与媒体产物清单"""
+
+    def __init__(self, manifest_path, media_dir):
+        self.manifest_path = manifest_path
+        self.media_dir = media_dir
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(manifest_path + '.lock')
+        self._doc = None
+        self._stamp = None
+
+    def _load_locked(self):
+        """读取清单（文件未变化时复用已解析的内容）"""
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            self._doc, self._stamp = {'urls': {}, 'media': {}}, None
+            return self._doc
+        stamp = (st.st_mtime_ns, st.st_size)
+        if self._doc is None or stamp != self._stamp:
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    doc = json.load(f)
+            except ValueError as e:
+                print(f"媒体清单损坏，重新建立: {e}")
+                doc = {}
+            doc.setdefault('urls', {})
+            doc.setdefault('media', {})
+            self._doc, self._stamp = doc, stamp
+        return self._doc
+
+    def _update(self, mutate):
+        """在跨进程文件锁内读取最新清单、修改并原子写回（修改副本，读方持有的旧文档不受影响）"""
+        with self._lock:
+            self._file_lock.acquire()
+            try:
+                doc = copy.deepcopy(self._load_locked())
+                mutate(doc)
+                tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(doc, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.manifest_path)
+                st = os.stat(self.manifest_path)
+                self._doc, self._stamp = doc, (st.st_mtime_ns, st.st_size)
+            finally:
+                self._file_lock.release()
+
+    def _read(self):
+        with self._lock:
+            return self._load_locked()
+
+    def lookup_url(self, url):
+        """
+        已记录的链接对应的视频ID
+
+        Returns:
+            tuple: (视频ID, 提取器)，未记录时返回 (None, None)
+        """
+        entry = self._read()['urls'].get(normalize_url(url))
+        if not entry:
+            return None, None
+        return entry['id'], entry.get('extractor')
+
+    def remember_url(self, url, video_id, extractor=None):
+        """记录 链接 → 视频ID"""
+        key = normalize_url(url)
+        entry = self._read()['urls'].get(key)
+        if entry and entry['id'] == video_id:
+            return
+
+        def mutate(doc):
+            doc['urls'][key] = {'id': video_id, 'extractor': extractor, 'seen_at': datetime.now().isoformat()}
+        self._update(mutate)
+
+    def record(self, video_id, kind, path, checksum=None):
+        """
+        记录一个产物（计算大小与 SHA-256）
+
+        Args:
+            kind: audio（原始音频）/ mp3（MP3 副本）/ video（影子跟读 MP4）
+            checksum: 已知的 SHA-256，None 时计算
+        """
+        if kind not in ARTIFACT_KINDS:
+            raise ValueError(f"未知的产物类型: {kind}")
+        st = os.stat(path)
+        checksum = checksum or hash_audio_file(path)
+        artifact = {
+            'filename': os.path.relpath(path, self.media_dir),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': checksum,
+            'recorded_at': datetime.now().isoformat(),
+        }
+
+        def mutate(doc):
+            entry = doc['media'].setdefault(video_id, {'artifacts': {}})
+            entry['artifacts'][kind] = artifact
+        self._update(mutate)
+        return artifact
+
+    def note(self, video_id, **fields):
+        """记录视频ID的附加状态（如 video_unavailable：站点没有可下载的画面流）"""
+        def mutate(doc):
+            doc['media'].setdefault(video_id, {'artifacts': {}}).update(fields)
+        self._update(mutate)
+
+    def get_note(self, video_id, name):
+        return (self._read()['media'].get(video_id) or {}).get(name)
+
+    def record_output(self, video_id, output_format, **files):
+        """记录视频ID已生成的输出（如 caption_filename / pdf_filename），按输出格式分别保存"""
+        output = dict(files, recorded_at=datetime.now().isoformat())
+
+        def mutate(doc):
+            entry = doc['media'].setdefault(video_id, {'artifacts': {}})
+            entry.setdefault('outputs', {})[output_format] = output
+        self._update(mutate)
+
+    def get_output(self, video_id, output_format):
+        """
+        已记录的输出
+
+        Returns:
+            dict: record_output 记录的文件名；未记录时返回 None
+        """
+        return ((self._read()['media'].get(video_id) or {}).get('outputs') or {}).get(output_format)
+
+    def forget(self, video_id, kind=None):
+        """删除产物记录（kind 为 None 时删除该视频ID的全部记录）"""
+        def mutate(doc):
+            entry = doc['media'].get(video_id)
+            if entry is None:
+                return
+            if kind is None:
+                doc['media'].pop(video_id, None)
+            else:
+                entry['artifacts'].pop(kind, None)
+        self._update(mutate)
+
+    def forget_path(self, path):
+        """删除指向该文件的产物记录（文件被存储管理淘汰时调用）"""
+        filename = os.path.relpath(path, self.media_dir)
+
+        def mutate(doc):
+            for entry in doc['media'].values():
+                artifacts = entry.get('artifacts', {})
+                for kind in [k for k, a in artifacts.items() if a['filename'] == filename]:
+                    artifacts.pop(kind)
+        self._update(mutate)
+
+    def _validate(self, video_id, kind, artifact):
+        """校验产物仍在磁盘上且内容未变，返回绝对路径；失效时删除记录并返回 None"""
+        path = os.path.join(self.media_dir, artifact['filename'])
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.forget(video_id, kind)
+            return None
+        if st.st_size != artifact['size']:
+            self.forget(video_id, kind)
+            return None
+        if st.st_mtime_ns != artifact['mtime_ns']:
+            if hash_audio_file(path) != artifact['sha256']:
+                self.forget(video_id, kind)
+                return None
+            self.record(video_id, kind, path, checksum=artifact['sha256'])
+        return path
+
+    def artifact_path(self, video_id, kind):
+        """
+        有效产物的路径
+
+        Returns:
+            str: 绝对路径；未记录或已失效时返回 None
+        """
+        entry = self._read()['media'].get(video_id)
+        artifact = (entry or {}).get('artifacts', {}).get(kind)
+        if artifact is None:
+            return None
+        return self._validate(video_id, kind, artifact)
+
+    def checksum(self, path):
+        """
+        已记录文件的 SHA-256（大小与 mtime 均未变化时），供字幕缓存直接使用
+
+        Returns:
+            str: 未记录或文件已变化时返回 None
+        """
+        try:
+            filename = os.path.relpath(path, self.media_dir)
+            st = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        for entry in self._read()['media'].values():
+            for artifact in entry.get('artifacts', {}).values():
+                if artifact['filename'] == filename:
+                    if (artifact['size'], artifact['mtime_ns']) == (st.st_size, st.st_mtime_ns):
+                        return artifact['sha256']
+                    return None
+        return None
+
+    def stats(self):
+        doc = self._read()
+        artifacts = [a for e in doc['media'].values() for a in e.get('artifacts', {}).values()]
+        return {
+            'urls': len(doc['urls']),
+            'media': len(doc['media']),
+            'artifacts': len(artifacts),
+            'total_bytes': sum(a['size'] for a in artifacts),
+        }
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_media_manifest():
+    """获取进程级媒体清单（配置 MEDIA_MANIFEST_FILE，产物位于 VIDEOS_DIR）"""
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            config = current_app.config
+            _manifest = MediaManifest(config['MEDIA_MANIFEST_FILE'], config['VIDEOS_DIR'])
+        return _manifest
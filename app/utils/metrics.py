@@ -0,0 +1,273 @@
+"""
+进程内指标注册表
+计数器 / 仪表 / 直方图，按 Prometheus 文本格式（0.0.4）导出，由 /metrics 端点提供。
+各服务直接调用本模块中预定义的指标上报；每个指标一把锁，记录一次只是一次字典更新。
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# 适合下载/转写/大模型调用的耗时分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """分桶直方图（存储各桶非累积计数，导出时再累加）"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：代码块耗时记入直方图（异常时同样记录）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表（按注册顺序导出）"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标 {metric.name} 已注册")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """导出 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+PIPELINE_STAGE_SECONDS = REGISTRY.histogram(
+    'sayit_pipeline_stage_seconds',
+    'Duration of each processing pipeline stage in seconds.',
+    ('stage',)
+)
+HTTP_REQUESTS_TOTAL = REGISTRY.counter(
+    'sayit_http_requests_total',
+    'HTTP requests handled, by blueprint and outcome (success: status < 400).',
+    ('blueprint', 'outcome')
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'sayit_http_request_seconds',
+    'HTTP request handling time in seconds (until the response starts), by blueprint.',
+    ('blueprint',)
+)
+JOBS_IN_FLIGHT = REGISTRY.gauge(
+    'sayit_jobs_in_flight',
+    'Processing jobs currently running, by job type.',
+    ('job',)
+)
+DOWNLOADED_BYTES_TOTAL = REGISTRY.counter(
+    'sayit_downloaded_bytes_total',
+    'Bytes of media downloaded, by kind.',
+    ('kind',)
+)
+DOWNLOAD_RESUMED_BYTES_TOTAL = REGISTRY.counter(
+    'sayit_download_resumed_bytes_total',
+    'Bytes of interrupted downloads reused from .part files instead of fetched again, by kind.',
+    ('kind',)
+)
+
+
+def timed_stage(stage):
+    """装饰器：函数耗时记入 sayit_pipeline_stage_seconds{stage=...}"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with PIPELINE_STAGE_SECONDS.time(stage=stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def track_in_flight(job):
+    """
+    装饰器：函数（或生成器）运行期间 sayit_jobs_in_flight{job=...} 加 1
+
+    生成器从开始迭代到耗尽或被关闭期间计为进行中
+    """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                JOBS_IN_FLIGHT.inc(job=job)
+                try:
+                    yield from func(*args, **kwargs)
+                finally:
+                    JOBS_IN_FLIGHT.dec(job=job)
+            return gen_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            JOBS_IN_FLIGHT.inc(job=job)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                JOBS_IN_FLIGHT.dec(job=job)
+        return wrapper
+    return decorator
+
+
+def record_download(path, kind):
+    """下载完成后按文件大小累加 sayit_downloaded_bytes_total"""
+    try:
+        DOWNLOADED_BYTES_TOTAL.inc(os.path.getsize(path), kind=kind)
+    except OSError:
+        pass
+
+
+def record_resume(resumed_bytes, kind):
+    """续传时累加 sayit_download_resumed_bytes_total"""
+    DOWNLOAD_RESUMED_BYTES_TOTAL.inc(resumed_bytes, kind=kind)
@@ -0,0 +1,101 @@
+"""
+流水线笔记生成
+转写过程中每积累一批完整句子就提交给笔记大模型（有限并发），解码继续进行；
+转写结束后按提交顺序拼接各批笔记并连续编号。端到端耗时接近 max(转写, 笔记) 而不是二者之和，
+同时每批输出都远低于单次调用的 max_tokens，长视频不再被截断。
+"""
+import itertools
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.ai import generate_notes_from_text
+
+_SENTENCE_END = ('.', '!', '?', '。', '！', '？', '"', '”')
+# 笔记条目的标题行："12. 英文句子"（允许前面有 Markdown 标题或加粗标记）
+_ENTRY_RE = re.compile(r'^((?:#+\s*)?(?:\*\*)?)(\d+)\.(\s)', re.M)
+
+
+def assemble_notes(parts):
+    """按顺序拼接各批笔记，条目序号改为全局连续编号"""
+    counter = itertools.count(1)
+
+    def renumber(m):
+        return f"{m.group(1)}{next(counter)}.{m.group(3)}"
+
+    return '\n\n'.join(_ENTRY_RE.sub(renumber, part.strip()) for part in parts if part and part.strip())
+
+
+class NotesPipeline:
+    """边转写边生成笔记"""
+
+    def __init__(self, batch_words=250, max_concurrency=2, generate=generate_notes_from_text):
+        """
+        Args:
+            batch_words: 每批至少包含的词数，达到后在下一个句末切分
+            max_concurrency: 同时进行的笔记请求数
+            generate: 笔记生成函数 generate(text) -> str | None
+        """
+        self.batch_words = max(1, batch_words)
+        self.generate = generate
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix='NotesLLM')
+        self._futures = []
+        self._batches = []
+        self._pending = []
+        self._pending_words = 0
+        self._lock = threading.Lock()
+
+    @property
+    def batches(self):
+        return len(self._batches)
+
+    def add_text(self, text):
+        """追加一段转写文本（一个 Whisper 段或句子区块），凑满一批且落在句末时提交"""
+        text = (text or '').strip()
+        if not text:
+            return
+        with self._lock:
+            self._pending.append(text)
+            self._pending_words += len(text.split())
+            full = self._pending_words >= self.batch_words and text.endswith(_SENTENCE_END)
+            # 长时间没有句末标点时也强制切分，避免整段积压到最后
+            if full or self._pending_words >= 2 * self.batch_words:
+                self._submit_locked()
+
+    def _submit_locked(self):
+        if not self._pending:
+            return
+        batch = ' '.join(self._pending)
+        self._pending, self._pending_words = [], 0
+        self._batches.append(batch)
+        print(f"笔记流水线：提交第 {len(self._batches)} 批（{len(batch.split())} 个词）")
+        self._futures.append(self._executor.submit(self.generate, batch))
+
+    def finish(self):
+        """
+        提交剩余文本并等待全部批次
+
+        失败的批次重试一次，仍失败时返回 None
+
+        Returns:
+            str: 拼接后的笔记
+        """
+        with self._lock:
+            self._submit_locked()
+        try:
+            parts = [future.result() for future in self._futures]
+            for i, part in enumerate(parts):
+                if not part:
+                    print(f"笔记流水线：第 {i + 1} 批失败，重试")
+                    parts[i] = self.generate(self._batches[i])
+                    if not parts[i]:
+                        return None
+            return assemble_notes(parts)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    def cancel(self):
+        """放弃尚未开始的批次（转写失败时调用）"""
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown(wait=False)
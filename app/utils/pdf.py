@@ -3,15 +3,10 @@ PDF生成工具
 使用ReportLab生成PDF文件
 """
 import os
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import Paragraph
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_LEFT
+from app.utils.metrics import timed_stage
 
 
+@timed_stage('pdf')
 def create_pdf_from_notes(notes_text, pdf_path):
     """
     使用 reportlab 将格式化的笔记文本生成 PDF 文件
@@ -24,6 +19,15 @@ def create_pdf_from_notes(notes_text, pdf_path):
     Returns:
         str: 创建的PDF文件路径，失败返回None
     """
+    # 延迟导入 reportlab，只在生成 PDF 时加载
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import Paragraph
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_LEFT
+
     try:
         print(f"正在创建 PDF 文件: {pdf_path}")
         
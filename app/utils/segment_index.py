@@ -0,0 +1,120 @@
+"""
+字幕区块索引
+解析后的 _segments.json 按文件 mtime 校验缓存在进程内（LRU），
+并按开始时间建立有序索引，用二分查找返回时间窗口内的区块。
+"""
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class SegmentIndex:
+    """单个字幕文档的时间索引"""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.segments = sorted(doc.get('segments') or [], key=lambda s: s['start'])
+        self.starts = [s['start'] for s in self.segments]
+        # 结束时间的前缀最大值（单调不减），用于二分定位第一个可能与窗口重叠的区块
+        self.max_ends = []
+        running = float('-inf')
+        for seg in self.segments:
+            running = max(running, seg['end'])
+            self.max_ends.append(running)
+
+    def __len__(self):
+        return len(self.segments)
+
+    @property
+    def duration(self):
+        return self.max_ends[-1] if self.max_ends else 0.0
+
+    def range(self, start, end):
+        """
+        与 [start, end) 重叠的区块
+
+        Returns:
+            tuple: (第一个区块的下标, 区块列表)
+        """
+        lo = bisect_right(self.max_ends, start)
+        hi = bisect_left(self.starts, end)
+        return lo, [s for s in self.segments[lo:hi] if s['end'] > start]
+
+    def around(self, t, count):
+        """
+        时间 t 所在（或之前最近）的区块及其前后共 count 个区块
+
+        Returns:
+            tuple: (第一个区块的下标, 区块列表, t 所在区块的下标；t 早于第一个区块时为 -1)
+        """
+        current = bisect_right(self.starts, t) - 1
+        count = max(1, count)
+        first = max(0, min(current - (count - 1) // 2, len(self.segments) - count))
+        return first, self.segments[first:first + count], current
+
+
+class SegmentDocCache:
+    """解析后字幕文档的 LRU 缓存，以文件 mtime 与大小校验是否过期"""
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, path):
+        """
+        获取字幕文档索引
+
+        Raises:
+            FileNotFoundError: 文件不存在
+        """
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+
+        with open(path, 'r', encoding='utf-8') as f:
+            index = SegmentIndex(json.load(f))
+
+        with self._lock:
+            self._entries[path] = (stamp, index)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def stats(self):
+        with self._lock:
+            hits, misses, entries = self._hits, self._misses, len(self._entries)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'max_entries': self.max_entries,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_segment_cache():
+    """获取进程级字幕文档缓存（容量取配置 SEGMENT_CACHE_MAX_DOCS）"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SegmentDocCache(current_app.config['SEGMENT_CACHE_MAX_DOCS'])
+        return _cache
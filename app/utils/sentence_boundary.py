@@ -0,0 +1,302 @@
+"""
+断句引擎
+把词序列标注为句子：在句末词尾补上句末标点，供 build_sentence_segments 按标点切句。
+
+- local：纯本地 CPU 规则（词间静音、Whisper 自带标点、转折词、句长上限），毫秒级完成
+- llm：调用大模型恢复句末标点（失败时保留 Whisper 原始标点）
+- hybrid：先用本地规则断句，再用大模型细化；大模型不可用或结果异常时直接采用本地结果
+
+采用大模型结果时，同时计算本地规则与大模型断句的一致性（precision / recall / F1），
+累计统计可通过 get_boundary_stats() 查看，用于衡量本地规则的质量损失。
+"""
+import threading
+import time
+
+import numpy as np
+
+from app.utils.ai import restore_sentence_final_punct_by_llm
+
+SILENCE_SENTENCE_GAP = 0.6  # 视为句子边界的静音阈值（秒）
+MARKER_SENTENCE_GAP = 0.2  # 转折词前至少有这么长的停顿才断句（秒）
+MIN_SENTENCE_WORDS = 3  # 静音/转折词断句时，句子至少包含的词数
+MAX_SENTENCE_WORDS = 30  # 句子最多包含的词数，超出时在最长的停顿处强制断句
+AGREEMENT_TOLERANCE = 1  # 计算一致性时，两个断点相差不超过该词数视为同一断点
+LLM_MAX_PUNCT_RATIO = 0.3  # 超过该比例的词被加标点视为大模型输出异常
+
+# 与大模型提示词中列出的转折词一致，出现在句首时通常开启新句
+DISCOURSE_MARKERS = frozenset((
+    'so', 'but', 'because', 'however', 'therefore', 'thus', 'meanwhile', 'afterwards',
+    'finally', 'anyway', 'besides', 'instead', 'although', 'though', 'whereas', 'while',
+))
+
+_SENTENCE_END_CHARS = ('.', '!', '?')
+_SOFT_END_CHARS = ',;:-'
+_STRIP_CHARS = '.,!?;:"\'()-'
+
+
+def _append_period(token):
+    """在词尾补句号（保留前导空格；把逗号等弱标点替换为句号）"""
+    stripped = token.rstrip()
+    if stripped.endswith(_SENTENCE_END_CHARS):
+        return token
+    return stripped.rstrip(_SOFT_END_CHARS) + '.'
+
+
+def boundary_agreement(predicted, reference, tolerance=AGREEMENT_TOLERANCE):
+    """
+    计算两组断点（句末词下标）的一致性
+
+    Args:
+        predicted: 待评估的断点下标（有序）
+        reference: 参考断点下标（有序，通常来自大模型）
+        tolerance: 断点位置允许的误差（词数）
+
+    Returns:
+        dict: {precision, recall, f1, matched_predicted, matched_reference, predicted, reference}
+    """
+    predicted = np.asarray(predicted, dtype=np.int64)
+    reference = np.asarray(reference, dtype=np.int64)
+
+    def matched(points, targets):
+        if len(points) == 0 or len(targets) == 0:
+            return 0
+        pos = np.searchsorted(targets, points)
+        left = np.abs(points - targets[np.clip(pos - 1, 0, len(targets) - 1)])
+        right = np.abs(points - targets[np.clip(pos, 0, len(targets) - 1)])
+        return int(np.count_nonzero(np.minimum(left, right) <= tolerance))
+
+    tp_pred = matched(predicted, reference)
+    tp_ref = matched(reference, predicted)
+    precision = tp_pred / len(predicted) if len(predicted) else 0.0
+    recall = tp_ref / len(reference) if len(reference) else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(f1, 4),
+        'matched_predicted': tp_pred,
+        'matched_reference': tp_ref,
+        'predicted': len(predicted),
+        'reference': len(reference),
+    }
+
+
+class LocalBoundaryEngine:
+    """本地规则断句：静音、Whisper 标点、转折词与句长上限"""
+
+    name = 'local'
+    uses_llm = False
+
+    def __init__(self, silence_gap=SILENCE_SENTENCE_GAP, marker_gap=MARKER_SENTENCE_GAP,
+                 min_words=MIN_SENTENCE_WORDS, max_words=MAX_SENTENCE_WORDS):
+        self.silence_gap = silence_gap
+        self.marker_gap = marker_gap
+        self.min_words = min_words
+        self.max_words = max_words
+
+    def cache_params(self):
+        return {
+            'silence_gap': self.silence_gap,
+            'marker_gap': self.marker_gap,
+            'min_words': self.min_words,
+            'max_words': self.max_words,
+        }
+
+    def break_indices(self, store):
+        """
+        计算句末词下标
+
+        Returns:
+            list: 有序的句末词下标（不含最后一个词，尾部由 build_sentence_segments 自行收尾）
+        """
+        n = len(store)
+        if n < 2:
+            return []
+        tokens = store.tokens()
+        gaps = store.word_gaps()
+
+        # Whisper 已给出的句末标点总是保留
+        forced = store.sentence_end_mask()
+        # 下一个词是转折词
+        next_is_marker = np.fromiter(
+            (t.strip().lower().strip(_STRIP_CHARS) in DISCOURSE_MARKERS for t in tokens[1:]),
+            dtype=bool, count=n - 1
+        )
+        soft = np.zeros(n, dtype=bool)
+        soft[:-1] = (gaps >= self.silence_gap) | (next_is_marker & (gaps >= self.marker_gap))
+
+        breaks = []
+        last = -1
+        candidates = np.flatnonzero(forced | soft).tolist()
+        for i in candidates + [n - 1]:
+            # 句子过长：在允许范围内最长的停顿处强制断句
+            while i - last > self.max_words:
+                lo = last + self.min_words
+                hi = last + self.max_words
+                j = lo + int(np.argmax(gaps[lo:hi]))
+                breaks.append(j)
+                last = j
+            if i == n - 1:
+                break
+            if forced[i] or i - last >= self.min_words:
+                breaks.append(i)
+                last = i
+        return breaks
+
+    def apply(self, store):
+        started = time.perf_counter()
+        breaks = self.break_indices(store)
+        tokens = store.tokens()
+        for i in breaks:
+            tokens[i] = _append_period(tokens[i])
+        seconds = time.perf_counter() - started
+        print(f"✓ 本地断句：{len(breaks)} 个句末断点，耗时 {seconds * 1000:.2f}ms")
+        return store.with_tokens(tokens), {
+            'engine': self.name,
+            'source': 'local',
+            'breaks': len(breaks),
+            'seconds': round(seconds, 6),
+        }
+
+
+class LLMBoundaryEngine:
+    """大模型恢复句末标点（带验证），失败时保留 Whisper 原始标点"""
+
+    name = 'llm'
+    uses_llm = True
+
+    def __init__(self, local=None):
+        # 本地引擎仅用于计算一致性
+        self.local = local or LocalBoundaryEngine()
+
+    def cache_params(self):
+        return {}
+
+    def _fallback(self, store, local_store):
+        return store, 'whisper'
+
+    def apply(self, store):
+        started = time.perf_counter()
+        local_store, local_info = self.local.apply(store)
+        result, used_llm = apply_llm_punctuation(store)
+        source = 'llm'
+        if not used_llm:
+            result, source = self._fallback(store, local_store)
+        info = {
+            'engine': self.name,
+            'source': source,
+            'breaks': int(np.count_nonzero(result.sentence_end_mask()[:-1])),
+            'seconds': round(time.perf_counter() - started, 6),
+        }
+        if used_llm:
+            info['agreement'] = boundary_agreement(
+                np.flatnonzero(local_store.sentence_end_mask()[:-1]),
+                np.flatnonzero(result.sentence_end_mask()[:-1])
+            )
+            _record_agreement(info['agreement'], local_info['seconds'], info['seconds'])
+            a = info['agreement']
+            print(f"  本地断句与 LLM 一致性：P={a['precision']:.2f} R={a['recall']:.2f} F1={a['f1']:.2f}")
+        return result, info
+
+
+class HybridBoundaryEngine(LLMBoundaryEngine):
+    """本地规则断句 + 大模型细化；大模型失败时采用本地结果而不是 Whisper 原始标点"""
+
+    name = 'hybrid'
+
+    def cache_params(self):
+        return self.local.cache_params()
+
+    def _fallback(self, store, local_store):
+        return local_store, 'local'
+
+
+BOUNDARY_ENGINES = {
+    LocalBoundaryEngine.name: LocalBoundaryEngine,
+    LLMBoundaryEngine.name: LLMBoundaryEngine,
+    HybridBoundaryEngine.name: HybridBoundaryEngine,
+}
+
+
+def get_boundary_engine(name):
+    """
+    按名称获取断句引擎
+
+    Raises:
+        ValueError: 未知的引擎名称
+    """
+    engine_cls = BOUNDARY_ENGINES.get((name or '').lower())
+    if engine_cls is None:
+        raise ValueError(f"未知的断句引擎: {name}（可选: {', '.join(BOUNDARY_ENGINES)}）")
+    return engine_cls()
+
+
+def apply_llm_punctuation(store):
+    """
+    使用 LLM 智能恢复句末标点（带验证逻辑）
+
+    Returns:
+        tuple: (WordStore, bool) 更新了词文本的词存储，以及是否采用了 LLM 的结果
+    """
+    tokens_only = store.tokens()
+
+    # 尝试调用 LLM 恢复标点
+    punct_tokens = restore_sentence_final_punct_by_llm(tokens_only)
+
+    # 验证 LLM 输出：拒绝过度断句（超过30%的词有标点视为异常）
+    if punct_tokens is not None and len(punct_tokens) == len(tokens_only):
+        punct_count = sum(1 for t in punct_tokens if t.rstrip().endswith(_SENTENCE_END_CHARS))
+        punct_ratio = punct_count / len(punct_tokens) if len(punct_tokens) > 0 else 0
+
+        if punct_ratio > LLM_MAX_PUNCT_RATIO:
+            print(f"⚠️ LLM 标点恢复异常：{punct_ratio:.1%} 的词被加标点（超过30%），拒绝使用")
+            print("   回退到 Whisper 原始标点")
+            return store, False
+        print(f"✓ LLM 标点恢复成功：{punct_count}/{len(tokens_only)} 个词有句末标点 ({punct_ratio:.1%})")
+        # 更新词文本为带标点的版本
+        return store.with_tokens(punct_tokens), True
+    return store, False
+
+
+# ---------------------------------------------------------------------------
+# 一致性累计统计
+# ---------------------------------------------------------------------------
+
+_stats_lock = threading.Lock()
+_stats = {
+    'comparisons': 0,
+    'matched_predicted': 0,
+    'matched_reference': 0,
+    'predicted': 0,
+    'reference': 0,
+    'local_seconds': 0.0,
+    'llm_seconds': 0.0,
+}
+
+
+def _record_agreement(agreement, local_seconds, llm_seconds):
+    with _stats_lock:
+        _stats['comparisons'] += 1
+        for field in ('matched_predicted', 'matched_reference', 'predicted', 'reference'):
+            _stats[field] += agreement[field]
+        _stats['local_seconds'] += local_seconds
+        _stats['llm_seconds'] += llm_seconds
+
+
+def get_boundary_stats():
+    """本地断句相对大模型断句的累计一致性（按断点数加权）与平均耗时"""
+    with _stats_lock:
+        stats = dict(_stats)
+    count = stats['comparisons']
+    precision = stats['matched_predicted'] / stats['predicted'] if stats['predicted'] else 0.0
+    recall = stats['matched_reference'] / stats['reference'] if stats['reference'] else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'comparisons': count,
+        'tolerance_words': AGREEMENT_TOLERANCE,
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(f1, 4),
+        'avg_local_ms': round(stats['local_seconds'] / count * 1000, 3) if count else 0.0,
+        'avg_llm_ms': round(stats['llm_seconds'] / count * 1000, 1) if count else 0.0,
+    }
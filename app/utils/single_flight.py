@@ -0,0 +1,221 @@
+"""
+相同任务合并（single-flight）
+同一 key 同时只执行一次：第一个调用方（leader）执行，其余调用方（follower）等待并共享 leader 的结果。
+
+- 进程内：follower 等待 leader 的 threading.Event，直接共享结果对象（leader 抛出的异常同样重新抛出）；
+  传入 progress 的调用方都会收到 leader 上报的进度（加入时先收到最近一次进度）
+- 跨进程：leader 持有 <key哈希>.lock 文件锁，结束时把结果写入 <key哈希>.json；
+  其他进程的 follower 轮询文件锁，拿到锁后读取在自己开始等待之后写入的结果，
+  没有结果（leader 异常或进程崩溃）时自己成为 leader 重新执行。结果须可 JSON 序列化。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from flask import current_app
+
+from app.utils.file_lock import FileLock
+from app.utils.metrics import REGISTRY
+
+SINGLE_FLIGHT_TOTAL = REGISTRY.counter(
+    'sayit_single_flight_total',
+    'Coalesced calls by role (leader: executed the work; follower: shared an in-flight result).',
+    ('role',)
+)
+
+# 只影响分享来源统计、不影响内容的查询参数，生成 key 时去掉
+_TRACKING_PARAMS = {'si', 'feature', 'spm_id_from', 'vd_source', 'from_spmid', 'share_source', 'share_medium',
+                    'share_plat', 'share_session_id', 'share_tag', 'share_from', 'share_id', 'app_platform'}
+_HOST_PREFIXES = ('www.', 'm.', 'mobile.')
+
+
+def normalize_url(url):
+    """
+    规范化视频链接用作合并 key：小写主机名、去掉 www./m. 前缀、片段与跟踪参数，查询参数排序，
+    youtu.be 短链展开为 youtube.com/watch?v=
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = parts.path.rstrip('/') or '/'
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if host == 'youtu.be' and path != '/':
+        host, query = 'youtube.com', query + [('v', path[1:])]
+        path = '/watch'
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in query
+        if k.lower() not in _TRACKING_PARAMS and not k.lower().startswith('utm_')
+    )
+    scheme = 'https' if parts.scheme in ('http', 'https', '') else parts.scheme.lower()
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def flight_key(*parts, **params):
+    """由若干部分与参数拼出稳定的 key"""
+    return ':'.join(str(p) for p in parts) + '|' + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.listeners = []
+        self.last_progress = None
+
+
+class SingleFlight:
+    """按 key 合并同时进行的相同调用（线程间与进程间）"""
+
+    def __init__(self, state_dir, poll_interval=0.5, result_ttl=600):
+        """
+        Args:
+            state_dir: 锁文件与结果文件所在目录
+            poll_interval: 跨进程 follower 轮询文件锁的间隔（秒）
+            result_ttl: 结果文件保留时间（秒），只用于把结果交给正在等待的 follower
+        """
+        self.state_dir = state_dir
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self._calls = {}
+        self._lock = threading.Lock()
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _paths(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        base = os.path.join(self.state_dir, digest)
+        return base + '.lock', base + '.json'
+
+    def do(self, key, fn, progress=None):
+        """
+        执行 fn()，相同 key 的并发调用只执行一次
+
+        Args:
+            progress: 可选进度回调。传入时以 fn(report) 调用，leader 调用 report(*args, **kwargs)
+                会转发给同一进程内所有传入了 progress 的等待方（跨进程的 follower 收不到进度）
+
+        Returns:
+            fn 的返回值（follower 得到 leader 的返回值）
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            if progress is not None:
+                call.listeners.append(progress)
+            last_progress = call.last_progress
+
+        if not leader:
+            print(f"[SingleFlight] Waiting for in-flight call: {key}")
+            SINGLE_FLIGHT_TOTAL.inc(role='follower')
+            if progress is not None and last_progress is not None:
+                progress(*last_progress[0], **last_progress[1])
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        if progress is not None:
+            work = fn
+            fn = lambda: work(lambda *args, **kwargs: self._fan_out(call, args, kwargs))
+        try:
+            call.result = self._do_across_processes(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _fan_out(self, call, args, kwargs):
+        """把 leader 的进度转发给所有等待方（某个等待方的回调出错不影响其他等待方与 leader）"""
+        with self._lock:
+            call.last_progress = (args, kwargs)
+            listeners = list(call.listeners)
+        for listener in listeners:
+            try:
+                listener(*args, **kwargs)
+            except Exception as e:
+                print(f"[SingleFlight] Progress listener failed: {e}")
+
+    def _do_across_processes(self, key, fn):
+        lock_path, result_path = self._paths(key)
+        lock = FileLock(lock_path)
+        waiting_since = None
+        while not lock.acquire(blocking=False):
+            if waiting_since is None:
+                waiting_since = time.time()
+                print(f"[SingleFlight] Waiting for another process: {key}")
+            time.sleep(self.poll_interval)
+
+        try:
+            if waiting_since is not None:
+                shared = self._read_result(result_path, key, waiting_since)
+                if shared is not None:
+                    SINGLE_FLIGHT_TOTAL.inc(role='follower')
+                    return shared['result']
+            SINGLE_FLIGHT_TOTAL.inc(role='leader')
+            result = fn()
+            self._write_result(result_path, key, result)
+            return result
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _read_result(path, key, not_before):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # 只接受在本调用开始等待之后完成的结果（合并进行中的调用，而不是缓存历史结果）
+        if entry.get('key') != key or entry.get('finished_at', 0) < not_before:
+            return None
+        return entry
+
+    def _write_result(self, path, key, result):
+        try:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'finished_at': time.time(), 'result': result}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[SingleFlight] Result not shareable across processes: {e}")
+        self._prune()
+
+    def _prune(self):
+        """删除过期的结果文件（锁文件保留，删除会让并发方锁住不同的 inode）"""
+        cutoff = time.time() - self.result_ttl
+        for name in os.listdir(self.state_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.state_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+_flight = None
+_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """获取进程级 SingleFlight（状态目录取配置 SINGLE_FLIGHT_DIR）"""
+    global _flight
+    with _flight_lock:
+        if _flight is None:
+            _flight = SingleFlight(current_app.config['SINGLE_FLIGHT_DIR'])
+        return _flight
@@ -0,0 +1,335 @@
+"""
+存储管理
+记录媒体、字幕与 PDF 产物的最近访问时间，按目录配额做 LRU 淘汰，由后台线程定期压缩。
+
+- 访问时间：影子跟读播放、字幕读取、任务结果下载时记录（内存中累积，定期合并写入 STORAGE_ACCESS_FILE）；
+  没有访问记录的文件以 mtime 计
+- 淘汰顺序：同一目录内先淘汰可在本地重建的派生产物（PDF、浏览器播放用的 MP3 副本），其次字幕，
+  最后才是需要重新下载的源媒体；同一层级内按最近访问时间从旧到新
+- 不淘汰：正在处理的视频（按视频ID固定，见 pinned；固定期间持有 STORAGE_PINS_DIR 下该视频的共享文件锁，
+  其他 worker 进程的压缩线程同样跳过）、最近 STORAGE_MIN_AGE_SECONDS 内写入的文件、.part / .tmp 临时文件与子目录
+- 淘汰源媒体时同步删除媒体清单中的记录
+"""
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+
+from flask import current_app
+
+from app.utils.file_lock import SHARED_LOCKS, FileLock
+from app.utils.metrics import REGISTRY
+
+TIER_DERIVED = 0   # 可在本地重建：PDF、MP3 副本
+TIER_CAPTION = 1   # 需要重新转写
+TIER_SOURCE = 2    # 需要重新下载
+TIER_NAMES = {TIER_DERIVED: 'derived', TIER_CAPTION: 'caption', TIER_SOURCE: 'source'}
+
+# 字幕的一组文件：<base>.txt、<base>_segments.json、<base>_words.npz
+CAPTION_SUFFIXES = ('_segments.json', '_words.npz', '.txt')
+PDF_SUFFIX = '_notes.pdf'
+SOURCE_AUDIO_EXTS = ('.m4a', '.webm', '.opus', '.ogg', '.aac', '.wav')
+TEMP_SUFFIXES = ('.part', '.tmp', '.ytdl')
+
+# 访问记录合并写盘的最短间隔（秒）
+_FLUSH_INTERVAL = 60
+
+STORAGE_BYTES = REGISTRY.gauge(
+    'sayit_storage_bytes',
+    'Bytes used by managed data directories at the last compaction, by directory.',
+    ('directory',)
+)
+STORAGE_EVICTED_BYTES_TOTAL = REGISTRY.counter(
+    'sayit_storage_evicted_bytes_total',
+    'Bytes evicted to keep data directories within their quotas, by directory and tier.',
+    ('directory', 'tier')
+)
+
+
+def _group_of(filename):
+    """产物所属的视频ID / 文件基名（固定与分组用）"""
+    for suffix in CAPTION_SUFFIXES + (PDF_SUFFIX,):
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return os.path.splitext(filename)[0]
+
+
+class StorageManager:
+    """数据目录配额与 LRU 淘汰"""
+
+    def __init__(self, directories, access_file, pins_dir, min_age=600):
+        """
+        Args:
+            directories: {名称: (目录路径, 配额字节数)}，配额 <= 0 为不限
+            access_file: 访问记录文件
+            pins_dir: 固定锁文件所在目录（跨进程可见的固定）
+            min_age: 最近多少秒内写入的文件不淘汰
+        """
+        self.directories = directories
+        self.access_file = access_file
+        self.pins_dir = pins_dir
+        self.min_age = min_age
+        os.makedirs(pins_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(access_file + '.lock')
+        self._access = {}      # 尚未写盘的访问记录：<目录名>/<文件名> -> 时间戳
+        self._last_flush = time.time()
+        self._pins = {}        # 视频ID -> 引用计数
+        self._pin_locks = {}   # 视频ID -> 持有中的共享文件锁
+        self._thread = None
+        self._last_report = None
+
+    # ---- 访问记录 ----
+
+    def _key(self, path):
+        path = os.path.abspath(path)
+        for name, (directory, _) in self.directories.items():
+            if os.path.dirname(path) == os.path.abspath(directory):
+                return f"{name}/{os.path.basename(path)}"
+        return None
+
+    def touch(self, path):
+        """记录一次访问（影子跟读播放、读取字幕、下载结果）"""
+        key = self._key(path)
+        if key is None:
+            return
+        with self._lock:
+            self._access[key] = time.time()
+            due = time.time() - self._last_flush >= _FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def _load_access(self):
+        try:
+            with open(self.access_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def flush(self, drop=()):
+        """把内存中的访问记录合并写入文件（跨进程加锁，同一文件取较晚的时间），drop 中的记录一并删除"""
+        with self._lock:
+            pending, self._access = self._access, {}
+            self._last_flush = time.time()
+        self._file_lock.acquire()
+        try:
+            access = self._load_access()
+            for key, ts in pending.items():
+                access[key] = max(ts, access.get(key, 0))
+            for key in drop:
+                access.pop(key, None)
+            tmp_path = f"{self.access_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(access, f)
+            os.replace(tmp_path, self.access_file)
+            return access
+        finally:
+            self._file_lock.release()
+
+    # ---- 固定正在使用的产物 ----
+
+    def _pin_lock(self, group, shared):
+        digest = hashlib.sha1(group.encode('utf-8')).hexdigest()
+        return FileLock(os.path.join(self.pins_dir, digest + '.lock'), shared=shared)
+
+    def pin(self, group):
+        """
+        固定视频ID的产物：本进程内计数，首次固定时持有共享文件锁，让其他进程的压缩同样跳过
+
+        文件锁在进程锁之外获取：等待其他进程删除完成时不阻塞本进程的 touch / unpin / 压缩。
+        不支持共享锁的平台（Windows）上只尝试一次非阻塞获取，拿不到时只在本进程内固定
+        """
+        with self._lock:
+            first = self._pins.get(group, 0) == 0
+            self._pins[group] = self._pins.get(group, 0) + 1
+            if not first or group in self._pin_locks:
+                return
+        lock = self._pin_lock(group, shared=True)
+        # 其他进程正在淘汰该组时等待其删除完成
+        if not lock.acquire(blocking=SHARED_LOCKS):
+            print(f"[Storage] Pin lock for {group} is held by another process; pinned in this process only")
+            return
+        with self._lock:
+            # 等待期间已被全部 unpin，或并发的首次固定已经登记了锁
+            if self._pins.get(group) and group not in self._pin_locks:
+                self._pin_locks[group] = lock
+                return
+        lock.release()
+
+    def unpin(self, group):
+        with self._lock:
+            count = self._pins.get(group, 0) - 1
+            if count > 0:
+                self._pins[group] = count
+                return
+            self._pins.pop(group, None)
+            lock = self._pin_locks.pop(group, None)
+            if lock is not None:
+                lock.release()
+
+    @contextlib.contextmanager
+    def pinned(self, group):
+        """处理期间固定视频ID的全部产物（音频、视频、字幕、PDF），压缩时跳过"""
+        self.pin(group)
+        try:
+            yield
+        finally:
+            self.unpin(group)
+
+    # ---- 压缩 ----
+
+    @staticmethod
+    def _tier(name, filename, siblings):
+        if name == 'pdfs':
+            return TIER_DERIVED
+        if name == 'captions':
+            return TIER_CAPTION
+        base, ext = os.path.splitext(filename)
+        # 原始音频仍在时，MP3 副本可在本地重新转码
+        if ext == '.mp3' and any(base + e in siblings for e in SOURCE_AUDIO_EXTS):
+            return TIER_DERIVED
+        return TIER_SOURCE
+
+    def _units(self, name, directory, access):
+        """目录中的淘汰单元：字幕按组（txt + segments + words），其他按文件"""
+        try:
+            entries = [e for e in os.scandir(directory) if e.is_file() and not e.name.endswith(TEMP_SUFFIXES)]
+        except FileNotFoundError:
+            return []
+        siblings = {e.name for e in entries}
+        units = {}
+        for entry in entries:
+            st = entry.stat()
+            group = _group_of(entry.name)
+            unit_key = group if name == 'captions' else entry.name
+            unit = units.setdefault(unit_key, {
+                'group': group,
+                'tier': self._tier(name, entry.name, siblings),
+                'files': [],
+                'size': 0,
+                'last_access': 0,
+                'newest': 0,
+            })
+            unit['files'].append(entry.path)
+            unit['size'] += st.st_size
+            unit['last_access'] = max(unit['last_access'], access.get(f"{name}/{entry.name}", st.st_mtime))
+            unit['newest'] = max(unit['newest'], st.st_mtime)
+        return list(units.values())
+
+    def compact(self):
+        """
+        把超出配额的目录淘汰到配额以内
+
+        Returns:
+            dict: {目录名: {bytes, quota, evicted_files, evicted_bytes, over_quota}}
+        """
+        from app.utils.media_manifest import get_media_manifest
+
+        access = self.flush()
+        now = time.time()
+        with self._lock:
+            pins = set(self._pins)
+        report, dropped = {}, []
+        for name, (directory, quota) in self.directories.items():
+            units = self._units(name, directory, access)
+            total = sum(u['size'] for u in units)
+            result = {'bytes': total, 'quota': quota, 'evicted_files': 0, 'evicted_bytes': 0}
+            if quota > 0 and total > quota:
+                for unit in sorted(units, key=lambda u: (u['tier'], u['last_access'])):
+                    if total <= quota:
+                        break
+                    if unit['group'] in pins or now - unit['newest'] < self.min_age:
+                        continue
+                    # 任一进程固定了该视频ID时共享锁被持有，拿不到互斥锁即跳过；删除期间持有互斥锁
+                    pin_lock = self._pin_lock(unit['group'], shared=False)
+                    if not pin_lock.acquire(blocking=False):
+                        continue
+                    freed = 0
+                    try:
+                        for path in unit['files']:
+                            try:
+                                size = os.path.getsize(path)
+                                os.remove(path)
+                            except OSError:
+                                continue
+                            freed += size
+                            dropped.append(f"{name}/{os.path.basename(path)}")
+                            result['evicted_files'] += 1
+                            if name == 'videos':
+                                get_media_manifest().forget_path(path)
+                    finally:
+                        pin_lock.release()
+                    total -= freed
+                    result['evicted_bytes'] += freed
+                    STORAGE_EVICTED_BYTES_TOTAL.inc(freed, directory=name, tier=TIER_NAMES[unit['tier']])
+                    print(f"[Storage] Evicted {TIER_NAMES[unit['tier']]} {name}/{unit['group']} "
+                          f"({freed / 1024 / 1024:.1f} MB)")
+            result['bytes'] = total
+            result['over_quota'] = quota > 0 and total > quota
+            STORAGE_BYTES.set(total, directory=name)
+            report[name] = result
+        if dropped:
+            self.flush(drop=dropped)
+        self._last_report = dict(report, finished_at=now)
+        return report
+
+    def start(self, app, interval):
+        """启动后台压缩线程（每个进程一个，interval <= 0 时不启动）"""
+        with self._lock:
+            if self._thread is not None or interval <= 0:
+                return
+            self._thread = threading.Thread(
+                target=self._compact_loop, args=(app, interval), daemon=True, name='StorageCompactor'
+            )
+        self._thread.start()
+
+    def _compact_loop(self, app, interval):
+        while True:
+            with app.app_context():
+                try:
+                    self.compact()
+                except Exception as e:
+                    print(f"[Storage] Compaction failed: {e}")
+            time.sleep(interval)
+
+    def stats(self):
+        """各目录当前占用、配额、本进程固定中的视频ID与上次压缩结果"""
+        access = self._load_access()
+        with self._lock:
+            access.update(self._access)
+            pins = sorted(self._pins)
+        directories = {}
+        for name, (directory, quota) in self.directories.items():
+            units = self._units(name, directory, access)
+            directories[name] = {
+                'bytes': sum(u['size'] for u in units),
+                'quota': quota,
+                'files': sum(len(u['files']) for u in units),
+            }
+        return {'directories': directories, 'pinned': pins, 'last_compaction': self._last_report}
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_storage_manager():
+    """获取进程级存储管理器（配额取配置 STORAGE_*_MAX_MB）"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            config = current_app.config
+            mb = 1024 * 1024
+            _manager = StorageManager(
+                {
+                    'pdfs': (config['PDF_DIR'], config['STORAGE_PDFS_MAX_MB'] * mb),
+                    'captions': (config['CAPTIONS_DIR'], config['STORAGE_CAPTIONS_MAX_MB'] * mb),
+                    'videos': (config['VIDEOS_DIR'], config['STORAGE_VIDEOS_MAX_MB'] * mb),
+                },
+                config['STORAGE_ACCESS_FILE'],
+                config['STORAGE_PINS_DIR'],
+                min_age=config['STORAGE_MIN_AGE_SECONDS']
+            )
+        return _manager
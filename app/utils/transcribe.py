@@ -0,0 +1,268 @@
+"""
+语音转写后端
+统一顺序转写、批量推理转写与多进程分块并行转写，输出相同结构的段数据（含词级时间戳）
+"""
+import atexit
+import os
+import threading
+
+from app.utils.whisper_models import get_whisper_model
+
+SAMPLING_RATE = 16000
+
+# 顺序与并行路径共用同一组解码参数，保证两者输出一致
+TRANSCRIBE_OPTIONS = dict(
+    language="en",
+    task="transcribe",
+    word_timestamps=True,
+    vad_filter=True,
+    vad_parameters=dict(min_silence_duration_ms=300),
+)
+
+
+def segment_to_dict(seg, offset=0.0):
+    """
+    将 Faster-Whisper 的 Segment 转换为字典（时间戳加上分块偏移）
+
+    Returns:
+        dict: {id, start, end, text, words: [{word, start, end}]}
+    """
+    words = []
+    if getattr(seg, "words", None):
+        for w in seg.words:
+            words.append({
+                'word': w.word,
+                'start': round((w.start or 0.0) + offset, 2),
+                'end': round((w.end or 0.0) + offset, 2),
+            })
+    return {
+        'id': seg.id,
+        'start': round((seg.start or 0.0) + offset, 2),
+        'end': round((seg.end or 0.0) + offset, 2),
+        'text': (seg.text or "").strip(),
+        'words': words,
+    }
+
+
+def _run_transcribe(model, audio, batch_size=0):
+    """
+    调用模型转写；batch_size > 0 时使用 Faster-Whisper 的批量推理管线，
+    一次前向解码多个 VAD 切分出的窗口（仍输出词级时间戳）
+    """
+    # 复制参数：批量管线会修改传入的 vad_parameters 字典
+    options = dict(TRANSCRIBE_OPTIONS, vad_parameters=dict(TRANSCRIBE_OPTIONS['vad_parameters']))
+    if batch_size and batch_size > 0:
+        from faster_whisper import BatchedInferencePipeline
+
+        # 管线对象带有解码状态，每次转写单独创建（只是对共享模型的轻量包装）
+        pipeline = BatchedInferencePipeline(model=model)
+        return pipeline.transcribe(audio, batch_size=batch_size, **options)
+    return model.transcribe(audio, **options)
+
+
+def transcribe_sequential(model, audio, batch_size=0, offset=0.0):
+    """
+    单模型转写（顺序解码，或 batch_size > 0 时批量推理）
+
+    Args:
+        model: WhisperModel 实例
+        audio: 音频文件路径或 16kHz 单声道 float32 数组
+        batch_size: 批量推理的批大小，0 表示逐窗口顺序解码
+        offset: 从第 offset 秒开始解码（断点续传），输出时间戳仍相对音频开头
+
+    Returns:
+        tuple: (段字典迭代器, 音频总时长秒)；迭代器按解码进度惰性产出
+    """
+    if offset > 0:
+        # 裁掉已完成的部分再解码；clip_timestamps 会让 Faster-Whisper 跳过 VAD，因此直接切片
+        if not hasattr(audio, 'shape'):
+            from faster_whisper.audio import decode_audio
+            audio = decode_audio(audio, sampling_rate=SAMPLING_RATE)
+        audio = audio[int(offset * SAMPLING_RATE):]
+    segments_iter, info = _run_transcribe(model, audio, batch_size)
+    duration = _get_duration(info)
+    if duration is not None:
+        duration += offset
+
+    def _iter():
+        for seg in segments_iter:
+            yield segment_to_dict(seg, offset)
+
+    return _iter(), duration
+
+
+def _get_duration(info):
+    try:
+        return float(getattr(info, 'duration', None))
+    except Exception:
+        return None
+
+
+def plan_chunks(audio, chunk_seconds, sampling_rate=SAMPLING_RATE, min_silence_ms=300):
+    """
+    按 VAD 静音点把音频切分为约 chunk_seconds 秒的块
+
+    只在两段语音之间的静音中点切分，保证任何一个词都不会被切断；
+    在目标长度附近（0.5~1.5 倍）找不到静音时才在目标位置强制切分。
+
+    Returns:
+        list: [(start_sample, end_sample), ...]
+    """
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    total = len(audio)
+    target = int(chunk_seconds * sampling_rate)
+    if total <= target * 1.5:
+        return [(0, total)]
+
+    speech = get_speech_timestamps(
+        audio,
+        VadOptions(min_silence_duration_ms=min_silence_ms),
+        sampling_rate=sampling_rate,
+    )
+    silence_points = [
+        (prev['end'] + cur['start']) // 2
+        for prev, cur in zip(speech, speech[1:])
+        if cur['start'] > prev['end']
+    ]
+
+    chunks = []
+    start = 0
+    while total - start > target * 1.5:
+        ideal = start + target
+        lower = start + target // 2
+        upper = start + target + target // 2
+        candidates = [p for p in silence_points if lower <= p <= upper]
+        cut = min(candidates, key=lambda p: abs(p - ideal)) if candidates else ideal
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, total))
+    return chunks
+
+
+# ---------------------------------------------------------------------------
+# 多进程 worker（spawn 启动；每个 worker 进程持有自己的模型缓存）
+# ---------------------------------------------------------------------------
+
+_worker_model_params = None
+_worker_batch_size = 0
+
+
+def _init_worker(model_params, batch_size=0):
+    global _worker_model_params, _worker_batch_size
+    _worker_model_params = model_params
+    _worker_batch_size = batch_size
+    # 预先加载模型，后续分块直接命中进程内缓存
+    get_whisper_model(**_worker_model_params)
+
+
+def _transcribe_chunk(audio_chunk, offset):
+    model = get_whisper_model(**_worker_model_params)
+    segments_iter, _ = _run_transcribe(model, audio_chunk, _worker_batch_size)
+    return [segment_to_dict(seg, offset) for seg in segments_iter]
+
+
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers, model_params, batch_size=0):
+    """获取（或按需重建）持久化进程池，使 worker 中的模型在多次请求间复用"""
+    global _pool, _pool_key
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    key = (workers, tuple(sorted(model_params.items())), batch_size)
+    with _pool_lock:
+        if _pool is not None and _pool_key != key:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model_params, batch_size),
+            )
+            _pool_key = key
+        return _pool
+
+
+def _reset_pool(pool):
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            _pool_key = None
+
+
+@atexit.register
+def _shutdown_pool():
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def transcribe_parallel(audio_path, workers, chunk_seconds, size="small", device="cpu", compute_type="int8",
+                        batch_size=0, offset=0.0, cpu_threads=0):
+    """
+    分块并行转写：音频只解码一次，按静音点切块后分发到进程池，
+    再把各块的段/词时间戳加上块偏移后按顺序拼接。
+
+    Args:
+        audio_path: 音频文件路径
+        workers: worker 进程数
+        chunk_seconds: 目标块长（秒）
+        batch_size: 每个块内批量推理的批大小，0 表示顺序解码
+        offset: 从第 offset 秒开始解码（断点续传），输出时间戳仍相对音频开头
+        cpu_threads: 本任务可用的总线程数（由调度器分配，平分给各 worker），0 表示 CPU 核心数
+
+    Returns:
+        tuple: (段字典迭代器, 音频总时长秒)；迭代器按块顺序产出，id 连续编号
+    """
+    from faster_whisper.audio import decode_audio
+
+    audio = decode_audio(audio_path, sampling_rate=SAMPLING_RATE)
+    duration = len(audio) / SAMPLING_RATE
+    base_sample = int(offset * SAMPLING_RATE)
+    chunks = [
+        (start + base_sample, end + base_sample)
+        for start, end in plan_chunks(audio[base_sample:], chunk_seconds)
+    ]
+
+    # 每个 worker 分得的 CPU 线程数，避免多进程超额占用核心
+    total_threads = cpu_threads or os.cpu_count() or 1
+    worker_threads = max(1, total_threads // workers)
+    model_params = dict(size=size, device=device, compute_type=compute_type, cpu_threads=worker_threads)
+
+    if len(chunks) == 1:
+        print(f"Audio is {duration - offset:.0f}s, shorter than one chunk; transcribing in-process")
+        model = get_whisper_model(size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+        return transcribe_sequential(model, audio, batch_size, offset)[0], duration
+
+    print(f"Parallel transcription: {len(chunks)} chunks (~{chunk_seconds}s) across {workers} workers")
+    pool = _get_pool(workers, model_params, batch_size)
+
+    def _iter():
+        from concurrent.futures.process import BrokenProcessPool
+
+        futures = [
+            pool.submit(_transcribe_chunk, audio[start:end], start / SAMPLING_RATE)
+            for start, end in chunks
+        ]
+        next_id = 1  # 与顺序路径一致，Faster-Whisper 的段 id 从 1 开始
+        try:
+            for future in futures:
+                for seg in future.result():
+                    seg['id'] = next_id
+                    next_id += 1
+                    yield seg
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+    return _iter(), duration
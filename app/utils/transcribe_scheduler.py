@@ -0,0 +1,142 @@
+"""
+转写调度器
+进程内统一管理 CPU 核心预算：每个转写任务在开始解码前申请准入，同时运行的任务数达到上限时排队（先到先得），
+任务结束后依次放行排队的任务。
+
+CTranslate2 的线程数在模型创建时确定，且每种线程数对应模型缓存中的一个模型实例，因此每个任务分得的线程数固定
+（预算 / 最大并发数），进程内只存在一个模型变体；并发度由准入数量与模型的 num_workers 提供，
+而不是按当时的负载缩放单个任务的线程数（那样单独运行的任务会占满预算，随后到达的任务只能排队）。
+"""
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+
+from app.utils.metrics import REGISTRY
+
+QUEUE_DEPTH = REGISTRY.gauge(
+    'sayit_transcribe_queue_depth',
+    'Transcription jobs waiting for a CPU thread allocation.'
+)
+THREADS_ALLOCATED = REGISTRY.gauge(
+    'sayit_transcribe_threads_allocated',
+    'CPU threads currently allocated to running transcription jobs.'
+)
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'sayit_transcribe_queue_wait_seconds',
+    'Time transcription jobs spent waiting for a CPU thread allocation.'
+)
+
+
+class TranscriptionScheduler:
+    """CPU 线程预算调度器"""
+
+    def __init__(self, core_budget=0, max_concurrent=2, threads_per_job=0):
+        """
+        Args:
+            core_budget: 全部转写任务共享的线程预算，0 表示 CPU 核心数
+            max_concurrent: 同时运行的转写任务数上限
+            threads_per_job: 每个任务的线程数，0 表示 预算 / max_concurrent
+        """
+        self.core_budget = max(1, int(core_budget or os.cpu_count() or 1))
+        max_concurrent = max(1, int(max_concurrent))
+        self.threads_per_job = min(
+            int(threads_per_job or max(1, self.core_budget // max_concurrent)), self.core_budget
+        )
+        # 显式调大单任务线程数时，并发数随之减少，总线程数不超出预算
+        self.max_concurrent = max(1, min(max_concurrent, self.core_budget // self.threads_per_job))
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._running = {}
+        self._ids = itertools.count(1)
+        self._stats = {'admitted': 0, 'completed': 0, 'wait_seconds': 0.0}
+
+    def acquire(self, label=''):
+        """
+        申请准入（阻塞直到轮到本任务且运行中的任务数未达上限）
+
+        Returns:
+            dict: 分配结果 {id, label, threads, waited}
+        """
+        job_id = next(self._ids)
+        enqueued = time.perf_counter()
+        with self._cond:
+            self._queue.append(job_id)
+            QUEUE_DEPTH.set(len(self._queue))
+            while self._queue[0] != job_id or len(self._running) >= self.max_concurrent:
+                self._cond.wait()
+            threads = self.threads_per_job
+            self._queue.popleft()
+            waited = time.perf_counter() - enqueued
+            allocation = {'id': job_id, 'label': label, 'threads': threads, 'waited': round(waited, 3)}
+            self._running[job_id] = dict(allocation, started=time.time())
+            self._stats['admitted'] += 1
+            self._stats['wait_seconds'] += waited
+            QUEUE_DEPTH.set(len(self._queue))
+            THREADS_ALLOCATED.set(len(self._running) * self.threads_per_job)
+            # 队首变化，唤醒下一个排队任务检查空闲线程
+            self._cond.notify_all()
+        QUEUE_WAIT_SECONDS.observe(waited)
+        if waited > 0.05:
+            print(f"Transcription job '{label}' waited {waited:.1f}s for CPU threads")
+        print(f"Transcription job '{label}' admitted with {threads}/{self.core_budget} threads")
+        return allocation
+
+    def release(self, allocation):
+        """归还线程，放行排队任务"""
+        with self._cond:
+            if self._running.pop(allocation['id'], None) is None:
+                return
+            self._stats['completed'] += 1
+            THREADS_ALLOCATED.set(len(self._running) * self.threads_per_job)
+            self._cond.notify_all()
+
+    def stats(self):
+        """预算、空闲线程、运行中任务的线程分配与排队深度"""
+        now = time.time()
+        with self._cond:
+            running = [
+                {
+                    'id': job['id'],
+                    'label': job['label'],
+                    'threads': job['threads'],
+                    'waited_seconds': job['waited'],
+                    'running_seconds': round(now - job['started'], 1),
+                }
+                for job in self._running.values()
+            ]
+            stats = dict(self._stats)
+            queue_depth = len(self._queue)
+        admitted = stats['admitted']
+        return {
+            'core_budget': self.core_budget,
+            'max_concurrent': self.max_concurrent,
+            'threads_per_job': self.threads_per_job,
+            'free_slots': self.max_concurrent - len(running),
+            'queue_depth': queue_depth,
+            'running': running,
+            'admitted': admitted,
+            'completed': stats['completed'],
+            'avg_wait_seconds': round(stats['wait_seconds'] / admitted, 3) if admitted else 0.0,
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_transcription_scheduler():
+    """获取进程级转写调度器（按配置 TRANSCRIBE_CORE_BUDGET / TRANSCRIBE_MAX_CONCURRENT 等创建）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            config = current_app.config
+            _scheduler = TranscriptionScheduler(
+                core_budget=config['TRANSCRIBE_CORE_BUDGET'],
+                max_concurrent=config['TRANSCRIBE_MAX_CONCURRENT'],
+                threads_per_job=config['TRANSCRIBE_THREADS_PER_JOB'],
+            )
+        return _scheduler
@@ -0,0 +1,137 @@
+"""
+Whisper 模型缓存
+进程级共享的 Faster-Whisper 模型注册表，按 (size, device, compute_type, cpu_threads) 只加载一次
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class WhisperModelRegistry:
+    """线程安全的 Whisper 模型注册表（LRU 淘汰）"""
+
+    def __init__(self, max_models=2, num_workers=1):
+        self.max_models = max(1, int(max_models))
+        self.num_workers = max(1, int(num_workers))
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'loads': 0,
+            'evictions': 0,
+            'load_seconds': 0.0,
+        }
+
+    def get(self, size="small", device="cpu", compute_type="int8", cpu_threads=0):
+        """
+        获取模型；已加载则直接复用，否则加载并放入缓存
+
+        同一个 key 的并发请求只会触发一次加载，其余请求等待加载完成。
+        """
+        key = (size, device, compute_type, int(cpu_threads or 0))
+        while True:
+            with self._lock:
+                model = self._models.get(key)
+                if model is not None:
+                    self._models.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return model
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = threading.Event()
+                    self._loading[key] = loading
+                    self._stats['misses'] += 1
+                    break
+            # 其他线程正在加载同一个模型，等待后重新检查
+            loading.wait()
+
+        try:
+            model = self._load(key)
+            with self._lock:
+                self._models[key] = model
+                self._models.move_to_end(key)
+                self._evict_locked()
+            return model
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading.set()
+
+    def _load(self, key):
+        """实际加载模型，并记录耗时"""
+        # 延迟导入：faster_whisper/ctranslate2 只在首次加载模型时才导入
+        from faster_whisper import WhisperModel
+
+        size, device, compute_type, cpu_threads = key
+        threads_desc = f", {cpu_threads} threads" if cpu_threads else ""
+        print(f"Loading Faster-Whisper model ({size}, {device} {compute_type}{threads_desc})...")
+        start = time.perf_counter()
+        model = WhisperModel(
+            size,
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=cpu_threads,
+            num_workers=self.num_workers,
+        )
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats['loads'] += 1
+            self._stats['load_seconds'] += elapsed
+        print(f"Model loaded successfully in {elapsed:.2f}s")
+        return model
+
+    def _evict_locked(self):
+        """超出上限时淘汰最久未使用的模型（需持有锁）"""
+        while len(self._models) > self.max_models:
+            key, _ = self._models.popitem(last=False)
+            self._stats['evictions'] += 1
+            print(f"Evicted Faster-Whisper model {key}")
+
+    def configure(self, max_models=None, num_workers=None):
+        """调整缓存上限与并发 worker 数（worker 数只对之后加载的模型生效）"""
+        with self._lock:
+            if max_models is not None:
+                self.max_models = max(1, int(max_models))
+                self._evict_locked()
+            if num_workers is not None:
+                self.num_workers = max(1, int(num_workers))
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._models.clear()
+
+    def stats(self):
+        """返回命中/未命中/加载耗时等统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['resident'] = [
+                {'size': k[0], 'device': k[1], 'compute_type': k[2], 'cpu_threads': k[3]}
+                for k in self._models
+            ]
+            stats['max_models'] = self.max_models
+            stats['num_workers'] = self.num_workers
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['load_seconds'] = round(stats['load_seconds'], 3)
+        return stats
+
+
+_registry = WhisperModelRegistry()
+
+
+def get_whisper_model(size="small", device="cpu", compute_type="int8", cpu_threads=0):
+    """获取进程内共享的 Whisper 模型（cpu_threads=0 表示使用 CTranslate2 默认线程数）"""
+    return _registry.get(size, device, compute_type, cpu_threads)
+
+
+def configure_whisper_models(max_models=None, num_workers=None):
+    """配置进程内模型缓存"""
+    _registry.configure(max_models=max_models, num_workers=num_workers)
+
+
+def get_whisper_model_stats():
+    """获取模型缓存统计"""
+    return _registry.stats()
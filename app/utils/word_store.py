@@ -0,0 +1,146 @@
+"""
+列式词级时间戳存储
+所有词拼接为一个文本缓冲区，配合字符偏移数组、float32 起止时间数组与词尾字符码数组，
+取代逐词的小字典；可直接做向量化的间隙/断句计算，并以 .npz 持久化。
+"""
+import io
+from array import array
+
+import numpy as np
+
+SENTENCE_END_CODES = (ord('.'), ord('!'), ord('?'))
+
+
+def _last_code(word):
+    """词去掉尾部空白后最后一个字符的码位（空词为 0）"""
+    stripped = word.rstrip()
+    return ord(stripped[-1]) if stripped else 0
+
+
+class WordStoreBuilder:
+    """边转写边追加词，结束后 build() 生成 WordStore"""
+
+    def __init__(self):
+        self._text = io.StringIO()
+        self._length = 0
+        self._offsets = array('I', [0])
+        self._starts = array('f')
+        self._ends = array('f')
+        self._last_codes = array('I')
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, word, start, end):
+        word = word or ''
+        self._text.write(word)
+        self._length += len(word)
+        self._offsets.append(self._length)
+        self._starts.append(start or 0.0)
+        self._ends.append(end or 0.0)
+        self._last_codes.append(_last_code(word))
+
+    def add_segment(self, segment):
+        """
+        追加一个段的全部词
+
+        Returns:
+            tuple: (word_start, word_end) 该段在词数组中的下标范围
+        """
+        first = len(self)
+        for w in segment.get('words') or []:
+            self.add(w['word'], w['start'], w['end'])
+        return first, len(self)
+
+    def build(self):
+        return WordStore(
+            self._text.getvalue(),
+            np.frombuffer(self._offsets, dtype=np.uint32).astype(np.int64),
+            np.frombuffer(self._starts, dtype=np.float32).copy(),
+            np.frombuffer(self._ends, dtype=np.float32).copy(),
+            np.frombuffer(self._last_codes, dtype=np.uint32).copy(),
+        )
+
+
+class WordStore:
+    """只读的列式词存储"""
+
+    def __init__(self, text, offsets, starts, ends, last_codes):
+        self.text = text
+        self.offsets = offsets
+        self.starts = starts
+        self.ends = ends
+        self.last_codes = last_codes
+
+    @classmethod
+    def from_segments(cls, segments):
+        builder = WordStoreBuilder()
+        for seg in segments:
+            builder.add_segment(seg)
+        return builder.build()
+
+    @classmethod
+    def from_tokens(cls, tokens, starts, ends):
+        """由词文本列表与起止时间数组构造（用于替换词文本）"""
+        lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        last_codes = np.fromiter((_last_code(t) for t in tokens), dtype=np.uint32, count=len(tokens))
+        return cls("".join(tokens), offsets, starts, ends, last_codes)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def word(self, i):
+        return self.text[self.offsets[i]:self.offsets[i + 1]]
+
+    def tokens(self):
+        """全部词文本（列表，供 LLM 标点恢复使用）"""
+        text, offsets = self.text, self.offsets
+        return [text[offsets[i]:offsets[i + 1]] for i in range(len(self))]
+
+    def span_text(self, first, last):
+        """第 first..last 个词（含）拼接后的文本，直接切片文本缓冲区"""
+        return self.text[self.offsets[first]:self.offsets[last + 1]]
+
+    def with_tokens(self, tokens):
+        """返回替换了词文本（时间不变）的新存储"""
+        return WordStore.from_tokens(tokens, self.starts, self.ends)
+
+    def word_gaps(self):
+        """相邻词之间的静音时长（秒），长度为 len-1"""
+        if len(self) < 2:
+            return np.zeros(0, dtype=np.float32)
+        return self.starts[1:] - self.ends[:-1]
+
+    def sentence_end_mask(self, ends_with=SENTENCE_END_CODES):
+        """每个词（去掉尾部空白后）是否以句末标点结尾"""
+        return np.isin(self.last_codes, ends_with)
+
+    def nbytes(self):
+        """内存占用（字节，近似）"""
+        return (len(self.text.encode('utf-8')) + self.offsets.nbytes + self.starts.nbytes
+                + self.ends.nbytes + self.last_codes.nbytes)
+
+    def save(self, path):
+        """以 .npz 持久化（文本为 UTF-8 字节，偏移为字符下标）"""
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                text=np.frombuffer(self.text.encode('utf-8'), dtype=np.uint8),
+                offsets=self.offsets.astype(np.uint32),
+                starts=self.starts,
+                ends=self.ends,
+                last_codes=self.last_codes,
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['text'].tobytes().decode('utf-8'),
+                data['offsets'].astype(np.int64),
+                data['starts'],
+                data['ends'],
+                data['last_codes'],
+            )
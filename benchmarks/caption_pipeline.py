@@ -0,0 +1,284 @@
+"""
+字幕管线基准
+对不同长度的音频完整运行字幕管线（iter_caption_events），分阶段统计耗时：
+模型加载、解码、词收集、标点恢复、断句、补齐静音、写出 JSON / 词级时间戳，
+并给出实时率（RTF，不含模型加载）与峰值内存（RSS）。
+
+- 大模型调用被替换为确定性的本地桩函数，结果不受网络与配额影响
+- 测试音频为 videos/ 下的 mp3 及其首尾拼接出的 2x、4x 长度版本（压缩帧直接重新封装，不重新编码）
+- 每个长度在独立子进程中运行，模型加载与峰值内存互不影响；字幕缓存与断点续传均关闭
+
+用法：
+    python benchmarks/caption_pipeline.py                               # 默认 1x 2x 4x
+    python benchmarks/caption_pipeline.py --repeats 1 8 --model base
+    python benchmarks/caption_pipeline.py --save-baseline benchmarks/baseline.json
+    python benchmarks/caption_pipeline.py --baseline benchmarks/baseline.json --threshold 0.2
+
+指定 --baseline 时，任一阶段耗时、RTF 或峰值内存比基线慢/大超过阈值（且超过最小绝对差）即以非 0 状态码退出。
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+STAGES = [
+    'model_load',
+    'decode',
+    'word_collection',
+    'punctuation',
+    'sentence_building',
+    'gap_filling',
+    'json_write',
+    'words_write',
+]
+
+RESULT_MARKER = 'CAPTION_BENCH_RESULT '
+
+
+def default_audio():
+    candidates = sorted(glob.glob(os.path.join(BASE_DIR, 'videos', '*.mp3')))
+    if not candidates:
+        raise SystemExit("videos/ 目录下没有可用的 mp3，请通过 --audio 指定音频文件")
+    return candidates[0]
+
+
+def make_fixture(audio_path, repeats, out_dir):
+    """
+    生成 repeats 倍长度的测试音频：原始压缩帧首尾相接重新封装（不重新编码），
+    解码阶段的开销与真实下载的音频一致
+    """
+    import av
+
+    if repeats == 1:
+        return audio_path
+    name, ext = os.path.splitext(os.path.basename(audio_path))
+    fixture = os.path.join(out_dir, f"{name}_x{repeats}{ext}")
+    with av.open(fixture, 'w') as out:
+        out_stream = None
+        offset = 0
+        for _ in range(repeats):
+            with av.open(audio_path) as inp:
+                in_stream = inp.streams.audio[0]
+                if out_stream is None:
+                    out_stream = out.add_stream_from_template(in_stream)
+                last = 0
+                for packet in inp.demux(in_stream):
+                    if packet.dts is None:
+                        continue
+                    last = max(last, packet.pts + (packet.duration or 0))
+                    packet.pts += offset
+                    packet.dts += offset
+                    packet.stream = out_stream
+                    out.mux(packet)
+                offset += last
+    return fixture
+
+
+def stub_llm_punctuation(tokens):
+    """确定性的标点桩：每 12 个词补一个句号（已有句末标点的词保持不变）"""
+    out = list(tokens)
+    for i in range(11, len(out), 12):
+        if not out[i].rstrip().endswith(('.', '!', '?')):
+            out[i] = out[i].rstrip() + '.'
+    return out
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def run_case(audio_path, args):
+    """在当前进程中运行一次完整字幕管线，返回分阶段耗时"""
+    import app.utils.sentence_boundary as sentence_boundary
+    from app import create_app
+    from app.utils.caption import iter_caption_events
+
+    sentence_boundary.restore_sentence_final_punct_by_llm = stub_llm_punctuation
+
+    flask_app = create_app()
+    captions_dir = tempfile.mkdtemp(prefix='caption_bench_')
+    flask_app.config.update(
+        CAPTIONS_DIR=captions_dir,
+        CAPTION_CACHE_ENABLED=False,
+        CAPTION_CHECKPOINT_SECONDS=0,
+        WHISPER_MODEL_SIZE=args.model,
+        WHISPER_DEVICE=args.device,
+        WHISPER_COMPUTE_TYPE=args.compute_type,
+    )
+
+    timings = {}
+    duration = None
+    counts = {'segments': 0}
+    try:
+        with flask_app.app_context():
+            start = time.perf_counter()
+            for event, data in iter_caption_events(
+                audio_path,
+                parallel_workers=args.workers,
+                batch_size=args.batch_size,
+                boundary_engine=args.engine,
+                timings=timings
+            ):
+                if event == 'info':
+                    duration = data['duration']
+                elif event == 'segment':
+                    counts['segments'] += 1
+                elif event == 'blocks':
+                    counts['blocks'] = len(data['segments'])
+            total = time.perf_counter() - start
+    finally:
+        shutil.rmtree(captions_dir, ignore_errors=True)
+
+    processing = total - timings.get('model_load', 0.0)
+    return {
+        'audio_seconds': round(duration or 0.0, 2),
+        'total_seconds': round(total, 4),
+        'rtf': round(processing / duration, 4) if duration else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {stage: round(timings.get(stage, 0.0), 4) for stage in STAGES},
+        'segments': counts['segments'],
+        'blocks': counts.get('blocks', 0),
+    }
+
+
+def run_case_subprocess(audio_path, args):
+    cmd = [
+        sys.executable, os.path.abspath(__file__), '--run-case', audio_path,
+        '--model', args.model, '--device', args.device, '--compute-type', args.compute_type,
+        '--engine', args.engine, '--workers', str(args.workers), '--batch-size', str(args.batch_size),
+    ]
+    proc = subprocess.run(cmd, cwd=BASE_DIR, capture_output=True, text=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    print(proc.stdout[-2000:])
+    print(proc.stderr[-2000:], file=sys.stderr)
+    raise SystemExit(f"基准子进程失败 (exit {proc.returncode}): {os.path.basename(audio_path)}")
+
+
+def compare_with_baseline(results, baseline, threshold, min_delta_seconds, min_delta_rss_mb):
+    """
+    与基线比较
+
+    Returns:
+        list: 回退项描述（空列表表示没有回退）
+    """
+    previous = {case['name']: case for case in baseline.get('cases', [])}
+    regressions = []
+
+    def check(case_name, metric, old, new, min_delta):
+        if old is None or new is None:
+            return
+        if new > old * (1 + threshold) and new - old > min_delta:
+            regressions.append(
+                f"{case_name} {metric}: {old} -> {new} (+{(new - old) / old * 100 if old else float('inf'):.0f}%)"
+            )
+
+    for case in results:
+        old = previous.get(case['name'])
+        if old is None:
+            continue
+        for stage in STAGES:
+            check(case['name'], stage, old['stages'].get(stage), case['stages'].get(stage), min_delta_seconds)
+        check(case['name'], 'rtf', old.get('rtf'), case.get('rtf'), 0.0)
+        check(case['name'], 'peak_rss_mb', old.get('peak_rss_mb'), case.get('peak_rss_mb'), min_delta_rss_mb)
+    return regressions
+
+
+def print_table(results):
+    header = f"{'case':<10} {'audio s':>8} {'RTF':>7} {'RSS MB':>7}  " + " ".join(f"{s[:10]:>10}" for s in STAGES)
+    print(header)
+    print('-' * len(header))
+    for case in results:
+        stages = " ".join(f"{case['stages'][s]:>10.3f}" for s in STAGES)
+        rtf = f"{case['rtf']:.4f}" if case['rtf'] is not None else '-'
+        print(f"{case['name']:<10} {case['audio_seconds']:>8.1f} {rtf:>7} {case['peak_rss_mb']:>7.1f}  {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='字幕管线分阶段基准')
+    parser.add_argument('--audio', default=None, help='音频文件路径（默认 videos/ 下第一个 mp3）')
+    parser.add_argument('--repeats', type=int, nargs='+', default=[1, 2, 4], help='测试音频的拼接倍数')
+    parser.add_argument('--model', default='small')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--compute-type', default='int8')
+    parser.add_argument('--engine', default='llm', help='断句引擎（llm 调用被桩函数替换）')
+    parser.add_argument('--workers', type=int, default=0, help='分块并行转写进程数')
+    parser.add_argument('--batch-size', type=int, default=0, help='批量推理批大小')
+    parser.add_argument('--save-baseline', default=None, help='把结果保存为基线 JSON')
+    parser.add_argument('--baseline', default=None, help='与该基线 JSON 比较，出现回退时以非 0 退出')
+    parser.add_argument('--threshold', type=float, default=0.2, help='允许的相对回退比例（默认 20%%）')
+    parser.add_argument('--min-delta-ms', type=float, default=50, help='阶段耗时低于该绝对差时不视为回退')
+    parser.add_argument('--min-delta-rss-mb', type=float, default=32, help='峰值内存低于该绝对差时不视为回退')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    parser.add_argument('--run-case', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        result = run_case(args.run_case, args)
+        print(RESULT_MARKER + json.dumps(result))
+        return 0
+
+    audio_path = args.audio or default_audio()
+    fixtures_dir = tempfile.mkdtemp(prefix='caption_bench_audio_')
+    results = []
+    try:
+        for repeats in args.repeats:
+            fixture = make_fixture(audio_path, repeats, fixtures_dir)
+            if not args.json:
+                print(f"Running {repeats}x ({os.path.basename(fixture)})...", flush=True)
+            case = run_case_subprocess(fixture, args)
+            case['name'] = f"{repeats}x"
+            results.append(case)
+    finally:
+        shutil.rmtree(fixtures_dir, ignore_errors=True)
+
+    report = {
+        'audio': os.path.basename(audio_path),
+        'model': args.model,
+        'device': args.device,
+        'compute_type': args.compute_type,
+        'engine': args.engine,
+        'workers': args.workers,
+        'batch_size': args.batch_size,
+        'cases': results,
+    }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Baseline saved: {args.save_baseline}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(
+            results, baseline, args.threshold, args.min_delta_ms / 1000, args.min_delta_rss_mb
+        )
+        if regressions:
+            print(f"FAIL: {len(regressions)} regression(s) beyond {args.threshold:.0%}:", file=sys.stderr)
+            for item in regressions:
+                print(f"  {item}", file=sys.stderr)
+            return 1
+        print(f"OK: no stage regressed beyond {args.threshold:.0%} of {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+应用冷启动基准
+在全新的子进程中执行 `create_app()`，借助 `python -X importtime` 统计每个模块的导入耗时，
+并检查重量级依赖（faster_whisper、yt_dlp、openai、reportlab 等）没有在启动时被导入。
+
+用法：
+    python benchmarks/startup.py                 # 默认预算 800ms
+    python benchmarks/startup.py --budget-ms 500 --top 30
+    python benchmarks/startup.py --json
+
+超出预算或重量级依赖被提前导入时，以非 0 状态码退出，可直接用于 CI。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = [
+    'faster_whisper',
+    'ctranslate2',
+    'av',
+    'yt_dlp',
+    'openai',
+    'reportlab',
+]
+
+STARTUP_SNIPPET = """
+import sys, json
+from app import create_app
+create_app()
+print(json.dumps([m for m in %r if m in sys.modules]))
+""" % (HEAVY_MODULES,)
+
+
+def run_startup():
+    """在子进程中启动应用，返回 (总耗时秒, importtime 输出, 提前加载的重量级模块)"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_SNIPPET],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        print(proc.stderr, file=sys.stderr)
+        raise SystemExit(f"create_app() 启动失败 (exit {proc.returncode})")
+    stdout_lines = [line for line in proc.stdout.splitlines() if line.strip()]
+    loaded_heavy = json.loads(stdout_lines[-1]) if stdout_lines else []
+    return elapsed, proc.stderr, loaded_heavy
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 {模块名: (self_us, cumulative_us)}"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        try:
+            _, rest = line.split(':', 1)
+            self_us, cumulative_us, name = rest.split('|', 2)
+            timings[name.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量 create_app() 冷启动耗时')
+    parser.add_argument('--budget-ms', type=float, default=800.0, help='冷启动预算（毫秒）')
+    parser.add_argument('--top', type=int, default=20, help='输出累计耗时最高的前 N 个模块')
+    parser.add_argument('--runs', type=int, default=3, help='重复次数，取最快的一次')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(max(1, args.runs)):
+        result = run_startup()
+        if best is None or result[0] < best[0]:
+            best = result
+    elapsed, stderr, loaded_heavy = best
+    timings = parse_importtime(stderr)
+    top = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    total_ms = elapsed * 1000
+
+    report = {
+        'wall_ms': round(total_ms, 1),
+        'budget_ms': args.budget_ms,
+        'heavy_modules_loaded': loaded_heavy,
+        'modules': [
+            {'module': name, 'self_ms': round(s / 1000, 2), 'cumulative_ms': round(c / 1000, 2)}
+            for name, (s, c) in top
+        ],
+    }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'module':<50} {'self(ms)':>10} {'cumulative(ms)':>15}")
+        print('-' * 77)
+        for item in report['modules']:
+            print(f"{item['module']:<50} {item['self_ms']:>10.2f} {item['cumulative_ms']:>15.2f}")
+        print('-' * 77)
+        print(f"create_app() wall time: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        if loaded_heavy:
+            print(f"Heavy modules imported at startup: {', '.join(loaded_heavy)}")
+
+    failed = False
+    if total_ms > args.budget_ms:
+        print(f"FAIL: cold start {total_ms:.1f} ms exceeds budget {args.budget_ms:.0f} ms", file=sys.stderr)
+        failed = True
+    if loaded_heavy:
+        print("FAIL: heavy dependencies must be imported lazily", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+转写模式对比基准
+在同一段音频上比较顺序解码与批量推理（BatchedInferencePipeline）的实时率（RTF = 耗时 / 音频时长），
+并检查批量模式输出的词级时间戳能否直接用于现有断句与“无字幕”补齐逻辑。
+
+用法：
+    python benchmarks/transcribe_modes.py                          # 默认使用 videos/ 下第一个音频
+    python benchmarks/transcribe_modes.py --audio path.mp3 --batch-sizes 4 8 16
+    python benchmarks/transcribe_modes.py --model small --json
+
+模型首次加载时间单独统计，不计入 RTF。
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from app.utils.whisper_models import get_whisper_model  # noqa: E402
+from app.utils.transcribe import transcribe_sequential  # noqa: E402
+from app.utils.caption import build_sentence_segments, insert_silence_blocks  # noqa: E402
+from app.utils.word_store import WordStore  # noqa: E402
+
+
+def default_audio():
+    candidates = sorted(glob.glob(os.path.join(BASE_DIR, 'videos', '*.mp3')))
+    if not candidates:
+        raise SystemExit("videos/ 目录下没有可用的 mp3，请通过 --audio 指定音频文件")
+    return candidates[0]
+
+
+def check_words(store):
+    """词级时间戳完整且单调不减"""
+    if not len(store):
+        return False
+    if (store.ends < store.starts).any():
+        return False
+    return bool((store.starts[1:] >= store.starts[:-1] - 0.01).all())
+
+
+def run_mode(model, audio_path, batch_size):
+    start = time.perf_counter()
+    segments_iter, duration = transcribe_sequential(model, audio_path, batch_size)
+    segments = list(segments_iter)
+    elapsed = time.perf_counter() - start
+
+    store = WordStore.from_segments(segments)
+    sentences = build_sentence_segments(store)
+    blocks = insert_silence_blocks(sentences, duration)
+    return {
+        'mode': f"batched x{batch_size}" if batch_size else 'sequential',
+        'batch_size': batch_size,
+        'seconds': round(elapsed, 2),
+        'audio_seconds': round(duration or 0.0, 2),
+        'rtf': round(elapsed / duration, 4) if duration else None,
+        'segments': len(segments),
+        'words': sum(len(s['words']) for s in segments),
+        'sentences': len(sentences),
+        'blocks': len(blocks),
+        'word_timestamps_ok': check_words(store),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较顺序解码与批量推理的实时率')
+    parser.add_argument('--audio', default=None, help='音频文件路径（默认 videos/ 下第一个 mp3）')
+    parser.add_argument('--model', default='small')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--compute-type', default='int8')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[8, 16])
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    audio_path = args.audio or default_audio()
+
+    load_start = time.perf_counter()
+    model = get_whisper_model(args.model, device=args.device, compute_type=args.compute_type)
+    load_seconds = time.perf_counter() - load_start
+
+    results = [run_mode(model, audio_path, 0)]
+    for batch_size in args.batch_sizes:
+        results.append(run_mode(model, audio_path, batch_size))
+
+    baseline = results[0]['rtf']
+    for item in results:
+        item['speedup'] = round(baseline / item['rtf'], 2) if baseline and item['rtf'] else None
+
+    if args.json:
+        print(json.dumps({
+            'audio': os.path.basename(audio_path),
+            'model': args.model,
+            'load_seconds': round(load_seconds, 2),
+            'results': results,
+        }, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"Audio: {os.path.basename(audio_path)} ({results[0]['audio_seconds']:.1f}s), "
+          f"model {args.model} {args.device}/{args.compute_type}, load {load_seconds:.2f}s")
+    print(f"{'mode':<14} {'seconds':>8} {'RTF':>8} {'speedup':>8} {'segments':>9} {'words':>6} "
+          f"{'sentences':>10} {'word_ts':>8}")
+    for item in results:
+        print(f"{item['mode']:<14} {item['seconds']:>8.2f} {item['rtf']:>8.4f} {item['speedup']:>7.2f}x "
+              f"{item['segments']:>9} {item['words']:>6} {item['sentences']:>10} "
+              f"{'ok' if item['word_timestamps_ok'] else 'FAIL':>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,11 +3,12 @@
 """
 import os
 from dotenv import load_dotenv
-from app import create_app
 
-# 加载环境变量
+# 加载环境变量（须在导入应用之前，Config 在导入时读取环境变量）
 load_dotenv()
 
+from app import create_app
+
 app = create_app()
 
 if __name__ == '__main__':